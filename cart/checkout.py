@@ -0,0 +1,147 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from core.analytics import item_sales, record_sales
+from core.cache import bump_product_versions
+from core.choices import OrderEventChoices, ProductStockChoices
+from core.db import values_table
+from core.models import Cart, Order, OrderEvent, OrderItem, OrderOrganization, Product
+from core.reservations import reserved_stock
+from core.utils import reserve_slugs
+
+
+def place_order(user):
+    """
+    Turn `user`'s cart into an order in one transaction.
+
+    The cart row and then the products (in pk order, the order every stock
+    writer uses) are locked before stock is checked, so concurrent
+    checkouts queue up instead of overselling. Units held by other carts'
+    active reservations are not for sale. Stock is taken with a single
+    conditional UPDATE. The order items, with their price snapshots, the
+    per-vendor sub-orders, their CREATED events and the daily sales rollup
+    are written in one statement each; clearing the cart releases its
+    reservations.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(user=user)
+        quantities = defaultdict(int)
+        for product_id, quantity in cart.items.values_list("product_id", "quantity"):
+            quantities[product_id] += quantity
+        if not quantities:
+            raise serializers.ValidationError("Your cart is empty.")
+
+        products = list(
+            Product.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .annotate(reserved=reserved_stock(exclude_cart=cart))
+            .order_by("pk")
+        )
+        if len(products) != len(quantities):
+            raise serializers.ValidationError(
+                "Some products in your cart are no longer available."
+            )
+        short = [
+            product.name
+            for product in products
+            if product.stock - product.reserved < quantities[product.pk]
+        ]
+        if short:
+            raise serializers.ValidationError(
+                {"product": [f"Not enough stock for {name}." for name in short]}
+            )
+        take_stock(quantities)
+
+        order = Order(user=user, added_on=timezone.localdate())
+        order_items = [
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=quantities[product.pk],
+                unit_price=product.price,
+                line_total=product.price * quantities[product.pk],
+            )
+            for product in products
+        ]
+        order.grand_total = sum(item.line_total for item in order_items)
+        order.item_count = sum(item.quantity for item in order_items)
+        reserve_slugs([order])
+        order.save()
+
+        reserve_slugs(order_items)
+        OrderItem.objects.bulk_create(order_items)
+
+        vendors = {}
+        for product, item in zip(products, order_items):
+            vendor = vendors.setdefault(
+                product.organization_id,
+                OrderOrganization(
+                    order=order,
+                    organization_id=product.organization_id,
+                    status=order.status,
+                    delivery_date=order.delivery_date,
+                ),
+            )
+            vendor.grand_total += item.line_total
+            vendor.item_count += item.quantity
+        OrderOrganization.objects.bulk_create(vendors.values())
+        OrderEvent.objects.bulk_create(
+            OrderEvent(
+                order=order,
+                organization_id=organization_id,
+                kind=OrderEventChoices.CREATED,
+                status=order.status,
+                order_status=order.status,
+            )
+            for organization_id in vendors
+        )
+
+        record_sales(
+            item_sales(
+                product.organization_id,
+                product.pk,
+                order.added_on,
+                item.quantity,
+                item.line_total,
+                item.delivery_status,
+            )
+            for product, item in zip(products, order_items)
+        )
+
+        cart.items.all().delete()
+        # Only stock changed, which product cards don't hold (see
+        # PublicProductSerializer.live_fields): refresh the product and shop
+        # pages, and let the catalog listings catch up on their timeout.
+        bump_product_versions(quantities, catalog=False)
+    return order
+
+
+def take_stock(quantities):
+    """
+    Subtract `{product id: quantity}` from stock in one UPDATE. Raises if
+    any product no longer has enough; the caller's transaction rolls back.
+    """
+    product = Product._meta.db_table
+    values, params = values_table(
+        "v", [("id", "bigint"), ("quantity", "integer")], sorted(quantities.items())
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {product} p SET
+                stock = p.stock - v.quantity,
+                availability = CASE
+                    WHEN p.stock - v.quantity > 0 THEN %s ELSE %s
+                END,
+                updated_at = now()
+            FROM {values}
+            WHERE p.id = v.id AND p.stock >= v.quantity
+            """,
+            [ProductStockChoices.IN_STOCK, ProductStockChoices.OUT_OF_STOCK, *params],
+        )
+        if cursor.rowcount != len(quantities):
+            raise serializers.ValidationError("Not enough stock for this order.")
@@ -0,0 +1,36 @@
+from django.db import connection, transaction
+
+from core.models import OrderEvent
+
+
+ORDER_EVENT_SEQUENCE = "core_orderevent_sequence_seq"
+
+
+def sequence_order_events():
+    """
+    Number the order events committed since the last call, in id order.
+
+    Writers can commit out of id order, so an id cursor could skip an event
+    that becomes visible below it. Numbers are handed out here instead, one
+    caller at a time under an advisory lock, and only to events that are
+    already visible: one that commits late gets a number above every number
+    handed out before it. Open transactions elsewhere never hold this up.
+    """
+    table = connection.ops.quote_name(OrderEvent._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Taken before the UPDATE starts, so its snapshot includes the
+        # numbers the previous holder committed.
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [ORDER_EVENT_SEQUENCE])
+        cursor.execute(
+            f"""
+            WITH pending AS (
+                SELECT id FROM {table} WHERE sequence IS NULL ORDER BY id
+            ), numbered AS (
+                SELECT id, nextval(%s) AS sequence FROM pending
+            )
+            UPDATE {table} e SET sequence = n.sequence
+            FROM numbered n
+            WHERE e.id = n.id
+            """,
+            [ORDER_EVENT_SEQUENCE],
+        )
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 
 from core.models import (
@@ -8,15 +10,22 @@ from core.models import (
     MediaRoomConnector,
     Product,
     Order,
+    OrderEvent,
     OrderItem,
+    OrderOrganization,
     Review,
     ProductReview,
-    UserOrganization,
 )
 
+from core.analytics import delivery_sales, record_sales
+from core.reservations import reserve_stock
+from core.tenant import get_tenant
 from product.serializers import PublicProductSerializer
 
+from .checkout import place_order
+
 from core.choices import (
+    OrderEventChoices,
     OrderStatusChoices,
     ProductStockChoices,
     ReviewStatusChoices,
@@ -50,6 +59,12 @@ class CartItemSerializer(serializers.ModelSerializer):
     def total(self, cartitem: CartItem) -> float:
         return cartitem.product.price * cartitem.quantity
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            reserve_stock(instance)
+        return instance
+
 
 class CartSerializer(serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
@@ -90,38 +105,44 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ("product", "quantity")
 
     def validate_quantity(self, data):
-        prod_slug = self.initial_data.get("product")
-        prod = Product.objects.get(slug=prod_slug)
         if data == 0:
             raise serializers.ValidationError("Quantity cannot be zero")
-
-        if prod.stock < data:
-            raise serializers.ValidationError("Not enough stock!")
+        # Checked against available stock (net of other carts' holds) when
+        # the line is reserved in create().
         return data
 
     def create(self, validated_data):
         prod = validated_data.pop("product", None)
         quantity = validated_data.pop("quantity", 0)
-        cart = self.context["cart"]
+        cart_id = self.context["cart_id"]
         # prod.stock = prod.stock - quantity
         # if prod.stock == 0:
         #     prod.availability = ProductStockChoices.OUTOFSTOCK
         # prod.save()
-        return CartItem.objects.create(
-            cart=cart, product=prod, quantity=quantity, **validated_data
-        )
+        with transaction.atomic():
+            cart_item = CartItem.objects.create(
+                cart_id=cart_id, product=prod, quantity=quantity, **validated_data
+            )
+            reserve_stock(cart_item)
+        return cart_item
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product = PublicProductSerializer(many=False)
-    sub_total = serializers.SerializerMethodField(method_name="total")
+    sub_total = serializers.FloatField(source="line_total", read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ("id", "uid", "product", "quantity", "sub_total", "delivery_status")
-
-    def total(self, orderitem: OrderItem) -> float:
-        return orderitem.product.price * orderitem.quantity
+        fields = (
+            "id",
+            "uid",
+            "product",
+            "quantity",
+            "unit_price",
+            "sub_total",
+            "delivery_status",
+        )
+        read_only_fields = ("unit_price",)
 
 
 class AddOrderSerializer(serializers.ModelSerializer):
@@ -148,47 +169,154 @@ class OrderSerializer(serializers.ModelSerializer):
         if instance.status == OrderStatusChoices.DELIVERED:
             raise serializers.ValidationError("Order cannot be updated after delivery.")
 
-        user_orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.context["request"].user
-        ).values_list("organization", flat=True)
-        order_items = OrderItem.objects.filter(
-            order=instance, product__organization__in=user_orgs
-        )
-        if not order_items.exists():
-            raise serializers.ValidationError("Items not found")
-        for item in order_items:
-            item.delivery_status = validated_data.get("status")
-        OrderItem.objects.bulk_update(order_items, ["delivery_status"])
-
-        if (
-            validated_data.get("status") == OrderStatusChoices.PROCESSING
-            or validated_data.get("status") == OrderStatusChoices.SHIPPED
-        ):
-            for attr, value in validated_data.items():
-                setattr(instance, attr, value)
-        else:
-            # all_order_items = OrderItem.objects.filter(order=instance)
+        with transaction.atomic():
+            # Same lock as the bulk transition endpoint, so the two can't
+            # interleave on one order.
+            list(Order.objects.select_for_update().filter(pk=instance.pk).values("pk"))
+            tenant = get_tenant(self.context["request"])
+            vendors = instance.vendors.filter(organization__in=tenant.organization_ids)
+            organizations = list(vendors.values_list("organization", flat=True))
+            if not organizations:
+                raise serializers.ValidationError("Items not found")
+
+            status = validated_data.get("status")
+            if status is not None:
+                now = timezone.now()
+                items = OrderItem.objects.filter(
+                    order=instance, product__organization__in=organizations
+                )
+                rows = items.values_list(
+                    "product__organization_id",
+                    "product_id",
+                    "quantity",
+                    "line_total",
+                    "delivery_status",
+                )
+                record_sales(
+                    delivery_sales(
+                        organization_id,
+                        product_id,
+                        instance.added_on,
+                        quantity,
+                        line_total,
+                        old_status,
+                        status,
+                    )
+                    for organization_id, product_id, quantity, line_total, old_status in rows
+                )
+                items.update(delivery_status=status, updated_at=now)
+                vendor_fields = {"status": status, "updated_at": now}
+                if status == OrderStatusChoices.DELIVERED:
+                    vendor_fields["delivery_date"] = now.date()
+                elif "delivery_date" in validated_data:
+                    vendor_fields["delivery_date"] = validated_data["delivery_date"]
+                vendors.update(**vendor_fields)
+
             if (
-                OrderItem.objects.filter(order=instance).count()
-                == OrderItem.objects.IS_DELIVERED().filter(
-                    order=instance
-                ).count()
+                status == OrderStatusChoices.PROCESSING
+                or status == OrderStatusChoices.SHIPPED
             ):
                 for attr, value in validated_data.items():
                     setattr(instance, attr, value)
             else:
-                status = validated_data.pop("status")
-                for attr, value in validated_data.items():
-                    setattr(instance, attr, value)
-        instance.save()
-        return instance
+                # The order is delivered once every vendor has delivered.
+                if not instance.vendors.exclude(
+                    status=OrderStatusChoices.DELIVERED
+                ).exists():
+                    for attr, value in validated_data.items():
+                        setattr(instance, attr, value)
+                else:
+                    validated_data.pop("status", None)
+                    for attr, value in validated_data.items():
+                        setattr(instance, attr, value)
+            instance.save()
+            if status is not None:
+                OrderEvent.objects.bulk_create(
+                    OrderEvent(
+                        order=instance,
+                        organization_id=organization_id,
+                        kind=OrderEventChoices.STATUS_CHANGED,
+                        status=status,
+                        order_status=instance.status,
+                    )
+                    for organization_id in organizations
+                )
+            return instance
+
+
+class VendorOrderSerializer(serializers.ModelSerializer):
+    uid = serializers.UUIDField(source="order.uid", read_only=True)
+    username = serializers.CharField(source="order.user.username", read_only=True)
+    organization = serializers.CharField(source="organization.slug", read_only=True)
+
+    class Meta:
+        model = OrderOrganization
+        fields = (
+            "uid",
+            "username",
+            "organization",
+            "delivery_date",
+            "status",
+            "grand_total",
+            "item_count",
+        )
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    uid = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=OrderStatusChoices)
+
+
+class BulkOrderTransitionSerializer(serializers.Serializer):
+    items = OrderTransitionSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_items(self, items):
+        uids = [item["uid"] for item in items]
+        if len(set(uids)) != len(uids):
+            raise serializers.ValidationError("Each order may appear only once.")
+        return items
+
+
+class OrderTransitionResultSerializer(serializers.Serializer):
+    uid = serializers.UUIDField()
+    updated = serializers.BooleanField()
+    order_status = serializers.CharField(allow_null=True)
+    error = serializers.CharField(allow_null=True)
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    order = serializers.UUIDField(source="order.uid", read_only=True)
+    organization = serializers.CharField(source="organization.slug", read_only=True)
+
+    class Meta:
+        model = OrderEvent
+        fields = (
+            "sequence",
+            "order",
+            "organization",
+            "kind",
+            "status",
+            "order_status",
+            "added_on",
+        )
+
+
+class OrderChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class OrderChangesSerializer(serializers.Serializer):
+    results = OrderEventSerializer(many=True)
+    # Pass back as `since` to get the next events.
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
 
 
 class GetOrderSerializer(serializers.ModelSerializer):
     uid = serializers.UUIDField(read_only=True)
     username = serializers.CharField(source="user.username", read_only=True)
     items = OrderItemSerializer(many=True)
-    grand_total = serializers.SerializerMethodField(method_name="main_total")
 
     class Meta:
         model = Order
@@ -200,14 +328,10 @@ class GetOrderSerializer(serializers.ModelSerializer):
             "status",
             "items",
             "grand_total",
+            "item_count",
             "review_status",
         )
 
-    def main_total(self, order: Order) -> float:
-        items = order.items.all()
-        total = sum(item.product.price * item.quantity for item in items)
-        return total
-
 
 class DeliveredOrderItemSerializer(serializers.ModelSerializer):
     product = PublicProductSerializer(many=False)
@@ -243,28 +367,7 @@ class AddOrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ("order", "product", "quantity")
 
     def create(self, validated_data):
-        cart = Cart.objects.get(user=self.context["request"].user)
-        order = Order.objects.create(user=self.context["request"].user)
-        order_items = []
-        for item in cart.items.all():
-            if item.quantity > item.product.stock:
-                raise serializers.ValidationError("Not enough stock for this product")
-            order_items.append(
-                OrderItem(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                )
-            )
-
-            item.product.stock = item.product.stock - item.quantity
-            if item.product.stock == 0:
-                item.product.availability = ProductStockChoices.OUT_OF_STOCK
-            item.product.save()
-
-        cart.items.all().delete()
-        OrderItem.objects.bulk_create(order_items)
-        # return OrderItem.objects.filter(order=self.context["order"])
+        validated_data["order"] = place_order(self.context["request"].user)
         return validated_data
 
 
@@ -1,3 +1,417 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from core.analytics import item_sales, record_sales
+from core.choices import OrderEventChoices, OrderStatusChoices, RoleChoices
+from core.models import (
+    CartItem,
+    DailySales,
+    Order,
+    OrderEvent,
+    OrderItem,
+    OrderOrganization,
+    Organization,
+    Product,
+    StockReservation,
+    User,
+    UserOrganization,
+)
+
+from .checkout import place_order
+from .transitions import apply_order_transitions
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f"{name}@example.com", password="password", username=name
+    )
+
+
+def create_product(organization, stock, price=10.0):
+    return Product.objects.create(
+        organization=organization,
+        sku=f"SKU-{Product.objects.count() + 1}",
+        name="Paracetamol",
+        brand="Acme",
+        manufacturing_date=date(2026, 1, 1),
+        expiry_date=date(2028, 1, 1),
+        price=price,
+        stock=stock,
+    )
+
+
+def fill_cart(user, product, quantity):
+    CartItem.objects.create(cart=user.cart, product=product, quantity=quantity)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_concurrent_checkouts_do_not_oversell(self):
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        product = create_product(organization, stock=5)
+        buyers = [create_user(f"buyer{index}") for index in range(4)]
+        for buyer in buyers:
+            fill_cart(buyer, product, 2)
+
+        barrier = threading.Barrier(len(buyers))
+        placed, refused = [], []
+
+        def checkout(buyer):
+            try:
+                barrier.wait()
+                placed.append(place_order(buyer))
+            except serializers.ValidationError:
+                refused.append(buyer)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(buyer,)) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(placed), 2)
+        self.assertEqual(len(refused), 2)
+        self.assertEqual(product.stock, 1)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 2)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = create_product(organization, stock=4)
+        self.client = APIClient()
+
+    def add_to_cart(self, user, quantity):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            reverse("me_cart_items"),
+            {"product": self.product.slug, "quantity": quantity},
+            format="json",
+        )
+
+    def available(self):
+        response = self.client.get(
+            reverse("retrieve_product_availability", args=[self.product.slug])
+        )
+        return response.json()["available"]
+
+    def test_held_units_are_not_for_sale(self):
+        first, second = create_user("first"), create_user("second")
+        self.assertEqual(self.add_to_cart(first, 3).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.available(), 1)
+
+        response = self.add_to_cart(second, 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # A line that got into the cart without a hold can't check them out either.
+        fill_cart(second, self.product, 2)
+        with self.assertRaises(serializers.ValidationError):
+            place_order(second)
+
+    def test_expired_holds_are_released(self):
+        first, second = create_user("first"), create_user("second")
+        self.add_to_cart(first, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.available(), 4)
+        self.assertEqual(self.add_to_cart(second, 2).status_code, status.HTTP_201_CREATED)
+
+
+class DailySalesTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        self.product = create_product(self.organization, stock=10, price=12.5)
+        buyer = create_user("buyer")
+        fill_cart(buyer, self.product, 4)
+        self.order = place_order(buyer)
+
+    def sales(self):
+        return DailySales.objects.values_list(
+            "lines", "units", "revenue", "delivered_units", "delivered_revenue"
+        ).get(product=self.product)
+
+    def transition(self, new_status, orders=None):
+        return apply_order_transitions(
+            [self.organization.pk],
+            [{"uid": order.uid, "status": new_status} for order in orders or [self.order]],
+        )
+
+    def test_checkout_records_sales(self):
+        self.assertEqual(self.sales(), (1, 4, 50.0, 0, 0.0))
+
+    def test_delivery_is_counted_once(self):
+        self.transition(OrderStatusChoices.SHIPPED)
+        self.assertEqual(self.sales(), (1, 4, 50.0, 0, 0.0))
+
+        self.transition(OrderStatusChoices.DELIVERED)
+        self.assertEqual(self.sales(), (1, 4, 50.0, 4, 50.0))
+
+        # Delivered orders don't move again, so nothing is added twice.
+        [result] = self.transition(OrderStatusChoices.DELIVERED)
+        self.assertFalse(result["updated"])
+        self.assertEqual(self.sales(), (1, 4, 50.0, 4, 50.0))
+
+    def test_same_day_orders_are_delivered_together(self):
+        buyer = create_user("second")
+        fill_cart(buyer, self.product, 2)
+        second = place_order(buyer)
+
+        results = self.transition(OrderStatusChoices.DELIVERED, [self.order, second])
+        self.assertTrue(all(result["updated"] for result in results))
+        self.assertEqual(self.sales(), (2, 6, 75.0, 6, 75.0))
+
+    def test_rows_placed_at_different_times_share_a_day(self):
+        placed = [
+            timezone.make_aware(datetime.combine(self.order.added_on, time(hour)))
+            for hour in (9, 15)
+        ]
+        record_sales(
+            item_sales(
+                self.organization.pk,
+                self.product.pk,
+                at,
+                1,
+                12.5,
+                OrderStatusChoices.DELIVERED,
+            )
+            for at in placed
+        )
+        self.assertEqual(self.sales(), (3, 6, 75.0, 2, 25.0))
+
+    def test_removed_item_is_subtracted(self):
+        OrderItem.objects.get(order=self.order).delete()
+        self.assertEqual(self.sales(), (0, 0, 0.0, 0, 0.0))
+
+
+class VendorOrdersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pharmacy = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.clinic = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        buyer = create_user("buyer")
+        fill_cart(buyer, create_product(self.pharmacy, stock=10, price=10.0), 2)
+        fill_cart(buyer, create_product(self.clinic, stock=10, price=4.0), 3)
+        self.order = place_order(buyer)
+
+        manager = create_user("manager")
+        UserOrganization.objects.create(
+            user=manager, organization=self.pharmacy, role=RoleChoices.MANAGER, salary=0
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+
+    def test_each_vendor_gets_a_sub_order(self):
+        self.assertEqual(
+            set(
+                OrderOrganization.objects.filter(order=self.order).values_list(
+                    "organization", "grand_total", "item_count"
+                )
+            ),
+            {(self.pharmacy.pk, 20.0, 2), (self.clinic.pk, 12.0, 3)},
+        )
+        self.assertEqual((self.order.grand_total, self.order.item_count), (32.0, 5))
+
+    def test_dashboard_lists_the_vendors_own_sub_orders(self):
+        response = self.client.get(reverse("all_orders"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [order] = response.json()["results"]
+        self.assertEqual(order["uid"], str(self.order.uid))
+        self.assertEqual(order["organization"], self.pharmacy.slug)
+        self.assertEqual((order["grand_total"], order["item_count"]), (20.0, 2))
+
+    def test_vendor_moves_only_its_sub_order(self):
+        before = OrderOrganization.objects.get(order=self.order, organization=self.clinic)
+        response = self.client.patch(
+            reverse("update_order", args=[self.order.uid]),
+            {"status": OrderStatusChoices.SHIPPED},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = dict(
+            OrderOrganization.objects.filter(order=self.order).values_list(
+                "organization", "status"
+            )
+        )
+        self.assertEqual(statuses[self.pharmacy.pk], OrderStatusChoices.SHIPPED)
+        self.assertEqual(statuses[self.clinic.pk], before.status)
+
+
+class BulkTransitionOrdersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        self.other = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        buyer = create_user("buyer")
+        fill_cart(buyer, create_product(self.organization, stock=10), 1)
+        self.order = place_order(buyer)
+        self.client = APIClient()
+
+    def member(self, name, *memberships):
+        user = create_user(name)
+        for organization, role in memberships:
+            UserOrganization.objects.create(
+                user=user, organization=organization, role=role, salary=0
+            )
+        self.client.force_authenticate(user)
+        return user
+
+    def dispatch(self):
+        response = self.client.post(
+            reverse("bulk_transition_orders"),
+            {"items": [{"uid": str(self.order.uid), "status": OrderStatusChoices.SHIPPED}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_manager_moves_the_order(self):
+        self.member("manager", (self.organization, RoleChoices.MANAGER))
+        [result] = self.dispatch()
+
+        self.assertTrue(result["updated"])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, OrderStatusChoices.SHIPPED)
+
+    def test_staff_cannot_move_the_order(self):
+        # Managing another organization doesn't open this one's orders.
+        self.member(
+            "staff",
+            (self.organization, RoleChoices.STAFF),
+            (self.other, RoleChoices.MANAGER),
+        )
+        [result] = self.dispatch()
+
+        self.assertFalse(result["updated"])
+        self.assertEqual(result["error"], "Order not found.")
+        self.order.refresh_from_db()
+        self.assertNotEqual(self.order.status, OrderStatusChoices.SHIPPED)
+
+
+class OrderChangesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        buyer = create_user("buyer")
+        fill_cart(buyer, create_product(self.organization, stock=10), 1)
+        self.order = place_order(buyer)
+        self.client = APIClient()
+
+    def sign_in(self, role):
+        user = create_user(role.lower())
+        UserOrganization.objects.create(
+            user=user, organization=self.organization, role=role, salary=0
+        )
+        self.client.force_authenticate(user)
+
+    def add_event(self):
+        return OrderEvent.objects.create(
+            order=self.order,
+            organization=self.organization,
+            kind=OrderEventChoices.STATUS_CHANGED,
+            status=OrderStatusChoices.SHIPPED,
+            order_status=OrderStatusChoices.SHIPPED,
+        )
+
+    def changes(self, since):
+        response = self.client.get(reverse("order_changes"), {"since": since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_committed_events_are_listed(self):
+        self.sign_in(RoleChoices.MANAGER)
+        data = self.changes(0)
+
+        [event] = data["results"]
+        self.assertEqual(event["kind"], OrderEventChoices.CREATED)
+        self.assertEqual(data["cursor"], event["sequence"])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.changes(data["cursor"])["results"], [])
+
+    def test_staff_sees_no_events(self):
+        self.sign_in(RoleChoices.STAFF)
+        response = self.client.get(reverse("order_changes"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_late_commit_is_not_skipped(self):
+        self.sign_in(RoleChoices.MANAGER)
+        since = self.changes(0)["cursor"]
+        inserted, release = threading.Event(), threading.Event()
+        held = []
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    held.append(self.add_event().pk)
+                    inserted.set()
+                    release.wait()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        inserted.wait()
+        later = self.add_event()
+
+        # The event committed first is listed first, although its id is higher.
+        data = self.changes(since)
+        [event] = data["results"]
+        self.assertEqual(event["kind"], OrderEventChoices.STATUS_CHANGED)
+        later.refresh_from_db()
+        self.assertEqual(data["cursor"], later.sequence)
+
+        release.set()
+        thread.join()
+        data = self.changes(data["cursor"])
+        [event] = data["results"]
+        self.assertEqual(OrderEvent.objects.get(sequence=event["sequence"]).pk, held[0])
+        self.assertLess(held[0], later.pk)
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = create_product(organization, stock=10)
+        self.buyer = create_user("buyer")
+        fill_cart(self.buyer, self.product, 3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_retried_checkout_is_replayed(self):
+        url = reverse("add_order_items")
+        first = self.client.post(url, {}, format="json", HTTP_IDEMPOTENCY_KEY="checkout-1")
+        second = self.client.post(url, {}, format="json", HTTP_IDEMPOTENCY_KEY="checkout-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+    def test_new_key_runs_again(self):
+        url = reverse("add_order_items")
+        self.client.post(url, {}, format="json", HTTP_IDEMPOTENCY_KEY="checkout-1")
+        response = self.client.post(url, {}, format="json", HTTP_IDEMPOTENCY_KEY="checkout-2")
+
+        # The cart was emptied by the first checkout.
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
@@ -0,0 +1,172 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.analytics import delivery_sales, record_sales
+from core.choices import OrderEventChoices, OrderStatusChoices
+from core.db import values_table
+from core.models import (
+    Order,
+    OrderEvent,
+    OrderItem,
+    OrderOrganization,
+    Product,
+)
+
+
+def apply_order_transitions(organization_ids, items):
+    """
+    Move many orders to new statuses on behalf of the given organizations,
+    in one transaction.
+
+    Each order's items and sub-order belonging to those organizations take
+    the requested status. The order itself follows as `OrderSerializer`
+    would move it: straight to PROCESSING or SHIPPED, and to DELIVERED once
+    no vendor is left undelivered, decided by one conditional aggregate.
+    A STATUS_CHANGED event is logged for every sub-order moved, and
+    deliveries are added to the daily sales rollup. Every step is a single
+    statement over all the orders.
+
+    Returns one result per requested order, in request order.
+    """
+    order_table = Order._meta.db_table
+    item_table = OrderItem._meta.db_table
+    vendor_table = OrderOrganization._meta.db_table
+    event_table = OrderEvent._meta.db_table
+    product_table = Product._meta.db_table
+    today = timezone.now().date()
+    requested = {str(item["uid"]): item["status"] for item in items}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        organizations = list(organization_ids)
+        # Lock the orders in pk order so two dispatches can't deadlock.
+        orders = {
+            str(uid): (pk, status)
+            for pk, uid, status in Order.objects.select_for_update()
+            .filter(
+                Exists(
+                    OrderOrganization.objects.filter(
+                        order=OuterRef("pk"), organization__in=organizations
+                    )
+                ),
+                uid__in=requested,
+            )
+            .order_by("pk")
+            .values_list("pk", "uid", "status")
+        }
+        movable = [
+            (pk, requested[uid])
+            for uid, (pk, status) in orders.items()
+            if status != OrderStatusChoices.DELIVERED
+        ]
+
+        final = {}
+        if movable:
+            values, params = values_table(
+                "v", [("order_id", "bigint"), ("status", "varchar")], movable
+            )
+            cursor.execute(
+                f"""
+                UPDATE {item_table} oi SET
+                    delivery_status = v.status,
+                    updated_at = now()
+                FROM {values}, {product_table} p, {order_table} o, {item_table} old
+                WHERE oi.order_id = v.order_id
+                  AND p.id = oi.product_id
+                  AND p.organization_id = ANY(%s)
+                  AND o.id = oi.order_id
+                  AND old.id = oi.id
+                RETURNING p.organization_id, oi.product_id, o.added_on::date,
+                    oi.quantity, oi.line_total, old.delivery_status, oi.delivery_status
+                """,
+                [*params, organizations],
+            )
+            # `old` is read from the statement's snapshot: the status before the update.
+            record_sales(delivery_sales(*row) for row in cursor.fetchall())
+            cursor.execute(
+                f"""
+                UPDATE {vendor_table} vo SET
+                    status = v.status,
+                    delivery_date = CASE
+                        WHEN v.status = %s THEN %s ELSE vo.delivery_date
+                    END,
+                    updated_at = now()
+                FROM {values}
+                WHERE vo.order_id = v.order_id
+                  AND vo.organization_id = ANY(%s)
+                """,
+                [OrderStatusChoices.DELIVERED, today, *params, organizations],
+            )
+            cursor.execute(
+                f"""
+                UPDATE {order_table} o SET
+                    status = CASE
+                        WHEN v.status <> %s OR s.pending = 0 THEN v.status
+                        ELSE o.status
+                    END,
+                    delivery_date = CASE
+                        WHEN v.status = %s AND s.pending = 0 THEN %s
+                        ELSE o.delivery_date
+                    END,
+                    updated_at = now()
+                FROM {values}
+                JOIN (
+                    SELECT order_id,
+                        COUNT(*) FILTER (WHERE status <> %s) AS pending
+                    FROM {vendor_table}
+                    WHERE order_id = ANY(%s)
+                    GROUP BY order_id
+                ) s ON s.order_id = v.order_id
+                WHERE o.id = v.order_id
+                RETURNING o.id, o.status
+                """,
+                [
+                    OrderStatusChoices.DELIVERED,
+                    OrderStatusChoices.DELIVERED,
+                    today,
+                    *params,
+                    OrderStatusChoices.DELIVERED,
+                    [pk for pk, _ in movable],
+                ],
+            )
+            final = dict(cursor.fetchall())
+            cursor.execute(
+                f"""
+                INSERT INTO {event_table}
+                    (order_id, organization_id, kind, status, order_status, added_on)
+                SELECT vo.order_id, vo.organization_id, %s, vo.status, o.status, now()
+                FROM {vendor_table} vo
+                JOIN {order_table} o ON o.id = vo.order_id
+                WHERE vo.order_id = ANY(%s)
+                  AND vo.organization_id = ANY(%s)
+                ORDER BY vo.order_id, vo.organization_id
+                """,
+                [
+                    OrderEventChoices.STATUS_CHANGED,
+                    [pk for pk, _ in movable],
+                    organizations,
+                ],
+            )
+
+    results = []
+    for uid in requested:
+        if uid not in orders:
+            results.append(
+                {"uid": uid, "updated": False, "order_status": None, "error": "Order not found."}
+            )
+            continue
+        pk, status = orders[uid]
+        if pk in final:
+            results.append(
+                {"uid": uid, "updated": True, "order_status": final[pk], "error": None}
+            )
+        else:
+            results.append(
+                {
+                    "uid": uid,
+                    "updated": False,
+                    "order_status": status,
+                    "error": "Order cannot be updated after delivery.",
+                }
+            )
+    return results
@@ -18,6 +18,8 @@ urlpatterns = [
     path('me/orders', views.ListMeOrderView.as_view(), name='my_orders'),
     path('me/reviews/<uuid:uid>/images', views.ListCreateReviewImageView.as_view(), name='list_create_review_image'),
     path('me/reviews', views.MyReviewDetailsView.as_view(), name='my_reviews'),
+    path('we/orders/changes', views.ListOrderChangesView.as_view(), name='order_changes'),
+    path('we/orders/status', views.BulkTransitionOrdersView.as_view(), name='bulk_transition_orders'),
     path('we/orders/<uuid:uid>', views.RetrieveUpdateOrderView.as_view(), name='update_order'),
     path('we/orders', views.GetAllOrders.as_view(), name='all_orders'),
     # path('we/orders/<uuid:uid>', views.RetrieveUpdateOrderView.as_view(), name='update_order'),
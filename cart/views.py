@@ -1,6 +1,9 @@
+from django.db.models import Exists, OuterRef, Prefetch
 from django.http import Http404
+from drf_spectacular.utils import extend_schema
 from rest_framework import generics
 from rest_framework import permissions as drf_permissions
+from rest_framework.response import Response
 
 from rest_framework.filters import OrderingFilter, SearchFilter
 
@@ -10,6 +13,7 @@ from .serializers import (
     AddCartItemSerializer,
     AddOrderItemSerializer,
     AddOrderSerializer,
+    BulkOrderTransitionSerializer,
     CartDetailsSerializer,
     CartItemSerializer,
     DeliveredOrderSerializer,
@@ -17,9 +21,15 @@ from .serializers import (
     ReviewMediaRoomSerializer,
     MyReviewDetailsSerializer,
     OrderItemSerializer,
+    OrderChangesQuerySerializer,
+    OrderChangesSerializer,
     OrderSerializer,
+    OrderTransitionResultSerializer,
     ReviewSerializer,
+    VendorOrderSerializer,
 )
+from .events import sequence_order_events
+from .transitions import apply_order_transitions
 
 
 from core.models import (
@@ -28,15 +38,21 @@ from core.models import (
     MediaRoom,
     MediaRoomConnector,
     Order,
+    OrderEvent,
     OrderItem,
+    OrderOrganization,
     Product,
     ProductReview,
     Review,
-    UserOrganization,
 )
 from core.choices import OrderCreateChoices, OrderStatusChoices
 
 from core import permissions as custom_permissions
+from core.conditional import ConditionalGetMixin
+from core.idempotency import IdempotentMixin
+from core.pagination import KeysetPagination
+from core.tenant import get_tenant
+
 
 # class ListMeCartView(generics.ListAPIView):
 
@@ -48,22 +64,33 @@ from core import permissions as custom_permissions
 #         return Cart.objects.filter(user=user).select_related('user')
 
 
-class RetrieveMeCartView(generics.ListAPIView):
+class RetrieveMeCartView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CartDetailsSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = (
+        "updated_at",
+        "items__updated_at",
+        "items__product__updated_at",
+        "items__product__card__updated_at",
+    )
 
     def get_queryset(self):
         user = self.request.user
         return (
             Cart.objects.filter(user=user)
-            .prefetch_related("items")
+            .prefetch_related(
+                Prefetch("items", queryset=CartItem.objects.select_related("product__card"))
+            )
             .select_related("user")
         )
 
 
-class ListCreateCartItemsView(generics.ListCreateAPIView):
+class ListCreateCartItemsView(
+    IdempotentMixin, ConditionalGetMixin, generics.ListCreateAPIView
+):
     # serializer_class = CartItemSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = ("updated_at", "product__updated_at", "product__card__updated_at")
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
     search_fields = ["product__name"]
     ordering_fields = ["quantity", "sub_total"]
@@ -74,18 +101,18 @@ class ListCreateCartItemsView(generics.ListCreateAPIView):
         return CartItemSerializer
 
     def get_serializer_context(self):
-        cart = Cart.objects.get(user=self.request.user)
         context = super().get_serializer_context()
-        context["cart"] = cart
+        context["cart_id"] = get_tenant(self.request).cart_id
         return context
 
     def perform_create(self, serializer):
         serializer.save()
 
     def get_queryset(self):
-        user = self.request.user
-        cart = Cart.objects.get(user=user)
-        return CartItem.objects.filter(cart=cart)
+        return (
+            CartItem.objects.filter(cart=get_tenant(self.request).cart_id)
+            .select_related("product__card")
+        )
 
 
 # class AddCartItemView(generics.CreateAPIView):
@@ -105,9 +132,12 @@ class ListCreateCartItemsView(generics.ListCreateAPIView):
 #         serializer.save()
 
 
-class RetrieveUpdateRemoveCartItemView(generics.RetrieveUpdateDestroyAPIView):
+class RetrieveUpdateRemoveCartItemView(
+    IdempotentMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = CartItemSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = ("updated_at", "product__updated_at", "product__card__updated_at")
     lookup_field = "uid"
 
     # def get_serializer_class(self):
@@ -116,28 +146,43 @@ class RetrieveUpdateRemoveCartItemView(generics.RetrieveUpdateDestroyAPIView):
     #     return AddCartItemSerializer
 
     def get_object(self):
-        return CartItem.objects.get(uid=self.kwargs["uid"])
+        return CartItem.objects.select_related("product__card").get(uid=self.kwargs["uid"])
 
 
-class ListMeOrderView(generics.ListAPIView):
+class ListMeOrderView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = GetOrderSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = (
+        "updated_at",
+        "items__updated_at",
+        "items__product__updated_at",
+        "items__product__card__updated_at",
+    )
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["status", "review_status"]
-    ordering_fields = ["added_on", "delivery_date", "grand_total"]
+    ordering_fields = ["added_on", "delivery_date", "grand_total", "item_count"]
 
     def get_queryset(self):
         return (
             Order.objects.filter(user=self.request.user)
-            .prefetch_related("items")
+            .prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("product__card"))
+            )
             .select_related("user")
             .order_by("pk")
         )
 
 
-class ListMeDeliveredOrdersView(generics.ListAPIView):
+class ListMeDeliveredOrdersView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = DeliveredOrderSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = (
+        "updated_at",
+        "items__updated_at",
+        "items__product__updated_at",
+        "items__product__card__updated_at",
+    )
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["review_status"]
     ordering_fields = ["added_on", "delivery_date"]
@@ -148,19 +193,30 @@ class ListMeDeliveredOrdersView(generics.ListAPIView):
                 user=self.request.user,
                 # review_status__in=["PARTIALLY_REVIEWED", "NOT_REVIEWED"],
             )
+            .prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("product__card"))
+            )
             .select_related("user")
             .order_by("pk")
         )
 
 
-class RetrieveMeDeliveredOrderView(generics.RetrieveAPIView):
+class RetrieveMeDeliveredOrderView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = DeliveredOrderSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = (
+        "updated_at",
+        "items__updated_at",
+        "items__product__updated_at",
+        "items__product__card__updated_at",
+    )
     lookup_field = "uid"
 
     def get_object(self):
         try:
-            order = Order.objects.IS_DELIVERED().get(
+            order = Order.objects.IS_DELIVERED().prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("product__card"))
+            ).get(
                 uid=self.kwargs["order_uid"], review_status__in=["PARTIALLY_REVIEWED", "NOT_REVIEWED"]
             )
             
@@ -172,7 +228,7 @@ class RetrieveMeDeliveredOrderView(generics.RetrieveAPIView):
         # )
 
 
-class AddOrderView(generics.CreateAPIView):
+class AddOrderView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = AddOrderSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
 
@@ -180,7 +236,7 @@ class AddOrderView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class AddOrderItemView(generics.CreateAPIView):
+class AddOrderItemView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = AddOrderItemSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
 
@@ -192,7 +248,7 @@ class AddOrderItemView(generics.CreateAPIView):
     #     return context
 
 
-class RetrieveRemoveOrderItemView(generics.RetrieveDestroyAPIView):
+class RetrieveRemoveOrderItemView(IdempotentMixin, generics.RetrieveDestroyAPIView):
     serializer_class = OrderItemSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
     lookup_field = "item_uid"
@@ -206,60 +262,116 @@ class RetrieveRemoveOrderItemView(generics.RetrieveDestroyAPIView):
         )
 
 
-class OrderDetailsView(generics.RetrieveAPIView):
+class OrderDetailsView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = GetOrderSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
+    conditional_fields = (
+        "updated_at",
+        "items__updated_at",
+        "items__product__updated_at",
+        "items__product__card__updated_at",
+    )
     lookup_field = "uid"
 
     def get_queryset(self):
         return (
             Order.objects.filter(uid=self.kwargs["uid"], user=self.request.user)
-            .prefetch_related("items")
+            .prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("product__card"))
+            )
             .select_related("user")
         )
 
 
-class GetAllOrders(generics.ListAPIView):
+class GetAllOrders(ConditionalGetMixin, generics.ListAPIView):
     # queryset = Order.objects.filter().select_related('user').order_by('pk')
-    serializer_class = OrderSerializer
+    serializer_class = VendorOrderSerializer
     permission_classes = [custom_permissions.IsOrganizationManager]
+    pagination_class = KeysetPagination
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
-    search_fields = ["user__username"]
+    search_fields = ["order__user__username"]
     filterset_fields = ["status"]
     ordering_fields = ["delivery_date"]
 
     def get_queryset(self):
-        user_orgs = UserOrganization.objects.IS_ACTIVE().filter(user=self.request.user).values_list(
-            "organization", flat=True
-        )
-        products = Product.objects.filter(organization__in=user_orgs).values_list(
-            "id", flat=True
-        )
-        order_items = OrderItem.objects.filter(product__in=products).values_list(
-            "order", flat=True
-        )
-
         return (
-            Order.objects.filter(id__in=order_items)
-            .select_related("user")
+            OrderOrganization.objects.filter(
+                organization__in=get_tenant(self.request).organization_ids
+            )
+            .select_related("order__user", "organization")
             .order_by("pk")
         )
 
 
-class RetrieveUpdateOrderView(generics.RetrieveUpdateAPIView):
+class RetrieveUpdateOrderView(IdempotentMixin, generics.RetrieveUpdateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [custom_permissions.IsOrganizationManager]
     lookup_field = "uid"
 
     def get_queryset(self):
-        return Order.objects.filter(uid=self.kwargs["uid"]).select_related("user")
+        vendors = OrderOrganization.objects.filter(
+            order=OuterRef("pk"),
+            organization__in=get_tenant(self.request).organization_ids,
+        )
+        return Order.objects.filter(Exists(vendors), uid=self.kwargs["uid"]).select_related(
+            "user"
+        )
+
+
+class BulkTransitionOrdersView(IdempotentMixin, generics.GenericAPIView):
+    serializer_class = BulkOrderTransitionSerializer
+    permission_classes = [custom_permissions.IsOrganizationManager]
+
+    @extend_schema(responses=OrderTransitionResultSerializer(many=True))
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The permission only asks for a manager role somewhere; orders are
+        # moved only for the organizations the user manages.
+        organization_ids = get_tenant(request).organization_ids_with(
+            custom_permissions.IsOrganizationManager.roles
+        )
+        results = apply_order_transitions(organization_ids, serializer.validated_data["items"])
+        return Response(OrderTransitionResultSerializer(results, many=True).data)
+
+
+class ListOrderChangesView(generics.GenericAPIView):
+    serializer_class = OrderChangesSerializer
+    permission_classes = [custom_permissions.IsOrganizationManager]
+
+    @extend_schema(parameters=[OrderChangesQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query = OrderChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data["since"]
+        limit = query.validated_data["limit"]
+
+        organization_ids = get_tenant(request).organization_ids_with(
+            custom_permissions.IsOrganizationManager.roles
+        )
+
+        sequence_order_events()
+        events = list(
+            OrderEvent.objects.filter(organization__in=organization_ids, sequence__gt=since)
+            .select_related("order", "organization")
+            .order_by("sequence")[: limit + 1]
+        )
+        has_more = len(events) > limit
+        del events[limit:]
+
+        data = {
+            "results": events,
+            "cursor": events[-1].sequence if events else since,
+            "has_more": has_more,
+        }
+        return Response(self.get_serializer(data).data)
 
 
 # class RetrieveUpdateOrderView(generics.RetrieveUpdateAPIView):
 #     serializer_class = OrderSerializer
 
 
-class AddReviewView(generics.CreateAPIView):
+class AddReviewView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
     lookup_field = "uid"
@@ -278,7 +390,7 @@ class AddReviewView(generics.CreateAPIView):
         serializer.save(user=user, order=order)
 
 
-class ListCreateReviewImageView(generics.ListCreateAPIView):
+class ListCreateReviewImageView(IdempotentMixin, generics.ListCreateAPIView):
     serializer_class = ReviewMediaRoomSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
     lookup_field = 'uid'
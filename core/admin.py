@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
 
+from .choices import JobStatusChoices
 from .models import (
     User,
     UserOrganization,
@@ -11,11 +13,20 @@ from .models import (
     CartItem,
     Order,
     OrderItem,
+    OrderEvent,
+    OrderOrganization,
     Review,
     ProductReview,
     MediaRoom,
-    MediaRoomConnector
+    MediaRoomConnector,
+    ProductCard,
+    StockReservation,
+    IdempotencyKey,
+    Job,
+    IssuedToken,
+    RevokedToken,
 )
+from .revocation import revoke_sessions
 
 #Just to test github push!!
 @admin.register(User)
@@ -153,3 +164,71 @@ class MediaRoomConnectorAdmin(admin.ModelAdmin):
     def get_media_name(self, obj):
         return obj.mediaroom.file
     get_media_name.short_description = "media_name"
+
+
+@admin.register(ProductCard)
+class ProductCardAdmin(admin.ModelAdmin):
+    ordering = ["pk"]
+    list_display = ["product", "updated_at"]
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    ordering = ["id"]
+    list_display = ["product", "cart", "quantity", "expires_at"]
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    ordering = ["id"]
+    list_display = ["user", "key", "status_code", "expires_at"]
+
+
+@admin.register(OrderOrganization)
+class OrderOrganizationAdmin(admin.ModelAdmin):
+    ordering = ["id"]
+    list_display = ["order", "organization", "status", "delivery_date"]
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    ordering = ["-id"]
+    list_display = ["sequence", "order", "organization", "kind", "status", "added_on"]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    ordering = ["-id"]
+    list_display = ["name", "status", "attempts", "run_after", "updated_at"]
+    list_filter = ["status", "name"]
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry selected dead jobs")
+    def retry_jobs(self, request, queryset):
+        retried = queryset.filter(status=JobStatusChoices.DEAD).update(
+            status=JobStatusChoices.QUEUED,
+            attempts=0,
+            run_after=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"Queued {retried} job(s) for another try.")
+
+
+@admin.register(IssuedToken)
+class IssuedTokenAdmin(admin.ModelAdmin):
+    ordering = ["-id"]
+    list_display = ["user", "sid", "expires_at", "added_on"]
+    actions = ["revoke_user_sessions"]
+
+    @admin.action(description="Revoke every session of the selected users")
+    def revoke_user_sessions(self, request, queryset):
+        user_ids = set(queryset.values_list("user", flat=True))
+        for user_id in user_ids:
+            revoke_sessions(user_id)
+        self.message_user(request, f"Revoked the sessions of {len(user_ids)} user(s).")
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    ordering = ["-id"]
+    list_display = ["sid", "expires_at", "added_on"]
@@ -0,0 +1,96 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import connection
+from django.utils import timezone
+
+from .choices import OrderStatusChoices
+from .db import values_table
+from .models import DailySales
+
+
+SALES_COLUMNS = [
+    ("organization_id", "bigint"),
+    ("product_id", "bigint"),
+    ("day", "date"),
+    ("lines", "integer"),
+    ("units", "integer"),
+    ("revenue", "double precision"),
+    ("delivered_units", "integer"),
+    ("delivered_revenue", "double precision"),
+]
+
+
+def sales_day(value):
+    """The rollup day of an order placed at `value`, a date or a datetime."""
+    # An order created with its default `added_on` holds a datetime until it
+    # is reloaded; its rows must still land on the same key as the date.
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def item_sales(organization_id, product_id, day, quantity, line_total, status, sign=1):
+    """The rollup delta of an order item being placed (or, with sign=-1, removed)."""
+    delivered = sign if status == OrderStatusChoices.DELIVERED else 0
+    return (
+        organization_id,
+        product_id,
+        day,
+        sign,
+        sign * quantity,
+        sign * line_total,
+        delivered * quantity,
+        delivered * line_total,
+    )
+
+
+def delivery_sales(organization_id, product_id, day, quantity, line_total, old_status, new_status):
+    """The rollup delta of an order item moving from `old_status` to `new_status`."""
+    delivered = (new_status == OrderStatusChoices.DELIVERED) - (
+        old_status == OrderStatusChoices.DELIVERED
+    )
+    return (
+        organization_id,
+        product_id,
+        day,
+        0,
+        0,
+        0.0,
+        delivered * quantity,
+        delivered * line_total,
+    )
+
+
+def record_sales(rows):
+    """
+    Add `rows` of deltas, laid out as `SALES_COLUMNS`, to the daily rollup
+    in one `INSERT ... ON CONFLICT DO UPDATE`. Rows for the same day are
+    summed first, since one statement can't update a row twice, and written
+    in key order so concurrent writers lock them in the same order.
+    """
+    totals = defaultdict(lambda: [0, 0, 0.0, 0, 0.0])
+    for organization_id, product_id, day, *deltas in rows:
+        total = totals[(organization_id, product_id, sales_day(day))]
+        for index, delta in enumerate(deltas):
+            total[index] += delta
+    rows = sorted((*key, *total) for key, total in totals.items() if any(total))
+    if not rows:
+        return
+
+    table = DailySales._meta.db_table
+    names = ", ".join(name for name, _ in SALES_COLUMNS)
+    increments = ",\n".join(
+        f"{name} = s.{name} + EXCLUDED.{name}" for name, _ in SALES_COLUMNS[3:]
+    )
+    values, params = values_table("v", SALES_COLUMNS, rows)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS s ({names})
+            SELECT {names} FROM {values}
+            ON CONFLICT (organization_id, product_id, day) DO UPDATE SET
+            {increments}
+            """,
+            params,
+        )
@@ -6,4 +6,8 @@ class CoreConfig(AppConfig):
     name = 'core'
     
     def ready(self):
+        import core.checks
         import core.signals
+        # Register their jobs for runworkers.
+        import core.forecast
+        import core.sweeps
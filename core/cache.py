@@ -0,0 +1,126 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from rest_framework.response import Response
+
+from .conditional import make_etag, not_modified, set_validators
+from .models import Category, Product
+
+
+CATALOG_VERSION = "catalog:v"
+ORGANIZATIONS_VERSION = "catalog:organizations:v"
+
+
+def organization_version(slug):
+    return f"catalog:organization:{slug}:v"
+
+
+def product_version(slug):
+    return f"catalog:product:{slug}:v"
+
+
+def _seed():
+    # Seeding from the clock instead of 1 means a counter that was evicted
+    # never comes back at a value that old cache entries were keyed under.
+    return int(time.time() * 1000)
+
+
+# Backends whose entries no other process sees.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def cache_is_shared():
+    """Whether a version bumped in one process is seen by all of them."""
+    return not isinstance(caches["default"], PROCESS_LOCAL_CACHES)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _seed(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys):
+    # Bump after commit, otherwise a concurrent reader could cache the old
+    # rows under the new version.
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _seed(), None)
+
+    transaction.on_commit(bump)
+
+
+def bump_product_versions(product_ids, catalog=True):
+    """
+    Invalidate cached pages showing any of the given products. With
+    `catalog=False` the catalog-wide listings are left to expire on their
+    own, for changes (like stock) too frequent to flush the whole catalog on.
+    """
+    rows = Product.objects.filter(pk__in=product_ids).values_list(
+        "slug", "organization__slug"
+    )
+    keys = {CATALOG_VERSION} if catalog else set()
+    for product_slug, organization_slug in rows:
+        keys.add(product_version(product_slug))
+        keys.add(organization_version(organization_slug))
+    bump_versions(*keys)
+
+
+def bump_category_versions(category):
+    organization_slugs = (
+        Category.objects.filter(pk=category.pk)
+        .values_list("product__organization__slug", flat=True)
+        .distinct()
+    )
+    bump_versions(
+        CATALOG_VERSION,
+        *(organization_version(slug) for slug in organization_slugs if slug),
+    )
+
+
+# Caches successful GET responses under the request URL and the version
+# counters returned by `get_cache_versions()`, so writes invalidate exactly
+# the pages that show the changed rows. The same key doubles as the ETag,
+# so conditional requests are answered without touching the database.
+class CachedResponseMixin:
+    cache_timeout = settings.CATALOG_CACHE_TIMEOUT
+
+    def get_cache_versions(self):
+        return [CATALOG_VERSION]
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, sorted(request.query_params.getlist(key)))
+            for key in request.query_params
+        )
+        url = repr((request.get_host(), request.path, params))
+        versions = ".".join(str(version) for version in get_versions(self.get_cache_versions()))
+        return f"response:{hashlib.md5(url.encode()).hexdigest()}:{versions}"
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        etag = make_etag(key)
+        response = not_modified(request, etag)
+        if response is not None:
+            return set_validators(response, etag)
+
+        data = cache.get(key)
+        if data is not None:
+            return set_validators(Response(data), etag)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        return set_validators(response, etag)
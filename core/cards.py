@@ -0,0 +1,57 @@
+from django.conf import settings
+
+from product.serializers import ProductCardSerializer, card_prefetches
+
+from .cache import bump_product_versions
+from .jobs import enqueue_merged, job
+from .models import Product, ProductCard
+
+
+CARD_BATCH_SIZE = 500
+
+
+@job
+def build_product_cards(product_ids):
+    """Re-render and upsert the cards of the given products."""
+    product_ids = sorted(set(product_ids))
+    for start in range(0, len(product_ids), CARD_BATCH_SIZE):
+        batch = product_ids[start : start + CARD_BATCH_SIZE]
+        products = Product.objects.filter(pk__in=batch).prefetch_related(
+            *card_prefetches()
+        )
+        cards = [
+            ProductCard(product=product, document=ProductCardSerializer(product).data)
+            for product in products
+        ]
+        ProductCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["document", "updated_at"],
+        )
+        # Pages cached between the write and this rebuild hold the old card.
+        bump_product_versions(batch)
+
+
+def refresh_product_cards(product_ids):
+    """
+    Rebuild the given products' cards on the job queue once the current
+    transaction commits. Writes within PRODUCT_CARD_DELAY of each other
+    share one rebuild.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        enqueue_merged(
+            build_product_cards,
+            "product_ids",
+            product_ids,
+            delay=settings.PRODUCT_CARD_DELAY,
+        )
+
+
+def touch_products(product_ids):
+    """Invalidate every cached page showing the given products and rebuild their cards."""
+    product_ids = set(product_ids)
+    bump_product_versions(product_ids)
+    refresh_product_cards(product_ids)
+
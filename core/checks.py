@@ -0,0 +1,24 @@
+from django.core.checks import Tags, Warning, register
+from rest_framework.settings import api_settings
+
+from .cache import cache_is_shared
+from .claims import ClaimsJWTAuthentication
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # Claims and revocation checks fall back to the database on a
+    # process-local cache (see core/claims.py), which is correct but gives
+    # up the point of signing claims into tokens.
+    if cache_is_shared():
+        return []
+    if ClaimsJWTAuthentication not in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        return []
+    return [
+        Warning(
+            "The default cache is process-local, so every authenticated request "
+            "loads its user and checks revocation in the database.",
+            hint="Set REDIS_URL so that all processes share one cache.",
+            id="core.W001",
+        )
+    ]
@@ -109,6 +109,11 @@ class OrderStatusChoices(TextChoices):
     # ]
 
 
+class OrderEventChoices(TextChoices):
+    CREATED = "CREATED", "Created"
+    STATUS_CHANGED = "STATUS_CHANGED", "Status Changed"
+
+
 class ReviewStatusChoices(TextChoices):
     REVIEWED = "REVIEWED", "Reviewed"
     NOT_REVIEWED = "NOT_REVIEWED", "Not Reviewed"
@@ -129,3 +134,9 @@ class ReviewStatusForOrderChoices(TextChoices):
     #     (PARTIALLYREVIEWED, 'Partially Reviewed'),
     #     (NOTREVIEWED, 'Not Reviewed'),
     # ]
+
+
+class JobStatusChoices(TextChoices):
+    QUEUED = "QUEUED", "Queued"
+    RUNNING = "RUNNING", "Running"
+    DEAD = "DEAD", "Dead"
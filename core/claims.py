@@ -0,0 +1,105 @@
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import bump_versions, cache_is_shared, get_versions
+from .models import User
+from .revocation import is_revoked
+from .roles import user_memberships
+
+
+CLAIMS_VERSION_CLAIM = "cv"
+
+
+def claims_version(user_id):
+    return f"claims:{user_id}:v"
+
+
+def stamp_claims(token, user):
+    """
+    Sign what permission checks need about `user` into the access `token`:
+    its status and staff flags, its active memberships and the claims
+    version they were read at.
+    """
+    # Read the version first: a change landing in between then only makes
+    # the new claims look stale, never old claims look current.
+    token[CLAIMS_VERSION_CLAIM] = get_versions([claims_version(user.pk)])[0]
+    for name in User.CLAIM_FIELDS:
+        token[name] = getattr(user, name)
+    token["orgs"] = [list(membership) for membership in user_memberships(user.pk)]
+    return token
+
+
+def invalidate_claims(user_id):
+    """Stop trusting the claims of every access token the user holds."""
+    bump_versions(claims_version(user_id))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the claims stamped by `stamp_claims()`.
+
+    On safe methods a token whose claims version is still current is turned
+    into a `User` without a query: only the primary key and the claimed
+    fields are set, the rest are deferred. Writes and stale or unstamped
+    tokens load the user from the database as usual, and so does every
+    request while the cache is process-local, since a claims version bumped
+    by another process would go unseen. Tokens of revoked sessions are
+    rejected either way.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in permissions.SAFE_METHODS and cache_is_shared():
+            user = self.get_claims_user(validated_token)
+            if user is not None:
+                # Permission checks read memberships from the claims too.
+                request._request._memberships = tuple(
+                    tuple(membership) for membership in validated_token["orgs"]
+                )
+                return user, validated_token
+
+        return self.get_user(validated_token), validated_token
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_revoked(validated_token):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_claims_user(self, validated_token):
+        version = validated_token.get(CLAIMS_VERSION_CLAIM)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if version is None or user_id is None:
+            return None
+        if version != get_versions([claims_version(user_id)])[0]:
+            return None
+
+        claims = {name: validated_token[name] for name in User.CLAIM_FIELDS}
+        if not claims["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        claims[User._meta.pk.attname] = user_id
+        field_names = [
+            field.attname for field in User._meta.concrete_fields if field.attname in claims
+        ]
+        return User.from_db(
+            router.db_for_read(User), field_names, [claims[name] for name in field_names]
+        )
+
+
+# Documents the class as the bearer JWT scheme it extends.
+class ClaimsJWTScheme(SimpleJWTScheme):
+    target_class = ClaimsJWTAuthentication
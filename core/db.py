@@ -0,0 +1,32 @@
+from django.db import connection
+
+
+def values_table(alias, columns, rows):
+    """
+    SQL for a `(VALUES ...) AS alias(columns)` relation holding `rows`, for
+    set-based UPDATE ... FROM and joins.
+
+    `columns` is a sequence of `(name, postgres type)`. Every placeholder is
+    cast, so Postgres doesn't infer the column types from the first row.
+    Returns `(sql, params)`.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(f"%s::{db_type}" for _, db_type in columns)
+    values = ", ".join(f"({placeholders})" for _ in rows)
+    names = ", ".join(quote(name) for name, _ in columns)
+    params = [value for row in rows for value in row]
+    return f"(VALUES {values}) AS {quote(alias)} ({names})", params
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Delete `queryset`'s rows `batch_size` at a time and return how many went.
+    Housekeeping deletes run as many short statements rather than one long
+    one, so they never hold locks or bloat a transaction for long.
+    """
+    deleted = 0
+    while True:
+        batch = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,16 @@
+from autoslug import AutoSlugField
+
+
+class BulkAutoSlugField(AutoSlugField):
+    """
+    AutoSlugField that keeps a slug reserved up front by `reserve_slugs`.
+
+    AutoSlugField looks for a rival row on every save, which turns a
+    `bulk_create` into one query per row. Bulk writers reserve the slugs of
+    a whole batch in a few queries instead.
+    """
+
+    def pre_save(self, instance, add):
+        if add and getattr(instance, "_slug_reserved", False):
+            return getattr(instance, self.attname)
+        return super().pre_save(instance, add)
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .choices import ProductStatusChoices
+from .jobs import job
+from .models import DailySales, Product, ReorderSuggestion
+from .reservations import reserved_stock
+
+
+FORECAST_BATCH_SIZE = 5000
+
+
+@job
+def forecast_demand(organization_id):
+    """
+    Recompute the reorder suggestions of one organization's products from
+    the daily sales rollup.
+
+    Products are taken in chunks. For each chunk the last
+    FORECAST_WINDOW_DAYS of sales become one (products x days) array, so
+    moving averages, days of cover and reorder points come out of a few
+    array operations instead of a loop per product.
+    """
+    today = timezone.localdate()
+    product_ids = list(
+        Product.objects.filter(organization_id=organization_id)
+        .exclude(status=ProductStatusChoices.REMOVED)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+    suggestions = []
+    for start in range(0, len(product_ids), FORECAST_BATCH_SIZE):
+        suggestions.extend(
+            _forecast_batch(
+                organization_id, product_ids[start : start + FORECAST_BATCH_SIZE], today
+            )
+        )
+
+    ReorderSuggestion.objects.filter(organization_id=organization_id).exclude(
+        product__in=[suggestion.product_id for suggestion in suggestions]
+    ).delete()
+    ReorderSuggestion.objects.bulk_create(
+        suggestions,
+        batch_size=FORECAST_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=[
+            "available_stock",
+            "average_daily_demand",
+            "days_of_cover",
+            "reorder_point",
+            "suggested_quantity",
+            "computed_at",
+        ],
+    )
+    return len(suggestions)
+
+
+def _forecast_batch(organization_id, product_ids, today):
+    window = settings.FORECAST_WINDOW_DAYS
+    first_day = today - timedelta(days=window)
+    ids = np.array(product_ids, dtype=np.int64)
+
+    available = np.zeros(len(ids), dtype=np.int64)
+    stock = Product.objects.filter(pk__in=product_ids).annotate(reserved=reserved_stock())
+    for pk, units, reserved in stock.values_list("pk", "stock", "reserved"):
+        available[np.searchsorted(ids, pk)] = units - reserved
+
+    # Sales up to yesterday: today's are still coming in.
+    sales = list(
+        DailySales.objects.filter(
+            product__in=product_ids, day__gte=first_day, day__lt=today
+        ).values_list("product_id", "day", "units")
+    )
+    demand = np.zeros((len(ids), window))
+    if sales:
+        products, days, units = zip(*sales)
+        rows = np.searchsorted(ids, np.array(products, dtype=np.int64))
+        columns = (
+            np.array(days, dtype="datetime64[D]") - np.datetime64(first_day, "D")
+        ).astype(np.int64)
+        np.add.at(demand, (rows, columns), np.array(units, dtype=np.float64))
+
+    # The short average reacts to a recent surge the long one would smooth out.
+    rate = np.maximum(
+        demand.mean(axis=1),
+        demand[:, -settings.FORECAST_SHORT_WINDOW_DAYS :].mean(axis=1),
+    )
+    cover = np.divide(
+        available, rate, out=np.full(len(ids), np.inf), where=rate > 0
+    )
+    reorder_point = np.ceil(
+        rate * (settings.REORDER_LEAD_TIME_DAYS + settings.REORDER_SAFETY_DAYS)
+    )
+    target = np.ceil(rate * (settings.REORDER_LEAD_TIME_DAYS + settings.REORDER_COVER_DAYS))
+    suggested = np.maximum(target - available, 0)
+
+    for index in np.flatnonzero((rate > 0) & (available <= reorder_point)):
+        yield ReorderSuggestion(
+            product_id=int(ids[index]),
+            organization_id=organization_id,
+            available_stock=int(available[index]),
+            average_daily_demand=round(float(rate[index]), 3),
+            days_of_cover=round(max(float(cover[index]), 0.0), 2),
+            reorder_point=int(reorder_point[index]),
+            suggested_quantity=int(suggested[index]),
+        )
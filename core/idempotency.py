@@ -0,0 +1,161 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework import permissions, status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = sorted(data.lists())
+    files = sorted(
+        (name, file_digest(file)) for name, file in getattr(request, "FILES", {}).items()
+    )
+    payload = json.dumps(
+        [request.method, request.path, data, files], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Makes every unsafe method (POST, PUT, PATCH, DELETE) safe to retry. A
+# request carrying an `Idempotency-Key` header runs at most once per user
+# and key; retries get the stored response back.
+#
+# The key row is inserted in the same transaction as the handler's writes,
+# so a concurrent retry blocks on it until the first attempt commits (and
+# then replays it) or rolls back (and then runs itself). Requests that fail
+# with an exception leave nothing behind and can be retried as new.
+#
+# Views whose handlers commit their own work in batches (bulk uploads) set
+# `idempotent_atomic = False`: the key is then claimed and answered in two
+# short transactions around the handler, and a retry arriving while it runs
+# gets 409 Conflict instead of waiting on it. A claim left behind by a
+# request that died is taken over after IDEMPOTENCY_CLAIM_TIME.
+#
+# The handler is wrapped in `initial()`, once the request is authenticated,
+# rather than by defining post/put/patch/delete here: those would make every
+# view using the mixin advertise methods it doesn't implement.
+class IdempotentMixin:
+    idempotent_atomic = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        method = request.method.lower()
+        if request.method not in permissions.SAFE_METHODS and hasattr(self, method):
+            handler = getattr(self, method)
+            setattr(
+                self,
+                method,
+                lambda request, *args, **kwargs: self.run_idempotent(
+                    handler, request, *args, **kwargs
+                ),
+            )
+
+    def run_idempotent(self, handler, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} is too long."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        if not self.idempotent_atomic:
+            return self.run_claimed(handler, key, fingerprint, request, *args, **kwargs)
+
+        now = timezone.now()
+        with transaction.atomic():
+            IdempotencyKey.objects.bulk_create(
+                [
+                    IdempotencyKey(
+                        user=request.user,
+                        key=key,
+                        fingerprint=fingerprint,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            record = IdempotencyKey.objects.select_for_update().get(
+                user=request.user, key=key
+            )
+
+            if record.status_code is not None and record.expires_at > now:
+                return replay_response(record, fingerprint)
+
+            response = handler(request, *args, **kwargs)
+            record.fingerprint = fingerprint
+            record.status_code = response.status_code
+            record.response = response.data
+            record.expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            record.save(update_fields=["fingerprint", "status_code", "response", "expires_at"])
+        return response
+
+    def run_claimed(self, handler, key, fingerprint, request, *args, **kwargs):
+        now = timezone.now()
+        # The claim's expiry doubles as its token: a request that took the
+        # key over after it expired wrote a different one.
+        claim = {
+            "fingerprint": fingerprint,
+            "status_code": None,
+            "response": None,
+            "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIME),
+        }
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+                user=request.user, key=key, defaults=claim
+            )
+            if not created:
+                if record.expires_at > now:
+                    if record.status_code is not None:
+                        return replay_response(record, fingerprint)
+                    return Response(
+                        {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still running."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                for field, value in claim.items():
+                    setattr(record, field, value)
+                record.save(update_fields=list(claim))
+
+        claimed = IdempotencyKey.objects.filter(pk=record.pk, expires_at=claim["expires_at"])
+        try:
+            response = handler(request, *args, **kwargs)
+        except Exception:
+            claimed.delete()
+            raise
+        claimed.update(
+            status_code=response.status_code,
+            response=response.data,
+            expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+        )
+        return response
+
+
+def replay_response(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        detail = f"{IDEMPOTENCY_HEADER} was already used for a different request."
+        return Response({"detail": detail}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(record.response, status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
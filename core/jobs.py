@@ -0,0 +1,236 @@
+import logging
+import threading
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+
+from .choices import JobStatusChoices
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+PERIODIC_JOBS = {}
+
+
+def job(func):
+    """Register `func` as a job that `enqueue()` can schedule."""
+    func.job_name = f"{func.__module__}.{func.__name__}"
+    func.job_atomic = getattr(func, "job_atomic", True)
+    JOBS[func.job_name] = func
+    return func
+
+
+def periodic(interval, atomic=True):
+    """
+    Register `func` as a job that runs every `interval` seconds. Each one
+    keeps a single row that is rescheduled after every run instead of
+    deleted; `schedule_periodic_jobs()` creates the missing rows. Jobs that
+    commit their own work as they go pass `atomic=False`.
+    """
+
+    def register(func):
+        func.job_atomic = atomic
+        func = job(func)
+        PERIODIC_JOBS[func.job_name] = interval
+        return func
+
+    return register
+
+
+def schedule_periodic_jobs():
+    """Queue every periodic job that has no pending row yet."""
+    with transaction.atomic():
+        # Workers started together must not both add the row.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [__name__])
+        pending = set(
+            Job.objects.filter(name__in=PERIODIC_JOBS)
+            .exclude(status=JobStatusChoices.DEAD)
+            .values_list("name", flat=True)
+        )
+        Job.objects.bulk_create(
+            [
+                Job(name=name, max_attempts=settings.JOB_MAX_ATTEMPTS)
+                for name in sorted(PERIODIC_JOBS.keys() - pending)
+            ]
+        )
+
+
+def enqueue(func, run_after=None, **payload):
+    """
+    Schedule `func(**payload)` on the job queue. The row is written in the
+    caller's transaction, so the job only exists if that transaction commits.
+    """
+    return Job.objects.create(
+        name=func.job_name,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def enqueue_merged(func, field, values, delay=0, limit=10000):
+    """
+    Schedule `func(**{field: values})`, folding `values` into a job of `func`
+    that is still waiting to run instead of adding a row per call.
+
+    The waiting job is locked until the caller's transaction ends, so no
+    worker can start it before the writes it now covers are visible. Jobs
+    other callers hold are skipped; a new one is added instead, after
+    `delay` seconds so bursts of writes have time to fold into it.
+    """
+    values = set(values)
+    with transaction.atomic():
+        pending = (
+            Job.objects.filter(
+                name=func.job_name,
+                status=JobStatusChoices.QUEUED,
+                run_after__gt=timezone.now(),
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("-pk")
+            .first()
+        )
+        if pending is not None:
+            merged = set(pending.payload[field]) | values
+            if len(merged) <= limit:
+                if len(merged) > len(pending.payload[field]):
+                    pending.payload[field] = sorted(merged)
+                    pending.save(update_fields=["payload", "updated_at"])
+                return pending
+        return enqueue(
+            func,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            **{field: sorted(values)},
+        )
+
+
+def claim_jobs(limit=1):
+    """
+    Lease up to `limit` ready jobs to the calling worker. Rows other workers
+    hold are skipped rather than waited on (FOR UPDATE SKIP LOCKED), so any
+    number of workers can poll the same table.
+    """
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.IS_READY()
+            .select_for_update(skip_locked=True)
+            .order_by("run_after", "id")[:limit]
+        )
+        if not jobs:
+            return []
+        now = timezone.now()
+        for claimed in jobs:
+            claimed.status = JobStatusChoices.RUNNING
+            claimed.attempts += 1
+            claimed.run_after = now + timedelta(seconds=settings.JOB_LEASE_TIME)
+            claimed.updated_at = now
+        Job.objects.bulk_update(jobs, ["status", "attempts", "run_after", "updated_at"])
+    return jobs
+
+
+def run_job(claimed):
+    """
+    Run a claimed job in its own transaction (unless it was registered as
+    non-atomic). Success deletes it, or reschedules a periodic job; failure
+    schedules a retry with exponential backoff, or marks it DEAD once it is
+    out of attempts.
+
+    The lease is renewed while the job runs, and the outcome is only written
+    if the row is still on the attempt this worker claimed: once another
+    worker has taken the job over, that worker's run decides what happens.
+    """
+    func = JOBS.get(claimed.name)
+    attempt = claimed.attempts
+    stopping = threading.Event()
+    heartbeat = threading.Thread(target=_renew_lease, args=(claimed, stopping), daemon=True)
+    heartbeat.start()
+    try:
+        if func is None:
+            raise LookupError(f"No job is registered as {claimed.name}.")
+        if claimed.attempts > claimed.max_attempts:
+            raise RuntimeError("The job's lease expired on its last attempt.")
+        with transaction.atomic() if func.job_atomic else nullcontext():
+            func(**claimed.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed", claimed.pk, claimed.name)
+        stopping.set()
+        heartbeat.join()
+        claimed.last_error = traceback.format_exc()
+        if claimed.name in PERIODIC_JOBS and claimed.attempts >= claimed.max_attempts:
+            # Give up on this run, not on the schedule.
+            _reschedule(claimed)
+        elif func is None or claimed.attempts >= claimed.max_attempts:
+            claimed.status = JobStatusChoices.DEAD
+        else:
+            claimed.status = JobStatusChoices.QUEUED
+            backoff = min(
+                settings.JOB_RETRY_BACKOFF * 2 ** (claimed.attempts - 1),
+                settings.JOB_RETRY_BACKOFF_MAX,
+            )
+            claimed.run_after = timezone.now() + timedelta(seconds=backoff)
+        _save_outcome(claimed, attempt)
+        return False
+    else:
+        stopping.set()
+        heartbeat.join()
+        if claimed.name in PERIODIC_JOBS:
+            claimed.last_error = ""
+            _reschedule(claimed)
+            _save_outcome(claimed, attempt)
+        elif not Job.objects.filter(pk=claimed.pk, attempts=attempt).delete()[0]:
+            _lost_lease(claimed)
+        return True
+    finally:
+        close_old_connections()
+
+
+def _renew_lease(claimed, stopping):
+    # Push the lease forward every third of JOB_LEASE_TIME until the job
+    # ends, so only a worker that stopped running it lets it be reclaimed.
+    interval = settings.JOB_LEASE_TIME / 3
+    try:
+        while not stopping.wait(interval):
+            renewed = Job.objects.filter(
+                pk=claimed.pk, attempts=claimed.attempts, status=JobStatusChoices.RUNNING
+            ).update(
+                run_after=timezone.now() + timedelta(seconds=settings.JOB_LEASE_TIME),
+                updated_at=timezone.now(),
+            )
+            if not renewed:
+                _lost_lease(claimed)
+                return
+    finally:
+        connections.close_all()
+
+
+def _save_outcome(claimed, attempt):
+    saved = Job.objects.filter(pk=claimed.pk, attempts=attempt).update(
+        status=claimed.status,
+        attempts=claimed.attempts,
+        run_after=claimed.run_after,
+        last_error=claimed.last_error,
+        updated_at=timezone.now(),
+    )
+    if not saved:
+        _lost_lease(claimed)
+
+
+def _lost_lease(claimed):
+    logger.warning(
+        "Job %s (%s) was taken over by another worker; its outcome is not recorded.",
+        claimed.pk,
+        claimed.name,
+    )
+
+
+def _reschedule(claimed):
+    claimed.status = JobStatusChoices.QUEUED
+    claimed.attempts = 0
+    claimed.run_after = timezone.now() + timedelta(seconds=PERIODIC_JOBS[claimed.name])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.sweeps import SWEEP_BATCH_SIZE, expire_stock_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired stock reservations in batches. runworkers also does this every EXPIRY_SWEEP_INTERVAL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SWEEP_BATCH_SIZE,
+            help="Number of rows deleted per statement.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = expire_stock_reservations(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired reservations."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.forecast import forecast_demand
+from core.jobs import enqueue
+from core.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute reorder suggestions for every active organization (or the "
+        "given organization slugs) on the job queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("organizations", nargs="*", help="Organization slugs.")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run the forecasts here instead of queueing them for runworkers.",
+        )
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.IS_ACTIVE()
+        if options["organizations"]:
+            organizations = organizations.filter(slug__in=options["organizations"])
+
+        count = 0
+        for organization_id in organizations.values_list("pk", flat=True):
+            if options["sync"]:
+                forecast_demand(organization_id)
+            else:
+                enqueue(forecast_demand, organization_id=organization_id)
+            count += 1
+
+        action = "Forecast" if options["sync"] else "Queued forecasts for"
+        self.stdout.write(self.style.SUCCESS(f"{action} {count} organizations."))
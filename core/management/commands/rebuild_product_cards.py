@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.cards import build_product_cards
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = "Re-render the stored card of every product (or of the given product ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="*", type=int)
+
+    def handle(self, *args, **options):
+        product_ids = options["product_ids"] or list(
+            Product.objects.values_list("pk", flat=True)
+        )
+        build_product_cards(product_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt cards for {len(set(product_ids))} products.")
+        )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from core.models import Product, ProductReview
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product rating aggregates and star histograms from ProductReview."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of product ids updated per statement.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        reviews = ProductReview.objects.filter(product=OuterRef("pk")).values("product")
+
+        def aggregate(expression):
+            return Subquery(reviews.annotate(value=expression).values("value"))
+
+        histogram = {
+            f"rating_count_{rating}": Coalesce(
+                aggregate(Count("pk", filter=Q(review__rating=rating))), 0
+            )
+            for rating in range(1, 6)
+        }
+
+        last_pk = Product.objects.aggregate(last=Max("pk"))["last"] or 0
+        updated = 0
+        for start in range(0, last_pk + 1, batch_size):
+            updated += Product.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).update(
+                review_count=Coalesce(aggregate(Count("pk")), 0),
+                rating_sum=Coalesce(aggregate(Sum("review__rating")), 0),
+                avg_rating=Coalesce(aggregate(Round(Avg("review__rating"), 2)), Value(0.0)),
+                **histogram,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} products."))
@@ -0,0 +1,94 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from core.jobs import claim_jobs, run_job, schedule_periodic_jobs
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the job queue with a pool of processes and threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of worker threads per process.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds an idle thread waits before polling the queue again.",
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        # Periodic jobs, such as the expiry sweeps, keep a row on the queue.
+        schedule_periodic_jobs()
+        self.stdout.write(
+            f"Starting {processes} process(es) with {options['threads']} thread(s) each."
+        )
+        if processes == 1:
+            work(options["threads"], options["poll_interval"])
+            return
+
+        # Children must not inherit the parent's database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=work, args=(options["threads"], options["poll_interval"])
+            )
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        # SIGTERM asks a worker to finish its running jobs and exit.
+        def stop(*args):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for worker in workers:
+            worker.join()
+
+
+def work(threads, poll_interval):
+    """Run `threads` polling threads until SIGTERM or SIGINT."""
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopping.set())
+
+    pool = [
+        threading.Thread(target=poll, args=(stopping, poll_interval), daemon=True)
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    # Let running jobs finish; a job cut off anyway is retried after its lease.
+    for thread in pool:
+        thread.join()
+
+
+def poll(stopping, poll_interval):
+    while not stopping.is_set():
+        close_old_connections()
+        claimed = claim_jobs()
+        if not claimed:
+            stopping.wait(poll_interval)
+            continue
+        for job in claimed:
+            run_job(job)
+    connections.close_all()
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import BaseUserManager
 from django.db.models import Manager
+from django.db.models.functions import Now
 
-from .choices import OrderStatusChoices, ProductStatusChoices, ProductStockChoices, ReviewStatusChoices, StatusChoices
+from .choices import JobStatusChoices, OrderStatusChoices, ProductStatusChoices, ProductStockChoices, ReviewStatusChoices, StatusChoices
 
 
 class UserManager(BaseUserManager):
@@ -153,3 +154,24 @@ class OrderItemManager(OrderStatusChoiceManager, ReviewStatusChoiceManager):
     
     def IS_NOT_REVIEWED(self):
         return super().IS_NOT_REVIEWED()
+    
+
+class StockReservationManager(Manager):
+    def IS_ACTIVE(self):
+        return self.filter(expires_at__gt=Now())
+
+    def IS_EXPIRED(self):
+        return self.filter(expires_at__lte=Now())
+
+
+class JobManager(Manager):
+    def IS_READY(self):
+        # A RUNNING job past `run_after` has outlived its lease: its worker
+        # stopped renewing it.
+        return self.filter(
+            status__in=[JobStatusChoices.QUEUED, JobStatusChoices.RUNNING],
+            run_after__lte=Now(),
+        )
+
+    def IS_DEAD(self):
+        return self.filter(status=JobStatusChoices.DEAD)
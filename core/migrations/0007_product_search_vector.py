@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_category_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_product p SET search_vector =
+                    setweight(to_tsvector('english', COALESCE(p.name, '')), 'A')
+                    || setweight(to_tsvector('english', COALESCE(p.brand, '')), 'B')
+                    || setweight(to_tsvector('english', COALESCE((
+                        SELECT string_agg(c.name, ' ')
+                        FROM core_productcategory pc
+                        JOIN core_category c ON c.id = pc.category_id
+                        WHERE pc.product_id = p.id AND c.status = 'ACTIVE'
+                    ), '')), 'C')
+                    || setweight(to_tsvector('english', COALESCE(p.description, '')), 'D');
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_product_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_product p SET review_count = s.review_count, rating_sum = s.rating_sum
+                FROM (
+                    SELECT pr.product_id, COUNT(*) AS review_count, SUM(r.rating) AS rating_sum
+                    FROM core_productreview pr
+                    JOIN core_review r ON r.id = pr.review_id
+                    GROUP BY pr.product_id
+                ) s
+                WHERE p.id = s.product_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
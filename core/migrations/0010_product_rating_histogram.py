@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', '-added_on', '-id'], name='productreview_product_recent'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_product p SET
+                    rating_count_1 = s.c1, rating_count_2 = s.c2, rating_count_3 = s.c3,
+                    rating_count_4 = s.c4, rating_count_5 = s.c5
+                FROM (
+                    SELECT pr.product_id,
+                        COUNT(*) FILTER (WHERE r.rating = 1) AS c1,
+                        COUNT(*) FILTER (WHERE r.rating = 2) AS c2,
+                        COUNT(*) FILTER (WHERE r.rating = 3) AS c3,
+                        COUNT(*) FILTER (WHERE r.rating = 4) AS c4,
+                        COUNT(*) FILTER (WHERE r.rating = 5) AS c5
+                    FROM core_productreview pr
+                    JOIN core_review r ON r.id = pr.review_id
+                    GROUP BY pr.product_id
+                ) s
+                WHERE p.id = s.product_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:15
+
+import core.fields
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=core.fields.BulkAutoSlugField(editable=False, populate_from=core.utils.generate_category_slug, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=core.fields.BulkAutoSlugField(editable=False, populate_from=core.utils.generate_product_slug, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='slug',
+            field=core.fields.BulkAutoSlugField(editable=False, populate_from=core.utils.generate_product_category_slug, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('organization', 'sku'), name='product_organization_sku_unique'),
+        ),
+        # Drop duplicate category links, keeping the oldest, so the
+        # constraint below can be created.
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM core_productcategory pc
+                USING core_productcategory kept
+                WHERE pc.product_id = kept.product_id
+                  AND pc.category_id = kept.category_id
+                  AND pc.id > kept.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='productcategory',
+            constraint=models.UniqueConstraint(fields=('product', 'category'), name='productcategory_product_category_unique'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:19
+
+import core.fields
+import core.utils
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_product_sku_bulk_upsert'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='slug',
+            field=core.fields.BulkAutoSlugField(editable=False, populate_from=core.utils.generate_order_slug, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='slug',
+            field=core.fields.BulkAutoSlugField(editable=False, populate_from=core.utils.generate_order_item_slug, unique=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='grand_total',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.FloatField(default=0),
+        ),
+        # Existing orders never stored a price; the current one is the best
+        # snapshot available.
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_orderitem oi SET
+                    unit_price = p.price,
+                    line_total = p.price * oi.quantity
+                FROM core_product p
+                WHERE p.id = oi.product_id;
+
+                UPDATE core_order o SET
+                    grand_total = s.grand_total,
+                    item_count = s.item_count
+                FROM (
+                    SELECT order_id,
+                        SUM(line_total) AS grand_total,
+                        SUM(quantity) AS item_count
+                    FROM core_orderitem
+                    GROUP BY order_id
+                ) s
+                WHERE o.id = s.order_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'grand_total'], name='order_user_grand_total'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderOrganization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered')], default='NEW', max_length=20)),
+                ('delivery_date', models.DateField(default=django.utils.timezone.now)),
+                ('grand_total', models.FloatField(default=0)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('added_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendors', to='core.order')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='vendor_orders', to='core.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'status', 'delivery_date'], name='orderorganization_dashboard')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'organization'), name='orderorganization_order_organization_unique')],
+            },
+        ),
+        migrations.RunSQL(
+            # A vendor's items are always updated together, so they share
+            # one delivery status.
+            sql="""
+                INSERT INTO core_orderorganization (
+                    order_id, organization_id, status, delivery_date,
+                    grand_total, item_count, added_on, updated_at
+                )
+                SELECT
+                    oi.order_id,
+                    p.organization_id,
+                    MAX(oi.delivery_status),
+                    MAX(o.delivery_date),
+                    SUM(oi.line_total),
+                    SUM(oi.quantity),
+                    MIN(oi.added_on),
+                    MAX(oi.updated_at)
+                FROM core_orderitem oi
+                JOIN core_product p ON p.id = oi.product_id
+                JOIN core_order o ON o.id = oi.order_id
+                GROUP BY oi.order_id, p.organization_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_order_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CREATED', 'Created'), ('STATUS_CHANGED', 'Status Changed')], max_length=20)),
+                ('status', models.CharField(choices=[('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered')], max_length=20)),
+                ('order_status', models.CharField(choices=[('PROCESSING', 'Processing'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered')], max_length=20)),
+                ('added_on', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='core.order')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='order_events', to='core.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'id'], name='orderevent_organization_seq')],
+            },
+        ),
+    ]
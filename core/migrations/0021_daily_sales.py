@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('delivered_units', models.IntegerField(default=0)),
+                ('delivered_revenue', models.FloatField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.organization')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'day'], name='dailysales_organization_day')],
+                'constraints': [models.UniqueConstraint(fields=('organization', 'product', 'day'), name='dailysales_organization_product_day_unique')],
+            },
+        ),
+    ]
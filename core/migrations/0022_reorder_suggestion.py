@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_daily_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_suggestion', serialize=False, to='core.product')),
+                ('available_stock', models.IntegerField()),
+                ('average_daily_demand', models.FloatField()),
+                ('days_of_cover', models.FloatField()),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('suggested_quantity', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_suggestions', to='core.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'days_of_cover'], name='reordersuggestion_cover')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_token_revocation'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='dailysales',
+            old_name='orders',
+            new_name='lines',
+        ),
+    ]
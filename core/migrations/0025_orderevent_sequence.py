@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_rename_dailysales_orders_lines'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderevent',
+            name='orderevent_organization_seq',
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='sequence',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        # Existing events keep their ids as sequence numbers, so cursors
+        # handed out before stay valid.
+        migrations.RunSQL(
+            sql="""
+                CREATE SEQUENCE core_orderevent_sequence_seq;
+                UPDATE core_orderevent SET sequence = id;
+                SELECT setval(
+                    'core_orderevent_sequence_seq',
+                    COALESCE((SELECT max(id) FROM core_orderevent), 0) + 1,
+                    false
+                );
+            """,
+            reverse_sql="DROP SEQUENCE core_orderevent_sequence_seq;",
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['organization', 'sequence'], name='orderevent_organization_seq'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(condition=models.Q(('sequence__isnull', True)), fields=['id'], name='orderevent_unsequenced'),
+        ),
+    ]
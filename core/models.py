@@ -2,8 +2,13 @@ import uuid
 
 from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, Round
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 from autoslug import AutoSlugField
@@ -13,7 +18,9 @@ from versatileimagefield.fields import VersatileImageField
 
 from .choices import (
     GenderChoices,
+    JobStatusChoices,
     OrderCreateChoices,
+    OrderEventChoices,
     OrderStatusChoices,
     ProductStatusChoices,
     ProductStockChoices,
@@ -21,12 +28,15 @@ from .choices import (
     RoleChoices,
     StatusChoices,
 )
+from .fields import BulkAutoSlugField
 from .managers import (
     CategoryManager,
+    JobManager,
     OrderItemManager,
     OrderManager,
     OrganizationManager,
     ProductManager,
+    StockReservationManager,
     UserManager,
     UserOrganizationManager,
 )
@@ -74,12 +84,34 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
+    # Signed into access tokens by core/claims.py.
+    CLAIM_FIELDS = ("status", "is_active", "is_staff", "is_superuser")
 
     objects = UserManager()
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Kept to tell whether a save changed what the user's tokens claim.
+        user._loaded_claims = user.get_claim_values()
+        return user
+
+    def get_claim_values(self):
+        deferred = self.get_deferred_fields()
+        return {
+            name: getattr(self, name) for name in self.CLAIM_FIELDS if name not in deferred
+        }
+
+    def claims_changed(self):
+        """Whether a claim field differs from what was loaded from the database."""
+        loaded = getattr(self, "_loaded_claims", None)
+        if loaded is None:
+            return True
+        return any(getattr(self, name) != value for name, value in loaded.items())
+
 
 class Organization(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -117,7 +149,7 @@ class UserOrganization(models.Model):
     status = models.CharField(choices=StatusChoices, default=StatusChoices.ACTIVE)
     salary = models.FloatField()
     date_joined = models.DateField(auto_now_add=True)
-    updated_at = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     objects = UserOrganizationManager()
     
@@ -127,7 +159,7 @@ class UserOrganization(models.Model):
 
 class Category(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    slug = AutoSlugField(populate_from=generate_category_slug, unique=True)
+    slug = BulkAutoSlugField(populate_from=generate_category_slug, unique=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     status = models.CharField(
@@ -144,7 +176,8 @@ class Category(models.Model):
 
 class Product(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    slug = AutoSlugField(populate_from=generate_product_slug, unique=True)
+    slug = BulkAutoSlugField(populate_from=generate_product_slug, unique=True)
+    sku = models.CharField(max_length=64, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     brand = models.CharField(max_length=255)
@@ -158,6 +191,13 @@ class Product(models.Model):
         max_length=20, choices=ProductStockChoices, default=ProductStockChoices.IN_STOCK
     )
     avg_rating = models.FloatField(default=0, blank=True)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_5 = models.PositiveIntegerField(default=0, editable=False)
     status = models.CharField(
         max_length=20,
         choices=ProductStatusChoices,
@@ -165,16 +205,38 @@ class Product(models.Model):
     )
     category = models.ManyToManyField(Category, through="ProductCategory")
     date_joined = models.DateField(auto_now_add=True)
-    updated_at = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
     review = models.ManyToManyField(
         "Review", through="ProductReview", related_name="review"
     )
+    search_vector = SearchVectorField(null=True, editable=False)
     
     objects = ProductManager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["organization", "sku"], name="product_organization_sku_unique"
+            ),
+        ]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_gin"),
+            GinIndex(
+                fields=["name"], opclasses=["gin_trgm_ops"], name="product_name_trgm"
+            ),
+            GinIndex(
+                fields=["brand"], opclasses=["gin_trgm_ops"], name="product_brand_trgm"
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def rating_histogram(self):
+        return {
+            str(rating): getattr(self, f"rating_count_{rating}") for rating in range(1, 6)
+        }
+
 
 # class ProductOrganization(models.Model):
 #     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -209,12 +271,19 @@ class Product(models.Model):
 
 class ProductCategory(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    slug = AutoSlugField(populate_from=generate_product_category_slug, unique=True)
+    slug = BulkAutoSlugField(populate_from=generate_product_category_slug, unique=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     added_on = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "category"], name="productcategory_product_category_unique"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.category.name}"
 
@@ -251,23 +320,60 @@ class CartItem(models.Model):
         return f"Product name - {self.product.name}"
 
 
+# Quantity held for a cart line until `expires_at`. A product's available
+# stock is its `stock` minus its active reservations.
+class StockReservation(models.Model):
+    cart = models.ForeignKey(
+        Cart, on_delete=models.CASCADE, related_name="reservations"
+    )
+    cart_item = models.OneToOneField(
+        CartItem, on_delete=models.CASCADE, related_name="reservation"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    objects = StockReservationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "expires_at"],
+                include=["quantity"],
+                name="stockreservation_product_hold",
+            ),
+            models.Index(fields=["expires_at"], name="stockreservation_expires_at"),
+        ]
+
+
 class Order(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    slug = AutoSlugField(populate_from=generate_order_slug, unique=True)
+    slug = BulkAutoSlugField(populate_from=generate_order_slug, unique=True)
     user = models.ForeignKey(User, on_delete=models.PROTECT)
     added_on = models.DateField(default=timezone.now)
     delivery_date = models.DateField(default=timezone.now)
     status = models.CharField(
         max_length=20, choices=OrderStatusChoices, default=OrderCreateChoices.NEW
     )
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     review_status = models.CharField(
         max_length=30,
         choices=ReviewStatusChoices,
         default=ReviewStatusChoices.NOT_REVIEWED,
     )
+    # Set at checkout; item_count is the number of units ordered.
+    grand_total = models.FloatField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
     
     objects = OrderManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "grand_total"], name="order_user_grand_total"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - order"
 
@@ -283,15 +389,48 @@ class Order(models.Model):
     def calculate_delivery_date(self):
         return timezone.now().date() + timedelta(days=5)
 
+    def refresh_totals(self):
+        """
+        Recompute grand_total and item_count, for the order and for each of
+        its vendors, from the stored line totals.
+        """
+        items = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+        Order.objects.filter(pk=self.pk).update(
+            grand_total=Coalesce(
+                Subquery(items.annotate(total=Sum("line_total")).values("total")),
+                Value(0.0),
+            ),
+            item_count=Coalesce(
+                Subquery(items.annotate(count=Sum("quantity")).values("count")), 0
+            ),
+            updated_at=Now(),
+        )
+        vendor_items = OrderItem.objects.filter(
+            order=self.pk, product__organization=OuterRef("organization")
+        ).values("order")
+        self.vendors.update(
+            grand_total=Coalesce(
+                Subquery(vendor_items.annotate(total=Sum("line_total")).values("total")),
+                Value(0.0),
+            ),
+            item_count=Coalesce(
+                Subquery(vendor_items.annotate(count=Sum("quantity")).values("count")), 0
+            ),
+            updated_at=Now(),
+        )
+
 
 class OrderItem(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    slug = AutoSlugField(populate_from=generate_order_item_slug, unique=True)
+    slug = BulkAutoSlugField(populate_from=generate_order_item_slug, unique=True)
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="items")
     product = models.ForeignKey(
         Product, on_delete=models.PROTECT, related_name="order_items"
     )
     quantity = models.IntegerField(default=0)
+    # Price at checkout, so later price changes don't rewrite order history.
+    unit_price = models.FloatField(default=0)
+    line_total = models.FloatField(default=0)
     delivery_status = models.CharField(
         max_length=20, choices=OrderStatusChoices, default=OrderCreateChoices.NEW
     )
@@ -309,6 +448,135 @@ class OrderItem(models.Model):
         return f"Product name - {self.product.name}"
 
 
+# One vendor's share of an order: the organizations whose products are in
+# it, with that vendor's own fulfilment status. Written at checkout so vendor
+# dashboards never have to go through order items to find their orders.
+class OrderOrganization(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="vendors")
+    organization = models.ForeignKey(
+        Organization, on_delete=models.PROTECT, related_name="vendor_orders"
+    )
+    status = models.CharField(
+        max_length=20, choices=OrderStatusChoices, default=OrderCreateChoices.NEW
+    )
+    delivery_date = models.DateField(default=timezone.now)
+    grand_total = models.FloatField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    added_on = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "organization"],
+                name="orderorganization_order_organization_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["organization", "status", "delivery_date"],
+                name="orderorganization_dashboard",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.organization} - {self.order}"
+
+
+# Append-only log of order changes, one row per vendor affected, written in
+# the transaction that makes the change. `sequence` is the feed's cursor,
+# numbered in the order events become visible (see cart/events.py).
+class OrderEvent(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="events")
+    organization = models.ForeignKey(
+        Organization, on_delete=models.PROTECT, related_name="order_events"
+    )
+    kind = models.CharField(max_length=20, choices=OrderEventChoices)
+    status = models.CharField(max_length=20, choices=OrderStatusChoices)
+    order_status = models.CharField(max_length=20, choices=OrderStatusChoices)
+    added_on = models.DateTimeField(auto_now_add=True)
+    sequence = models.BigIntegerField(null=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["organization", "sequence"], name="orderevent_organization_seq"
+            ),
+            models.Index(
+                fields=["id"],
+                condition=Q(sequence__isnull=True),
+                name="orderevent_unsequenced",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.order} - {self.kind}"
+
+
+# Per-day sales of one product, kept current from checkout, vendor status
+# changes and order item removals (see core/analytics.py). `day` is the day
+# the order was placed; `lines` counts order items, not orders, and
+# delivered_* count the part of it delivered so far.
+class DailySales(models.Model):
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    day = models.DateField()
+    lines = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    delivered_units = models.IntegerField(default=0)
+    delivered_revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["organization", "product", "day"],
+                name="dailysales_organization_product_day_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["organization", "day"], name="dailysales_organization_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.day}"
+
+
+# A product expected to run out soon, from the latest demand forecast (see
+# core/forecast.py). Only products at or below their reorder point have one.
+class ReorderSuggestion(models.Model):
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="reorder_suggestion",
+    )
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="reorder_suggestions"
+    )
+    available_stock = models.IntegerField()
+    average_daily_demand = models.FloatField()
+    days_of_cover = models.FloatField()
+    reorder_point = models.PositiveIntegerField()
+    suggested_quantity = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["organization", "days_of_cover"],
+                name="reordersuggestion_cover",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product} - {self.suggested_quantity}"
+
+
 class Review(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reviews")
@@ -336,19 +604,36 @@ class ProductReview(models.Model):
     added_on = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
-        prod = Product.objects.get(pk=self.product.pk)
-        super().save(*args, **kwargs)
-        prod.avg_rating = self.calculate_avg_rating()
-        prod.save()
-
-    def calculate_avg_rating(self):
-        reviews = ProductReview.objects.filter(product=self.product.pk)
-        if reviews.count() == 0:
-            return 0
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "-added_on", "-id"], name="productreview_product_recent"
+            ),
+        ]
 
-        avg = sum(review.review.rating for review in reviews) / reviews.count()
-        return round(avg, 2)
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.apply_rating(1)
+
+    def apply_rating(self, sign):
+        """Add (sign=1) or remove (sign=-1) this review from the product's rating aggregates."""
+        rating = self.review.rating
+        bucket = f"rating_count_{rating}"
+        count = F("review_count") + sign
+        total = F("rating_sum") + sign * rating
+        Product.objects.filter(pk=self.product_id).update(
+            review_count=count,
+            rating_sum=total,
+            **{bucket: F(bucket) + sign},
+            updated_at=Now(),
+            avg_rating=Case(
+                When(review_count__lte=-sign, then=Value(0.0)),
+                default=Round(Cast(total, models.FloatField()) / count, 2),
+            ),
+        )
 
 
 class MediaRoomConnector(models.Model):
@@ -360,3 +645,95 @@ class MediaRoomConnector(models.Model):
         Product, on_delete=models.CASCADE, null=True, related_name="product_image"
     )
     review = models.ForeignKey(Review, on_delete=models.CASCADE, null=True)
+
+
+# Pre-rendered public representation of a product (see core/cards.py),
+# rebuilt in the background whenever the product or its relations change.
+class ProductCard(models.Model):
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="card"
+    )
+    document = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+# The stored outcome of a POST sent with an `Idempotency-Key` header
+# (see core/idempotency.py), replayed when the client retries it.
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="idempotency_keys"
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    added_on = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotencykey_user_key_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotencykey_expires_at"),
+        ]
+
+
+# A unit of background work (see core/jobs.py). While a job runs,
+# `run_after` is the end of its worker's lease; while it waits for a retry,
+# it's the time of the next attempt. Jobs that run out of attempts stay
+# behind as DEAD.
+class Job(models.Model):
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=20, choices=JobStatusChoices, default=JobStatusChoices.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    added_on = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                name="job_ready",
+                condition=Q(status__in=[JobStatusChoices.QUEUED, JobStatusChoices.RUNNING]),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.status}"
+
+
+# A login session: the refresh token issued at sign-in and every access
+# token derived from it share its `sid` claim (see core/revocation.py).
+class IssuedToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="issued_tokens")
+    sid = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField()
+    added_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "expires_at"], name="issuedtoken_user_expiry"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.sid}"
+
+
+class RevokedToken(models.Model):
+    sid = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField()
+    added_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sid
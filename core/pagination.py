@@ -0,0 +1,177 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, time
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+# DjangoJSONEncoder rounds datetimes and times to milliseconds, which would
+# make the seek condition compare against a different value than the row's.
+# Temporal keys travel as full-precision ISO strings tagged with their type.
+TEMPORAL_PARSERS = {
+    "datetime": parse_datetime,
+    "date": parse_date,
+    "time": parse_time,
+}
+
+
+def encode_key(value):
+    # datetime is a date subclass, so it has to be tested first.
+    for kind, cls in (("datetime", datetime), ("date", date), ("time", time)):
+        if isinstance(value, cls):
+            return value.isoformat(), kind
+    return value, None
+
+
+def decode_key(value, kind):
+    if kind is None:
+        return value
+    parsed = TEMPORAL_PARSERS[kind](value)
+    if parsed is None:
+        raise ValueError("Invalid cursor value")
+    return parsed
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset ("seek") pagination that follows whatever ordering the queryset
+    already has, so it composes with `OrderingFilter` and search ranking.
+
+    The leading order_by term is the sort key and `pk` breaks ties in the
+    same direction. The cursor carries the last row's `(key, pk)` and the
+    next page is a range condition on them, so neither a COUNT(*) nor an
+    OFFSET is ever issued. NULL keys sort as Postgres sorts them (last in
+    ascending order).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.field, self.descending = self.get_sort_key(queryset)
+        self.nullable = self.is_nullable(queryset, self.field)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+        descending = self.descending != reverse
+
+        prefix = "-" if descending else ""
+        if self.field == "pk":
+            queryset = queryset.order_by(f"{prefix}pk")
+        else:
+            queryset = queryset.order_by(f"{prefix}{self.field}", f"{prefix}pk")
+        if cursor:
+            queryset = queryset.filter(self.seek(descending, cursor["v"], cursor["pk"]))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        return self.page
+
+    def get_sort_key(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        term = ordering[0] if ordering else "pk"
+        if not isinstance(term, str):
+            return "pk", False
+
+        field = term.lstrip("-")
+        if field in ("pk", queryset.model._meta.pk.name):
+            field = "pk"
+        return field, term.startswith("-")
+
+    def is_nullable(self, queryset, field):
+        if field == "pk" or field in queryset.query.annotations:
+            return False
+        try:
+            return queryset.model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            return False
+
+    def seek(self, descending, value, pk):
+        """Condition selecting the rows strictly after `(value, pk)`."""
+        if self.field == "pk":
+            return Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+
+        field = self.field
+        if value is None:
+            after_null = Q(**{f"{field}__isnull": True}) & (
+                Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+            )
+            if descending:
+                return after_null | Q(**{f"{field}__isnull": False})
+            return after_null
+
+        # The leading `>=`/`<=` keeps the predicate an index range scan.
+        if descending:
+            condition = Q(**{f"{field}__lte": value}) & (
+                Q(**{f"{field}__lt": value}) | Q(pk__lt=pk)
+            )
+        else:
+            condition = Q(**{f"{field}__gte": value}) & (
+                Q(**{f"{field}__gt": value}) | Q(pk__gt=pk)
+            )
+        if self.nullable and not descending:
+            condition |= Q(**{f"{field}__isnull": True})
+        return condition
+
+    def get_ordering_token(self):
+        return f"{'-' if self.descending else ''}{self.field}"
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            if cursor["o"] != self.get_ordering_token():
+                raise ValueError("Cursor was issued for a different ordering")
+            return {
+                "v": decode_key(cursor["v"], cursor.get("t")),
+                "pk": cursor["pk"],
+                "r": bool(cursor.get("r")),
+            }
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        value = instance.pk if self.field == "pk" else getattr(instance, self.field)
+        value, kind = encode_key(value)
+        cursor = {
+            "o": self.get_ordering_token(),
+            "v": value,
+            "pk": instance.pk,
+            "r": int(reverse),
+        }
+        if kind is not None:
+            cursor["t"] = kind
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor, cls=DjangoJSONEncoder).encode("ascii")
+        ).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
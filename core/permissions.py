@@ -1,63 +1,43 @@
 from rest_framework import permissions
-from core.models import UserOrganization
-from core.choices import StatusChoices, RoleChoices
+from core.choices import RoleChoices
+from core.roles import get_roles
 
 
 class IsSuperuser(permissions.IsAdminUser):
     def has_permission(self, request, view):
         return request.user.is_superuser
-    
-class IsOrganizationInternal(permissions.BasePermission):
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        return UserOrganization.objects.IS_ACTIVE().filter(user=request.user, role__in = ['OWNER', 'ADMIN', 'MANAGER', 'STAFF']).exists()
-    
-class IsOrganizationOwner(permissions.BasePermission):
-    
+
+
+# Grants access when the user holds any of `roles` in an active membership.
+# Memberships come from core.roles, so however many of these a view checks,
+# the request pays for at most one membership query.
+class HasOrganizationRole(permissions.BasePermission):
+    roles = frozenset()
+
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        
-        return UserOrganization.objects.IS_ACTIVE().filter(user=request.user, role = RoleChoices.OWNER).exists()
-        
+
+        return not self.roles.isdisjoint(get_roles(request))
+
+
+class IsOrganizationInternal(HasOrganizationRole):
+    roles = frozenset(
+        [RoleChoices.OWNER, RoleChoices.ADMIN, RoleChoices.MANAGER, RoleChoices.STAFF]
+    )
+
+
+class IsOrganizationOwner(HasOrganizationRole):
+    roles = frozenset([RoleChoices.OWNER])
+
+
 class IsOrganizationAdmin(IsOrganizationOwner):
-    
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if super().has_permission(request, view):
-            return True
-        
-        return UserOrganization.objects.IS_ACTIVE().filter(user=request.user, role = RoleChoices.ADMIN).exists()
-    
-class IsOrganizationManager(IsOrganizationAdmin):
-    
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if super().has_permission(request, view):
-            return True
-        
-        return UserOrganization.objects.filter(user=request.user, role = RoleChoices.MANAGER, status = StatusChoices.ACTIVE).exists()
-    
-class IsOrganizationStaff(IsOrganizationManager):
-    
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        if super().has_permission(request, view):
-            return True
-        
-        return UserOrganization.objects.IS_ACTIVE().filter(user=request.user, role = RoleChoices.STAFF).exists()
-    
+    roles = IsOrganizationOwner.roles | {RoleChoices.ADMIN}
 
-    
 
-    
+class IsOrganizationManager(IsOrganizationAdmin):
+    roles = IsOrganizationAdmin.roles | {RoleChoices.MANAGER}
+
 
-    
\ No newline at end of file
+class IsOrganizationStaff(IsOrganizationManager):
+    roles = IsOrganizationManager.roles | {RoleChoices.STAFF}
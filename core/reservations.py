@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from .models import Product, StockReservation
+
+
+def reserved_stock(exclude_cart=None, exclude_cart_item=None):
+    """
+    Expression for the quantity of a product held by active reservations,
+    for annotating Product querysets. Served from the (product, expires_at)
+    index without touching the product row.
+    """
+    holds = StockReservation.objects.IS_ACTIVE().filter(product=OuterRef("pk"))
+    if exclude_cart is not None:
+        holds = holds.exclude(cart=exclude_cart)
+    if exclude_cart_item is not None:
+        holds = holds.exclude(cart_item=exclude_cart_item)
+    return Coalesce(
+        Subquery(holds.values("product").annotate(total=Sum("quantity")).values("total")),
+        0,
+    )
+
+
+def reserve_stock(cart_item):
+    """
+    Hold `cart_item.quantity` of its product for the reservation TTL,
+    replacing the line's previous hold.
+
+    Call inside a transaction: the product row stays locked until it ends,
+    so two carts can't both claim the last units.
+    """
+    product = (
+        Product.objects.select_for_update()
+        .annotate(reserved=reserved_stock(exclude_cart_item=cart_item))
+        .get(pk=cart_item.product_id)
+    )
+    if product.stock - product.reserved < cart_item.quantity:
+        raise serializers.ValidationError({"quantity": ["Not enough stock!"]})
+
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(
+                cart_id=cart_item.cart_id,
+                cart_item=cart_item,
+                product_id=cart_item.product_id,
+                quantity=cart_item.quantity,
+                expires_at=timezone.now()
+                + timedelta(seconds=settings.STOCK_RESERVATION_TTL),
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["cart_item"],
+        update_fields=["quantity", "expires_at"],
+    )
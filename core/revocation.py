@@ -0,0 +1,188 @@
+import hashlib
+import math
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import bump_versions, cache_is_shared, get_versions
+from .models import IssuedToken, RevokedToken
+
+
+REVOCATIONS_VERSION = "revocations:v"
+SESSION_CLAIM = "sid"
+
+
+class BloomFilter:
+    """
+    A fixed-size set of strings that can answer "maybe present" falsely, at
+    about `error_rate` once `capacity` items are in, but never "absent".
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, item):
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        self.count += added
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationFilter:
+    """
+    This process's view of the revoked sessions.
+
+    Every revocation bumps a cache version after it commits. The filter
+    compares that version on each check and, when it moved, adds only the
+    rows it hasn't seen: those past the last id it loaded, plus the ones
+    inserted within REVOCATION_SETTLE_TIME before its previous refresh
+    started, since a transaction that committed late can land below that
+    id however long ago the filter was refreshed. Once it holds more than its
+    capacity the filter is rebuilt from the unexpired rows at twice the
+    size.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.last_id = 0
+        self.refreshed_at = None
+        self.bloom = None
+
+    def might_contain(self, sid):
+        version = get_versions([REVOCATIONS_VERSION])[0]
+        if version != self.version:
+            self.refresh(version)
+        return sid in self.bloom
+
+    def refresh(self, version):
+        with self.lock:
+            if version == self.version:
+                return
+            # Taken before reading, so a row committed during the read is
+            # picked up by the next refresh.
+            started = timezone.now()
+            if self.bloom is None or self.bloom.count > self.bloom.capacity:
+                self.rebuild()
+            else:
+                self.load(
+                    self.bloom,
+                    Q(pk__gt=self.last_id)
+                    | Q(
+                        added_on__gte=self.refreshed_at
+                        - timedelta(seconds=settings.REVOCATION_SETTLE_TIME)
+                    ),
+                )
+            self.refreshed_at = started
+            self.version = version
+
+    def rebuild(self):
+        capacity = settings.REVOCATION_FILTER_CAPACITY
+        live = RevokedToken.objects.filter(expires_at__gt=timezone.now()).count()
+        while capacity < live * 2:
+            capacity *= 2
+        # Other threads keep checking against the old filter until the new
+        # one is complete.
+        bloom = BloomFilter(capacity, settings.REVOCATION_FILTER_ERROR_RATE)
+        self.last_id = 0
+        self.load(bloom, Q())
+        self.bloom = bloom
+
+    def load(self, bloom, condition):
+        rows = (
+            RevokedToken.objects.filter(condition, expires_at__gt=timezone.now())
+            .order_by("pk")
+            .values_list("pk", "sid")
+        )
+        for pk, sid in rows.iterator():
+            bloom.add(sid)
+            self.last_id = max(self.last_id, pk)
+
+
+revocation_filter = RevocationFilter()
+
+
+def legacy_session(user_id):
+    return f"user:{user_id}"
+
+
+def token_session(token):
+    # Tokens issued before sessions were recorded carry no sid. They are
+    # revoked all at once, under a marker for their user.
+    sid = token.get(SESSION_CLAIM)
+    if sid is not None:
+        return sid
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    return None if user_id is None else legacy_session(user_id)
+
+
+def is_revoked(token):
+    """
+    Whether `token` belongs to a revoked session. Only tokens the filter
+    flags cost a query; the rest are answered from memory. While the cache
+    is process-local the filter can't learn of revocations made by other
+    processes, so every token is looked up.
+    """
+    sid = token_session(token)
+    if sid is None:
+        return False
+    if cache_is_shared() and not revocation_filter.might_contain(sid):
+        return False
+    return RevokedToken.objects.filter(sid=sid).exists()
+
+
+def start_session(refresh, user):
+    """Start a recorded session with a freshly issued `refresh` token."""
+    refresh[SESSION_CLAIM] = refresh["jti"]
+    IssuedToken.objects.create(
+        user=user,
+        sid=refresh[SESSION_CLAIM],
+        expires_at=datetime.fromtimestamp(refresh["exp"], tz=dt_timezone.utc),
+    )
+    return refresh
+
+
+def revoke_sessions(user_id):
+    """
+    Revoke every unexpired session of the user, and every token it holds
+    from before sessions were recorded.
+    """
+    now = timezone.now()
+    sessions = IssuedToken.objects.filter(user=user_id, expires_at__gt=now)
+    # No sid-less token is issued once this lands (refreshing one is
+    # refused), so the marker only has to outlive those already out, and one
+    # left by an earlier revocation already does.
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    RevokedToken.objects.bulk_create(
+        [
+            RevokedToken(sid=sid, expires_at=expires_at)
+            for sid, expires_at in sessions.values_list("sid", "expires_at")
+        ]
+        + [RevokedToken(sid=legacy_session(user_id), expires_at=now + lifetime)],
+        ignore_conflicts=True,
+    )
+    bump_versions(REVOCATIONS_VERSION)
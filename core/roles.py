@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import bump_versions, get_versions
+from .models import UserOrganization
+
+
+def memberships_version(user_id):
+    return f"memberships:{user_id}:v"
+
+
+def user_memberships(user_id):
+    """
+    The `(organization id, role)` pairs of the user's active memberships.
+
+    Loaded with one query and cached per user under a version counter that
+    every membership write bumps.
+    """
+    version = get_versions([memberships_version(user_id)])[0]
+    key = f"memberships:{user_id}:{version}"
+    memberships = cache.get(key)
+    if memberships is None:
+        memberships = tuple(
+            UserOrganization.objects.IS_ACTIVE()
+            .filter(user=user_id)
+            .values_list("organization", "role")
+        )
+        cache.set(key, memberships, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return memberships
+
+
+def get_memberships(request):
+    """
+    The request user's `user_memberships()`, memoized on the request so all
+    the permission checks of one call share a single lookup.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return ()
+    # DRF wraps the same HttpRequest anew for each view; memoize on that.
+    http_request = getattr(request, "_request", request)
+    memberships = getattr(http_request, "_memberships", None)
+    if memberships is None:
+        memberships = http_request._memberships = user_memberships(user.pk)
+    return memberships
+
+
+def get_roles(request):
+    return {role for _, role in get_memberships(request)}
+
+
+def invalidate_memberships(user_id):
+    bump_versions(memberships_version(user_id))
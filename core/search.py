@@ -0,0 +1,32 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db.models import OuterRef, Subquery
+
+from .choices import StatusChoices
+from .models import ProductCategory
+
+
+SEARCH_CONFIG = "english"
+
+
+def product_search_vector():
+    """Weighted tsvector for a product: name > brand > category > description."""
+    category_names = (
+        ProductCategory.objects.filter(
+            product=OuterRef("pk"), category__status=StatusChoices.ACTIVE
+        )
+        .values("product")
+        .annotate(names=StringAgg("category__name", delimiter=" "))
+        .values("names")
+    )
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("brand", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(Subquery(category_names), weight="C", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def refresh_product_search_vectors(queryset):
+    """Recompute `search_vector` for every product in `queryset` in one UPDATE."""
+    return queryset.update(search_vector=product_search_vector())
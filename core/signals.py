@@ -1,14 +1,58 @@
-from django.db.models.signals import post_save
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .models import User, UserOrganization, Cart
+from .analytics import item_sales, record_sales
+from .cache import (
+    CATALOG_VERSION,
+    ORGANIZATIONS_VERSION,
+    bump_category_versions,
+    bump_versions,
+    organization_version,
+    product_version,
+)
+from .cards import refresh_product_cards, touch_products
+from .claims import invalidate_claims
+from .models import (
+    Cart,
+    Category,
+    MediaRoomConnector,
+    OrderItem,
+    Organization,
+    Product,
+    ProductCategory,
+    ProductReview,
+    User,
+    UserOrganization,
+)
+from .roles import invalidate_memberships
+from .search import refresh_product_search_vectors
 
 
 
 @receiver(post_save, sender=User)
 def update_userorganization_status_based_on_user_status(sender, instance, **kwargs):
     user_status = instance.status
-    UserOrganization.objects.filter(user=instance).update(status = user_status)
+    UserOrganization.objects.filter(user=instance).update(status = user_status, updated_at = Now())
+    invalidate_memberships(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserOrganization)
+def invalidate_memberships_on_change(sender, instance, **kwargs):
+    invalidate_memberships(instance.user_id)
+    invalidate_claims(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_claims_on_user_change(sender, instance, created, **kwargs):
+    if not created and instance.claims_changed():
+        invalidate_claims(instance.pk)
+    instance._loaded_claims = instance.get_claim_values()
+
+
+@receiver(post_delete, sender=User)
+def invalidate_claims_on_user_delete(sender, instance, **kwargs):
+    invalidate_claims(instance.pk)
     
 
 @receiver(post_save, sender=User)
@@ -16,3 +60,90 @@ def create_cart_while_new_user_registers(sender, instance, **kwargs):
     if kwargs['created']:
         Cart.objects.create(user=instance)
         
+
+
+@receiver(post_save, sender=Product)
+def refresh_search_vector_on_product_save(sender, instance, **kwargs):
+    refresh_product_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def refresh_search_vector_on_category_save(sender, instance, **kwargs):
+    refresh_product_search_vectors(Product.objects.filter(category=instance))
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def refresh_search_vector_on_product_category_change(sender, instance, **kwargs):
+    refresh_product_search_vectors(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_review_from_product_rating(sender, instance, **kwargs):
+    instance.apply_rating(-1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals_on_item_delete(sender, instance, **kwargs):
+    instance.order.refresh_totals()
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_order_item_from_daily_sales(sender, instance, **kwargs):
+    record_sales(
+        [
+            item_sales(
+                instance.product.organization_id,
+                instance.product_id,
+                instance.order.added_on,
+                instance.quantity,
+                instance.line_total,
+                instance.delivery_status,
+                sign=-1,
+            )
+        ]
+    )
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=ProductReview)
+@receiver([post_save, post_delete], sender=MediaRoomConnector)
+def invalidate_cached_product_pages(sender, instance, **kwargs):
+    if sender is Product:
+        bump_versions(
+            CATALOG_VERSION,
+            product_version(instance.slug),
+            organization_version(instance.organization.slug),
+        )
+        refresh_product_cards([instance.pk])
+    elif instance.product_id is not None:
+        if sender is not ProductReview:
+            # Images and categories are part of the product as its managers
+            # see it; its updated_at is what their ETags are built from.
+            Product.objects.filter(pk=instance.product_id).update(updated_at=Now())
+        touch_products([instance.product_id])
+    elif sender is MediaRoomConnector and instance.review_id is not None:
+        # Review images are shown in the review previews on product cards.
+        touch_products(
+            ProductReview.objects.filter(review_id=instance.review_id).values_list(
+                "product_id", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=Organization)
+def invalidate_cached_organization_pages(sender, instance, **kwargs):
+    bump_versions(
+        CATALOG_VERSION, ORGANIZATIONS_VERSION, organization_version(instance.slug)
+    )
+    refresh_product_cards(
+        Product.objects.filter(organization=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=Category)
+def invalidate_cached_category_pages(sender, instance, **kwargs):
+    bump_category_versions(instance)
+    refresh_product_cards(
+        Product.objects.filter(category=instance).values_list("pk", flat=True)
+    )
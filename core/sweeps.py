@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db.models.functions import Now
+
+from .db import delete_in_batches
+from .jobs import periodic
+from .models import IdempotencyKey, IssuedToken, RevokedToken, StockReservation
+
+
+SWEEP_BATCH_SIZE = 5000
+
+# Each sweep deletes in short batches that commit one by one, so it runs
+# outside the job's usual transaction.
+
+
+@periodic(settings.EXPIRY_SWEEP_INTERVAL, atomic=False)
+def expire_stock_reservations(batch_size=SWEEP_BATCH_SIZE):
+    """Delete expired stock reservations. Availability already ignores them."""
+    return delete_in_batches(StockReservation.objects.IS_EXPIRED(), batch_size)
+
+
+@periodic(settings.EXPIRY_SWEEP_INTERVAL, atomic=False)
+def expire_idempotency_keys(batch_size=SWEEP_BATCH_SIZE):
+    return delete_in_batches(IdempotencyKey.objects.filter(expires_at__lte=Now()), batch_size)
+
+
+@periodic(settings.EXPIRY_SWEEP_INTERVAL, atomic=False)
+def expire_tokens(batch_size=SWEEP_BATCH_SIZE):
+    """Delete the records of expired sessions and revocations."""
+    return sum(
+        delete_in_batches(model.objects.filter(expires_at__lte=Now()), batch_size)
+        for model in (IssuedToken, RevokedToken)
+    )
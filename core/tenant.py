@@ -0,0 +1,67 @@
+from functools import cached_property
+
+from django.core.cache import cache
+
+from .choices import RoleChoices
+from .models import Cart
+from .roles import get_memberships
+
+
+ROLE_ORDER = list(RoleChoices)
+
+
+def cart_id_key(user_id):
+    return f"cart:{user_id}"
+
+
+class TenantContext:
+    """
+    Who the request acts for: the user's active organizations, their role in
+    each and their cart. Built once per request by `get_tenant()`; views,
+    serializers and permissions all read the same instance.
+    """
+
+    def __init__(self, request):
+        self.user = request.user
+        self.roles = {}
+        for organization_id, role in get_memberships(request):
+            current = self.roles.get(organization_id)
+            if current is None or ROLE_ORDER.index(role) < ROLE_ORDER.index(current):
+                self.roles[organization_id] = role
+        self.organization_ids = sorted(self.roles)
+
+    @property
+    def role(self):
+        """The user's most senior role in any organization, or None."""
+        return min(self.roles.values(), key=ROLE_ORDER.index, default=None)
+
+    def role_in(self, organization_id):
+        return self.roles.get(organization_id)
+
+    def organization_ids_with(self, roles):
+        """The organizations in which the user holds one of `roles`."""
+        return [
+            organization_id
+            for organization_id in self.organization_ids
+            if self.roles[organization_id] in roles
+        ]
+
+    @cached_property
+    def cart_id(self):
+        # A user's cart is created with the user and never replaced.
+        key = cart_id_key(self.user.pk)
+        cart_id = cache.get(key)
+        if cart_id is None:
+            cart_id = Cart.objects.values_list("pk", flat=True).get(user=self.user)
+            cache.set(key, cart_id, None)
+        return cart_id
+
+
+def get_tenant(request):
+    """The request's `TenantContext`, built on first use."""
+    # DRF wraps the same HttpRequest anew for each view; memoize on that.
+    http_request = getattr(request, "_request", request)
+    tenant = getattr(http_request, "_tenant", None)
+    if tenant is None or tenant.user != request.user:
+        tenant = http_request._tenant = TenantContext(request)
+    return tenant
@@ -1,3 +1,509 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from product.serializers import PublicProductSerializer
+
+from .cache import bump_versions
+from .cards import build_product_cards
+from .checks import check_shared_cache
+from .choices import JobStatusChoices, RoleChoices, StatusChoices
+from .claims import ClaimsJWTAuthentication
+from .forecast import forecast_demand
+from .jobs import (
+    PERIODIC_JOBS,
+    claim_jobs,
+    enqueue,
+    enqueue_merged,
+    job,
+    run_job,
+    schedule_periodic_jobs,
+)
+from .models import (
+    DailySales,
+    Job,
+    Order,
+    Organization,
+    Product,
+    ProductCard,
+    ProductReview,
+    ReorderSuggestion,
+    Review,
+    RevokedToken,
+    User,
+    UserOrganization,
+)
+from .revocation import (
+    REVOCATIONS_VERSION,
+    RevocationFilter,
+    is_revoked,
+    revoke_sessions,
+    start_session,
+)
+from .roles import get_roles
+from .tenant import get_tenant
+
+
+CALLS = []
+
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/tmp/ecomsite-test-cache",
+    }
+}
+
+
+@job
+def record_call(values):
+    CALLS.append(values)
+
+
+@job
+def fail():
+    raise ValueError("Out of stock.")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def ready(self, func, **payload):
+        # Job readiness is compared with the database's transaction time.
+        return enqueue(func, run_after=timezone.now() - timedelta(minutes=1), **payload)
+
+    def test_merged_values_fold_into_the_waiting_job(self):
+        first = enqueue_merged(record_call, "values", [2, 1], delay=60)
+        second = enqueue_merged(record_call, "values", [3, 2], delay=60)
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.get().payload, {"values": [1, 2, 3]})
+
+    def test_finished_job_is_deleted(self):
+        self.ready(record_call, values=[1])
+        [claimed] = claim_jobs()
+
+        self.assertEqual((claimed.status, claimed.attempts), (JobStatusChoices.RUNNING, 1))
+        self.assertTrue(run_job(claimed))
+        self.assertEqual(CALLS, [[1]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        self.ready(fail)
+        [claimed] = claim_jobs()
+
+        self.assertFalse(run_job(claimed))
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (JobStatusChoices.QUEUED, 1))
+        self.assertGreater(failed.run_after, timezone.now())
+        self.assertIn("Out of stock.", failed.last_error)
+
+    def test_taken_over_job_keeps_the_new_lease(self):
+        self.ready(record_call, values=[1])
+        [claimed] = claim_jobs()
+        # Another worker claimed the job after this lease ran out.
+        Job.objects.filter(pk=claimed.pk).update(attempts=2)
+
+        self.assertTrue(run_job(claimed))
+        running = Job.objects.get()
+        self.assertEqual((running.status, running.attempts), (JobStatusChoices.RUNNING, 2))
+
+    def test_periodic_jobs_are_scheduled_once(self):
+        schedule_periodic_jobs()
+        schedule_periodic_jobs()
+
+        self.assertEqual(
+            sorted(Job.objects.values_list("name", flat=True)), sorted(PERIODIC_JOBS)
+        )
+
+
+class ProductRatingTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = Product.objects.create(
+            organization=organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date=date(2026, 1, 1),
+            expiry_date=date(2028, 1, 1),
+            price=2.5,
+        )
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="password", username="buyer"
+        )
+        self.order = Order.objects.create(user=self.user)
+
+    def review(self, rating):
+        review = Review.objects.create(order=self.order, user=self.user, rating=rating)
+        return ProductReview.objects.create(product=self.product, review=review)
+
+    def ratings(self):
+        self.product.refresh_from_db()
+        return self.product.review_count, self.product.rating_sum, self.product.avg_rating
+
+    def test_reviews_are_folded_in(self):
+        self.review(4)
+        self.review(5)
+
+        self.assertEqual(self.ratings(), (2, 9, 4.5))
+        self.assertEqual(
+            self.product.rating_histogram(), {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+        )
+
+    def test_deleted_reviews_are_taken_out(self):
+        first = self.review(4)
+        second = self.review(5)
+
+        first.delete()
+        self.assertEqual(self.ratings(), (1, 5, 5.0))
+        second.delete()
+        self.assertEqual(self.ratings(), (0, 0, 0.0))
+        self.assertEqual(self.product.rating_count_5, 0)
+
+    def test_rebuild_recomputes_from_reviews(self):
+        self.review(3)
+        self.review(4)
+        Product.objects.update(review_count=0, rating_sum=0, avg_rating=0)
+
+        call_command("rebuild_product_ratings", stdout=StringIO())
+        self.assertEqual(self.ratings(), (2, 7, 3.5))
+
+
+class ProductCardTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = Product.objects.create(
+            organization=organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date=date(2026, 1, 1),
+            expiry_date=date(2028, 1, 1),
+            price=2.5,
+            stock=10,
+        )
+
+    def public(self):
+        product = Product.objects.select_related("card").get(pk=self.product.pk)
+        return PublicProductSerializer(product).data
+
+    def test_build_stores_the_public_document(self):
+        build_product_cards([self.product.pk])
+
+        document = ProductCard.objects.get(product=self.product).document
+        self.assertEqual(document["name"], "Paracetamol")
+        self.assertEqual(document["organization"], "Pharmacy")
+
+    def test_live_fields_are_read_from_the_product(self):
+        build_product_cards([self.product.pk])
+        # Writes that skip the signals leave the card as it was.
+        Product.objects.filter(pk=self.product.pk).update(name="Ibuprofen", price=3.0, stock=4)
+
+        data = self.public()
+        self.assertEqual(data["name"], "Paracetamol")
+        self.assertEqual((data["price"], data["stock"]), (3.0, 4))
+
+    def test_product_without_a_card_is_serialized_in_full(self):
+        self.assertFalse(ProductCard.objects.exists())
+        self.assertEqual(self.public()["name"], "Paracetamol")
+
+
+@override_settings(
+    FORECAST_WINDOW_DAYS=28,
+    FORECAST_SHORT_WINDOW_DAYS=7,
+    REORDER_LEAD_TIME_DAYS=7,
+    REORDER_SAFETY_DAYS=3,
+    REORDER_COVER_DAYS=30,
+)
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+
+    def product(self, sku, stock, daily_units):
+        product = Product.objects.create(
+            organization=self.organization,
+            sku=sku,
+            name=sku,
+            brand="Acme",
+            manufacturing_date=date(2026, 1, 1),
+            expiry_date=date(2028, 1, 1),
+            price=1.0,
+            stock=stock,
+        )
+        # A week of sales up to yesterday.
+        today = timezone.localdate()
+        DailySales.objects.bulk_create(
+            DailySales(
+                organization=self.organization,
+                product=product,
+                day=today - timedelta(days=days_ago),
+                lines=1,
+                units=daily_units,
+                revenue=daily_units,
+            )
+            for days_ago in range(1, 8)
+            if daily_units
+        )
+        return product
+
+    def test_fast_sellers_low_on_stock_are_suggested(self):
+        low = self.product("LOW", stock=20, daily_units=4)
+        self.product("PLENTY", stock=1000, daily_units=4)
+        self.product("IDLE", stock=0, daily_units=0)
+
+        self.assertEqual(forecast_demand(self.organization.pk), 1)
+        suggestion = ReorderSuggestion.objects.get()
+        self.assertEqual(suggestion.product, low)
+        # The last week's rate (4/day) beats the 28-day one (1/day).
+        self.assertEqual(suggestion.average_daily_demand, 4.0)
+        self.assertEqual(suggestion.days_of_cover, 5.0)
+        self.assertEqual(suggestion.reorder_point, 40)
+        self.assertEqual(suggestion.suggested_quantity, 4 * 37 - 20)
+
+    def test_restocked_products_are_dropped(self):
+        low = self.product("LOW", stock=20, daily_units=4)
+        forecast_demand(self.organization.pk)
+        Product.objects.filter(pk=low.pk).update(stock=1000)
+
+        self.assertEqual(forecast_demand(self.organization.pk), 0)
+        self.assertFalse(ReorderSuggestion.objects.exists())
+
+
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="member@example.com", password="password", username="member"
+        )
+        self.pharmacy = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.clinic = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        self.membership = UserOrganization.objects.create(
+            user=self.user, organization=self.pharmacy, role=RoleChoices.STAFF, salary=0
+        )
+        UserOrganization.objects.create(
+            user=self.user,
+            organization=self.clinic,
+            role=RoleChoices.OWNER,
+            salary=0,
+            status=StatusChoices.INACTIVE,
+        )
+
+    def request(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return request
+
+    def test_roles_are_loaded_once(self):
+        request = self.request()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_roles(request), {RoleChoices.STAFF})
+        with self.assertNumQueries(0):
+            get_roles(request)
+            # Later requests are served from the cache.
+            get_roles(self.request())
+
+    def test_membership_changes_are_picked_up(self):
+        get_roles(self.request())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.role = RoleChoices.MANAGER
+            self.membership.save()
+
+        self.assertEqual(get_roles(self.request()), {RoleChoices.MANAGER})
+
+
+class TenantContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="member@example.com", password="password", username="member"
+        )
+        self.pharmacy = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.clinic = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        for organization, role in (
+            (self.pharmacy, RoleChoices.STAFF),
+            (self.clinic, RoleChoices.ADMIN),
+        ):
+            UserOrganization.objects.create(
+                user=self.user, organization=organization, role=role, salary=0
+            )
+
+    def request(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return request
+
+    def test_roles_per_organization(self):
+        tenant = get_tenant(self.request())
+
+        self.assertEqual(tenant.organization_ids, sorted([self.pharmacy.pk, self.clinic.pk]))
+        self.assertEqual(tenant.role_in(self.pharmacy.pk), RoleChoices.STAFF)
+        self.assertEqual(tenant.role, RoleChoices.ADMIN)
+        self.assertEqual(
+            tenant.organization_ids_with({RoleChoices.OWNER, RoleChoices.ADMIN}),
+            [self.clinic.pk],
+        )
+
+    def test_context_is_built_once_per_request(self):
+        request = self.request()
+        tenant = get_tenant(request)
+        self.assertEqual(tenant.cart_id, self.user.cart.pk)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_tenant(request), tenant)
+            # The cart id is cached across requests.
+            self.assertEqual(get_tenant(self.request()).cart_id, self.user.cart.pk)
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="member@example.com", password="password", username="member"
+        )
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        self.membership = UserOrganization.objects.create(
+            user=self.user, organization=self.organization, role=RoleChoices.MANAGER, salary=0
+        )
+
+    def sign_in(self):
+        response = APIClient().post(
+            reverse("claims_token"), {"email": "member@example.com", "password": "password"}
+        )
+        return response.json()["access"]
+
+    def authenticate(self, access, method="get"):
+        request = Request(
+            getattr(RequestFactory(), method)("/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        )
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return request, user
+
+    def test_safe_request_trusts_the_claims(self):
+        request, user = self.authenticate(self.sign_in())
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.get_deferred_fields())
+        self.assertEqual(
+            request._request._memberships, ((self.organization.pk, RoleChoices.MANAGER),)
+        )
+
+    def test_write_loads_the_user(self):
+        _, user = self.authenticate(self.sign_in(), method="post")
+        self.assertFalse(user.get_deferred_fields())
+
+    def test_membership_change_makes_the_claims_stale(self):
+        access = self.sign_in()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.role = RoleChoices.STAFF
+            self.membership.save()
+
+        _, user = self.authenticate(access)
+        self.assertFalse(user.get_deferred_fields())
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_process_local_cache_loads_the_user(self):
+        _, user = self.authenticate(self.sign_in())
+        self.assertFalse(user.get_deferred_fields())
+
+
+class SharedCacheCheckTests(TestCase):
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ["core.W001"])
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class RevocationFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.filter = RevocationFilter()
+
+    def revoke(self, sid, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            token = RevokedToken.objects.create(
+                sid=sid, expires_at=timezone.now() + timedelta(days=1), **fields
+            )
+            bump_versions(REVOCATIONS_VERSION)
+        return token
+
+    def test_revoked_session_is_flagged(self):
+        self.assertFalse(self.filter.might_contain("session"))
+        self.revoke("session")
+        self.assertTrue(self.filter.might_contain("session"))
+
+    def test_late_commit_below_the_last_id_is_flagged(self):
+        # Take an id, then let a later one be loaded first, as when the
+        # transaction inserting the lower id commits last.
+        reserved = self.revoke("placeholder").pk
+        RevokedToken.objects.filter(pk=reserved).delete()
+        self.revoke("early")
+        self.assertTrue(self.filter.might_contain("early"))
+        self.assertGreater(self.filter.last_id, reserved)
+
+        self.revoke("late", pk=reserved)
+        RevokedToken.objects.filter(pk=reserved).update(
+            added_on=self.filter.refreshed_at - timedelta(seconds=1)
+        )
+        # However long after the previous refresh this one runs.
+        with mock.patch(
+            "core.revocation.timezone.now", return_value=timezone.now() + timedelta(hours=1)
+        ):
+            self.assertTrue(self.filter.might_contain("late"))
+
+    @override_settings(REVOCATION_FILTER_CAPACITY=2)
+    def test_full_filter_is_rebuilt_larger(self):
+        for index in range(4):
+            self.revoke(f"session-{index}")
+            self.filter.might_contain("session-0")
+        self.revoke("session-4")
+
+        self.assertTrue(self.filter.might_contain("session-4"))
+        self.assertGreater(self.filter.bloom.capacity, 2)
+        for index in range(5):
+            self.assertTrue(self.filter.might_contain(f"session-{index}"))
+
+
+class RevokeSessionsTests(TestCase):
+    def test_session_tokens_are_revoked(self):
+        user = User.objects.create_user(
+            email="user@example.com", password="password", username="user"
+        )
+        refresh = start_session(RefreshToken.for_user(user), user)
+        access = refresh.access_token
+        self.assertFalse(is_revoked(access))
+
+        revoke_sessions(user.pk)
+        self.assertTrue(is_revoked(refresh))
+        self.assertTrue(is_revoked(access))
+
+    def test_tokens_without_a_session_are_revoked_with_the_user(self):
+        user, other = (
+            User.objects.create_user(
+                email=f"{name}@example.com", password="password", username=name
+            )
+            for name in ("user", "other")
+        )
+        legacy = AccessToken.for_user(user)
+
+        revoke_sessions(user.pk)
+        self.assertTrue(is_revoked(legacy))
+        self.assertFalse(is_revoked(AccessToken.for_user(other)))
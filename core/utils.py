@@ -1,3 +1,6 @@
+from django.db.models import Q
+
+
 def generate_user_slug(instance):
     return instance.username
 
@@ -26,10 +29,65 @@ def generate_cart_item_slug(instance):
     return f"{instance.cart.slug}-item-{instance.product.name}".lower()
 
 def generate_order_slug(instance):
-    return f"{instance.added_on}-{instance.status}".lower()
+    # The uid keeps same-day orders from competing for one slug.
+    return f"{instance.added_on}-{instance.status}-{instance.uid.hex[:8]}".lower()
 
 def generate_order_item_slug(instance):
-    return f"{instance.product}".lower()
+    return f"{str(instance.product)[:40]}-{instance.uid.hex[:8]}".lower()
 
 # def generate_
 
+
+
+def reserve_slugs(instances, field_name="slug"):
+    """
+    Give unsaved `instances` of one model unique slugs, the way their
+    AutoSlugField would (`base`, `base-2`, `base-3`, ...), in at most two
+    queries for the whole batch.
+    """
+    if not instances:
+        return
+    field = instances[0]._meta.get_field(field_name)
+    manager = field.model._base_manager
+    max_length = field.max_length
+
+    bases = [
+        field.slugify(field.populate_from(instance))[:max_length]
+        or instance._meta.model_name
+        for instance in instances
+    ]
+    taken = set(
+        manager.filter(**{f"{field_name}__in": set(bases)}).values_list(
+            field_name, flat=True
+        )
+    )
+    seen = set()
+    clashing = set()
+    for base in bases:
+        if base in taken or base in seen:
+            clashing.add(base)
+        seen.add(base)
+    if clashing:
+        # Numbered variants all start with the base cropped for the
+        # longest suffix we could need.
+        prefixes = Q()
+        for base in clashing:
+            prefixes |= Q(**{f"{field_name}__startswith": base[: max_length - 8]})
+        taken.update(manager.filter(prefixes).values_list(field_name, flat=True))
+
+    next_index = {}
+    for instance, base in zip(instances, bases):
+        index = next_index.get(base, 1)
+        while True:
+            if index == 1:
+                slug = base
+            else:
+                tail = f"{field.index_sep}{index}"
+                slug = base[: max_length - len(tail)] + tail
+            if slug not in taken:
+                break
+            index += 1
+        next_index[base] = index + 1
+        taken.add(slug)
+        setattr(instance, field.attname, slug)
+        instance._slug_reserved = True
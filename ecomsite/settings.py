@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     # 'rest_framework.authtoken',
     'rest_framework_simplejwt',
@@ -215,7 +216,7 @@ INTERNAL_IPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.claims.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -235,9 +236,66 @@ REST_FRAMEWORK = {
 
 
 
+# Catalog responses are invalidated through version counters, so every
+# worker process has to share one cache. LocMemCache is only suitable for a
+# single process (e.g. runserver); with it, token claims and revocations are
+# always checked in the database (see `check --deploy`).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = 60 * 15  # seconds
+PRODUCT_FACETS_CACHE_TIMEOUT = 60  # seconds
+STOCK_RESERVATION_TTL = 60 * 15  # seconds
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # seconds
+# How long a non-atomic idempotent request (see IdempotentMixin) holds its
+# key before a retry may assume it died and run in its place.
+IDEMPOTENCY_CLAIM_TIME = 60 * 10  # seconds
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60  # seconds
+# Background jobs (core/jobs.py). Workers renew the lease of the jobs they
+# run; a job whose lease runs out is handed to another worker. Failed
+# attempts are retried after JOB_RETRY_BACKOFF * 2 ** (attempt - 1) seconds.
+JOB_LEASE_TIME = 60 * 5  # seconds
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # seconds
+JOB_RETRY_BACKOFF_MAX = 60 * 60  # seconds
+# How often runworkers deletes expired stock reservations, idempotency keys
+# and session records (core/sweeps.py).
+EXPIRY_SWEEP_INTERVAL = 60 * 5  # seconds
+# Product card rebuilds wait this long so that a burst of writes to the same
+# products folds into one job.
+PRODUCT_CARD_DELAY = 5  # seconds
+# Demand forecasting (core/forecast.py). Daily demand is the higher of the
+# short and long moving averages of units sold; a product needs reordering
+# once its stock covers less than the lead time plus the safety margin.
+FORECAST_WINDOW_DAYS = 28
+FORECAST_SHORT_WINDOW_DAYS = 7
+REORDER_LEAD_TIME_DAYS = 7
+REORDER_SAFETY_DAYS = 3
+REORDER_COVER_DAYS = 30
+# Token revocation (core/revocation.py). Each process keeps the revoked
+# sessions in a Bloom filter sized for this many entries at this false
+# positive rate; rows inserted up to the settle time before the previous
+# refresh are re-read in case they committed out of id order.
+REVOCATION_FILTER_CAPACITY = 100000
+REVOCATION_FILTER_ERROR_RATE = 0.001
+REVOCATION_SETTLE_TIME = 60  # seconds
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days= 20),
     'REFRESH_TOKEN_LIFETIME': timedelta(days= 30),
+    'TOKEN_OBTAIN_SERIALIZER': 'user.serializers.SessionTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'user.serializers.SessionTokenRefreshSerializer',
 }
 
 APPEND_SLASH = False
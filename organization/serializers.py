@@ -2,6 +2,8 @@ from rest_framework import serializers
 
 from core.models import Organization, UserOrganization, User
 from core.choices import RoleChoices, StatusChoices
+from core.permissions import IsOrganizationManager
+from core.tenant import get_tenant
 
 from user.serializers import UserSerializer
 
@@ -99,33 +101,32 @@ class OrganizationInternalSerializer(serializers.ModelSerializer):
         ]
 
     def validate_organization(self, data):
-        orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.context["request"].user
-        ).values_list("organization", flat=True)
-
-        curr_user_organizations = Organization.objects.filter(id__in=orgs)
+        orgs = get_tenant(self.context["request"]).organization_ids
         org = Organization.objects.get(name=data)
         # print(curr_user_organizations)
         # print(org)
-        if org not in curr_user_organizations:
+        if org.pk not in orgs:
             raise serializers.ValidationError(
                 "Organization does not match with your organization"
             )
 
         return org
 
-    def validate_role(self, data):
-        curr_user = UserOrganization.objects.IS_ACTIVE().get(
-            user=self.context["request"].user
-        )
-        curr_user_role = curr_user.role.lower()
+    def validate(self, data):
+        # The user's own role is the one they hold in the member's organization.
+        organization = data.get("organization") or getattr(self.instance, "organization", None)
+        if "role" in data and organization is not None:
+            curr_user_role = get_tenant(self.context["request"]).role_in(organization.pk)
 
-        role_dict = {"owner": 1, "admin": 2, "manager": 3, "staff": 4}
+            role_dict = {"owner": 1, "admin": 2, "manager": 3, "staff": 4}
 
-        if role_dict[curr_user_role] >= role_dict[data.lower()]:
-            raise serializers.ValidationError(
-                "You do not have permission to create this role"
-            )
+            if (
+                curr_user_role is None
+                or role_dict[curr_user_role.lower()] >= role_dict[data["role"].lower()]
+            ):
+                raise serializers.ValidationError(
+                    {"role": ["You do not have permission to create this role"]}
+                )
 
         return data
 
@@ -151,18 +152,17 @@ class OrganizationInternalSerializer(serializers.ModelSerializer):
         user_data = validated_data.pop("user", [])
         # organization = validated_data.pop("organization", [])
 
-        curr_user = UserOrganization.objects.IS_ACTIVE().get(
-            user=self.context["request"].user
+        curr_user_role = get_tenant(self.context["request"]).role_in(
+            instance.organization_id
         )
-        curr_user_role = curr_user.role.lower()
         role_dict = {"owner": 1, "admin": 2, "manager": 3, "staff": 4}
 
-        if curr_user.organization != instance.organization:
+        if curr_user_role is None:
             raise serializers.ValidationError(
                 "You are not authorized to edit this user."
             )
 
-        if role_dict[curr_user_role] >= role_dict[instance.role.lower()]:
+        if role_dict[curr_user_role.lower()] >= role_dict[instance.role.lower()]:
             raise serializers.ValidationError(
                 "You do not have permission to perform this action"
             )
@@ -257,3 +257,52 @@ class OrganizationInternalSerializer(serializers.ModelSerializer):
 
 #         organization_user = UserOrganization.objects.create(user=user, **validated_data)
 #         return organization_user
+
+
+class SalesAnalyticsQuerySerializer(serializers.Serializer):
+    organization = serializers.SlugRelatedField(
+        queryset=Organization.objects.IS_ACTIVE(), slug_field="slug"
+    )
+    start = serializers.DateField()
+    end = serializers.DateField()
+    period = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    top = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate_organization(self, organization):
+        role = get_tenant(self.context["request"]).role_in(organization.pk)
+        if role not in IsOrganizationManager.roles:
+            raise serializers.ValidationError(
+                "You must be a manager of the organization to see its sales."
+            )
+        return organization
+
+    def validate(self, data):
+        if data["start"] > data["end"]:
+            raise serializers.ValidationError({"end": ["Must not be before start."]})
+        return data
+
+
+class SalesFiguresSerializer(serializers.Serializer):
+    lines = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.FloatField()
+    delivered_units = serializers.IntegerField()
+    delivered_revenue = serializers.FloatField()
+
+
+class SalesPeriodSerializer(SalesFiguresSerializer):
+    period = serializers.DateField()
+
+
+class TopProductSerializer(serializers.Serializer):
+    uid = serializers.UUIDField(source="product__uid")
+    slug = serializers.CharField(source="product__slug")
+    name = serializers.CharField(source="product__name")
+    units = serializers.IntegerField()
+    revenue = serializers.FloatField()
+
+
+class SalesAnalyticsSerializer(serializers.Serializer):
+    totals = SalesFiguresSerializer()
+    series = SalesPeriodSerializer(many=True)
+    top_products = TopProductSerializer(many=True)
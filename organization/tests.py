@@ -1,3 +1,77 @@
+from datetime import date
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.choices import RoleChoices
+from core.models import DailySales, Organization, Product, User, UserOrganization
+
+
+class SalesAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        self.other = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        product = Product.objects.create(
+            organization=self.organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date=date(2026, 1, 1),
+            expiry_date=date(2028, 1, 1),
+            price=2.5,
+        )
+        for day, lines, units in ((date(2026, 3, 1), 2, 5), (date(2026, 3, 2), 1, 4)):
+            DailySales.objects.create(
+                organization=self.organization,
+                product=product,
+                day=day,
+                lines=lines,
+                units=units,
+                revenue=units * 2.5,
+                delivered_units=units,
+                delivered_revenue=units * 2.5,
+            )
+        self.client = APIClient()
+
+    def member(self, name, *memberships):
+        user = User.objects.create_user(
+            email=f"{name}@example.com", password="password", username=name
+        )
+        for organization, role in memberships:
+            UserOrganization.objects.create(
+                user=user, organization=organization, role=role, salary=0
+            )
+        return user
+
+    def get(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(
+            reverse("organization_sales_analytics"),
+            {"organization": self.organization.slug, "start": "2026-03-01", "end": "2026-03-31"},
+        )
+
+    def test_manager_sees_totals(self):
+        response = self.get(self.member("manager", (self.organization, RoleChoices.MANAGER)))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        totals = response.json()["totals"]
+        self.assertEqual((totals["lines"], totals["units"], totals["revenue"]), (3, 9, 22.5))
+        self.assertEqual(len(response.json()["series"]), 2)
+
+    def test_staff_of_the_organization_is_refused(self):
+        # Managing another organization doesn't open this one's sales.
+        user = self.member(
+            "staff",
+            (self.organization, RoleChoices.STAFF),
+            (self.other, RoleChoices.MANAGER),
+        )
+        response = self.get(user)
 
-# Create your tests here.
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("organization", response.json())
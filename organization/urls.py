@@ -8,6 +8,7 @@ urlpatterns = [
     path('organizations/<slug:org_slug>', views.RetrievePublicOrganizationView.as_view(), name='public_specific_organization'),
     path('organizations', views.ListPublicOrganizationView.as_view(), name='public_organizations'),
     path('we/internals/<uuid:uid>', views.RetrieveUpdateDeleteOrganizationInternalView.as_view(), name='update_organization_internal'),
+    path('we/analytics', views.RetrieveSalesAnalyticsView.as_view(), name='organization_sales_analytics'),
     path('we/<uuid:uid>', views.RetrieveUpdateOrganizationView.as_view(), name='retrieve_update_organization'),
     path('we/internals', views.ListCreateOrganizationInternalView.as_view(), name='organization_internals'),
     path('we', views.ListMeOrganizationsView.as_view(), name='me_organization'),
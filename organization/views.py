@@ -5,28 +5,45 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
 from django.core.exceptions import PermissionDenied
+from django.db.models import DateField, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from drf_spectacular.utils import extend_schema
+from rest_framework.response import Response
 
 
 from core.choices import ProductStatusChoices, StatusChoices
-from core.models import Organization, Product, UserOrganization
+from core.models import DailySales, Organization, Product, UserOrganization
 from core import permissions as custom_permissions
+from core.conditional import ConditionalGetMixin
+from core.idempotency import IdempotentMixin
+from core.revocation import revoke_sessions
+from core.tenant import get_tenant
+from core.cache import (
+    CachedResponseMixin,
+    ORGANIZATIONS_VERSION,
+    organization_version,
+    product_version,
+)
 
 from .serializers import (
     OrganizationInternalDetailsSerializer,
     OrganizationInternalSerializer,
     OrganizationSerializer,
     PublicOrganizationSerializer,
+    SalesAnalyticsQuerySerializer,
+    SalesAnalyticsSerializer,
 )
 
+from product.filters import ProductSearchFilter, SearchSuggestionsMixin
 from product.serializers import PublicProductSerializer
 
 
-class CreateOrganizationView(generics.CreateAPIView):
+class CreateOrganizationView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = OrganizationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class ListMeOrganizationsView(generics.ListAPIView):
+class ListMeOrganizationsView(ConditionalGetMixin, generics.ListAPIView):
     # queryset = Organization.objects.filter(status=StatusChoices.ACTIVE).order_by('pk')
     permission_classes = [custom_permissions.IsOrganizationStaff]
     serializer_class = OrganizationSerializer
@@ -36,14 +53,14 @@ class ListMeOrganizationsView(generics.ListAPIView):
     ordering_fields = ["date_joined", "updated_at"]
 
     def get_queryset(self):
-        user = self.request.user
-
-        organizations = UserOrganization.objects.IS_ACTIVE().filter(user=user).values_list("organization", flat=True)
+        organizations = get_tenant(self.request).organization_ids
 
         return Organization.objects.filter(id__in=organizations).order_by("pk")
 
 
-class RetrieveUpdateOrganizationView(generics.RetrieveUpdateAPIView):
+class RetrieveUpdateOrganizationView(
+    IdempotentMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView
+):
     serializer_class = OrganizationSerializer
     lookup_field = "uid"
 
@@ -58,9 +75,7 @@ class RetrieveUpdateOrganizationView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         org = Organization.objects.get(uid=self.kwargs["uid"])
-        if not UserOrganization.objects.filter(
-            user=self.request.user, organization=org
-        ).exists():
+        if org.pk not in get_tenant(self.request).organization_ids:
             raise PermissionDenied(
                 "You are not authorized to perform this action on this organization."
             )
@@ -68,7 +83,7 @@ class RetrieveUpdateOrganizationView(generics.RetrieveUpdateAPIView):
         return org
 
 
-class ListPublicOrganizationView(generics.ListAPIView):
+class ListPublicOrganizationView(CachedResponseMixin, generics.ListAPIView):
     # queryset = Organization.objects.filter(status=StatusChoices.ACTIVE).order_by("pk")
     queryset = Organization.objects.IS_ACTIVE().order_by("pk")
     serializer_class = PublicOrganizationSerializer
@@ -76,38 +91,59 @@ class ListPublicOrganizationView(generics.ListAPIView):
     search_fields = ["name", "email", "description"]
     filterset_fields = ["thana", "city", "country"]
 
+    def get_cache_versions(self):
+        return [ORGANIZATIONS_VERSION]
+
 
-class RetrievePublicOrganizationView(generics.RetrieveAPIView):
+class RetrievePublicOrganizationView(CachedResponseMixin, generics.RetrieveAPIView):
     # queryset = Organization.objects.filter(status = StatusChoices.ACTIVE).order_by('pk')
     serializer_class = PublicOrganizationSerializer
     lookup_field = "slug"
 
+    def get_cache_versions(self):
+        return [organization_version(self.kwargs["org_slug"])]
+
     def get_object(self):
         return Organization.objects.IS_ACTIVE().get(slug=self.kwargs["org_slug"])
 
 
-class ListSpecificOrganizationProductView(generics.ListAPIView):
+class ListSpecificOrganizationProductView(
+    CachedResponseMixin, SearchSuggestionsMixin, generics.ListAPIView
+):
     serializer_class = PublicProductSerializer
-    filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
-    search_fields = ["name", "category__name", "description"]
+    filter_backends = [ProductSearchFilter, DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["availability", "brand"]
     ordering_fields = ["price", "avg_rating"]
 
+    def get_cache_versions(self):
+        return [organization_version(self.kwargs["org_slug"])]
+
     def get_queryset(self):
         org = Organization.objects.IS_ACTIVE().get(slug=self.kwargs["org_slug"])
 
-        return Product.objects.IS_PUBLISHED().filter(
-            organization=org
-        ).order_by("pk")
+        return (
+            Product.objects.IS_PUBLISHED()
+            .filter(organization=org)
+            .select_related("card")
+            .order_by("pk")
+        )
 
 
-class RetrieveSpecificOrganizationProductView(generics.RetrieveAPIView):
+class RetrieveSpecificOrganizationProductView(
+    CachedResponseMixin, generics.RetrieveAPIView
+):
     serializer_class = PublicProductSerializer
 
+    def get_cache_versions(self):
+        return [
+            organization_version(self.kwargs["org_slug"]),
+            product_version(self.kwargs["prod_slug"]),
+        ]
+
     def get_object(self):
         org = Organization.objects.IS_ACTIVE().get(slug=self.kwargs["org_slug"])
 
-        return Product.objects.IS_PUBLISHED().get(
+        return Product.objects.IS_PUBLISHED().select_related("card").get(
             slug=self.kwargs["prod_slug"],
             organization=org,
         )
@@ -131,9 +167,12 @@ class RetrieveSpecificOrganizationProductView(generics.RetrieveAPIView):
 #     search_fields = ['username', 'email', 'organization', 'role', 'status']
 
 
-class ListCreateOrganizationInternalView(generics.ListCreateAPIView):
+class ListCreateOrganizationInternalView(
+    IdempotentMixin, ConditionalGetMixin, generics.ListCreateAPIView
+):
     # serializer_class = OrganizationInternalDetailsSerializer
     permission_classes = [custom_permissions.IsOrganizationStaff]
+    conditional_fields = ("updated_at", "user__updated_at")
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ["user__username", "organization__name", "user__email"]
     filterset_fields = ["role", "status"]
@@ -145,9 +184,7 @@ class ListCreateOrganizationInternalView(generics.ListCreateAPIView):
         return OrganizationInternalDetailsSerializer
 
     def get_queryset(self):
-        user_organizations = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.request.user
-        ).values_list("organization", flat=True)
+        user_organizations = get_tenant(self.request).organization_ids
         return (
             UserOrganization.objects.filter(organization__in=user_organizations)
             .select_related("user")
@@ -157,10 +194,11 @@ class ListCreateOrganizationInternalView(generics.ListCreateAPIView):
 
 
 class RetrieveUpdateDeleteOrganizationInternalView(
-    generics.RetrieveUpdateDestroyAPIView
+    IdempotentMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView
 ):
     serializer_class = OrganizationInternalSerializer
     permission_classes = [custom_permissions.IsOrganizationManager]
+    conditional_fields = ("updated_at", "user__updated_at")
     lookup_field = "uid"
     # filter_backends = [SearchFilter]
     # search_fields = ['username', 'email', 'role', 'status']
@@ -171,15 +209,12 @@ class RetrieveUpdateDeleteOrganizationInternalView(
         )
 
     def perform_destroy(self, instance):
-        curr_user = UserOrganization.objects.IS_ACTIVE().get(
-            user=self.request.user
-        )
-        curr_user_role = curr_user.role
+        curr_user_role = get_tenant(self.request).role_in(instance.organization_id)
         role_dict = {"owner": 1, "admin": 2, "manager": 3, "staff": 4}
 
         if (
-            role_dict[curr_user_role.lower()] >= role_dict[instance.role.lower()]
-            or curr_user.organization != instance.organization
+            curr_user_role is None
+            or role_dict[curr_user_role.lower()] >= role_dict[instance.role.lower()]
         ):
             raise serializers.ValidationError(
                 "You do not have permission to delete this user"
@@ -189,6 +224,8 @@ class RetrieveUpdateDeleteOrganizationInternalView(
         instance.salary = 0
         instance.status = StatusChoices.REMOVED
         instance.save()
+        # Tokens outlive the membership by weeks; sign the user out now.
+        revoke_sessions(instance.user_id)
 
 
 # class DeleteOrganizationInternalView(generics.DestroyAPIView):
@@ -218,3 +255,47 @@ class RetrieveUpdateDeleteOrganizationInternalView(
 #         instance.salary = 0
 #         instance.status = StatusChoices.REMOVED
 #         instance.save()
+
+
+class RetrieveSalesAnalyticsView(generics.GenericAPIView):
+    serializer_class = SalesAnalyticsSerializer
+    permission_classes = [custom_permissions.IsOrganizationManager]
+
+    @extend_schema(parameters=[SalesAnalyticsQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query = SalesAnalyticsQuerySerializer(
+            data=request.query_params, context=self.get_serializer_context()
+        )
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        # Everything is summed from the daily rollup; order items are never read.
+        sales = DailySales.objects.filter(
+            organization=params["organization"],
+            day__range=(params["start"], params["end"]),
+        )
+        figures = {
+            "lines": Coalesce(Sum("lines"), 0),
+            "units": Coalesce(Sum("units"), 0),
+            "revenue": Coalesce(Sum("revenue"), Value(0.0)),
+            "delivered_units": Coalesce(Sum("delivered_units"), 0),
+            "delivered_revenue": Coalesce(Sum("delivered_revenue"), Value(0.0)),
+        }
+        series = (
+            sales.annotate(period=Trunc("day", params["period"], output_field=DateField()))
+            .values("period")
+            .annotate(**figures)
+            .order_by("period")
+        )
+        top_products = (
+            sales.values("product__uid", "product__slug", "product__name")
+            .annotate(units=figures["units"], revenue=figures["revenue"])
+            .order_by("-revenue", "product__name")[: params["top"]]
+        )
+
+        data = {
+            "totals": sales.aggregate(**figures),
+            "series": series,
+            "top_products": top_products,
+        }
+        return Response(self.get_serializer(data).data)
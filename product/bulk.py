@@ -0,0 +1,313 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import DatabaseError, connection, transaction
+
+from rest_framework import serializers
+
+from core.cards import touch_products
+from core.choices import ProductStatusChoices, ProductStockChoices, StatusChoices
+from core.db import values_table
+from core.models import Category, Product, ProductCategory
+from core.search import refresh_product_search_vectors
+from core.utils import reserve_slugs
+
+from .serializers import BulkProductRowSerializer
+
+
+BULK_BATCH_SIZE = 1000
+INVENTORY_BATCH_SIZE = 1000
+BULK_ERROR_LIMIT = 1000
+CATEGORY_SEPARATOR = "|"
+
+# A row for an existing SKU only overwrites the columns it supplies. A row
+# for a new SKU must supply these; the rest fall back to INSERT_DEFAULTS.
+INSERT_REQUIRED = ["name", "brand", "price", "manufacturing_date", "expiry_date", "stock"]
+INSERT_DEFAULTS = {"description": "", "status": ProductStatusChoices.PUBLISHED}
+
+
+def read_rows(file, format):
+    """
+    Yield `(row number, row)` for every record of an uploaded CSV or JSON
+    Lines file. Lines that aren't valid JSON come out as `None`.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        # Row 1 is the header.
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            row = {key: value for key, value in row.items() if key and value != ""}
+            if "categories" in row:
+                row["categories"] = [
+                    name.strip()
+                    for name in row["categories"].split(CATEGORY_SEPARATOR)
+                    if name.strip()
+                ]
+            yield number, row
+        return
+
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def upsert_products(organization, rows):
+    """
+    Validate and upsert `rows` into `organization`'s catalog in batches,
+    keyed on SKU. Every batch is its own transaction, so one bad batch
+    doesn't undo the rest of the upload.
+    """
+    report = {"created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def reject(number, errors):
+        report["error_count"] += 1
+        if len(report["errors"]) < BULK_ERROR_LIMIT:
+            report["errors"].append({"row": number, "errors": errors})
+
+    validator = BulkProductRowSerializer()
+    rows = iter(rows)
+    while batch := list(islice(rows, BULK_BATCH_SIZE)):
+        entries = {}
+        for number, row in batch:
+            if row is None:
+                reject(number, {"non_field_errors": ["Not a valid JSON object."]})
+                continue
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                reject(number, serializers.as_serializer_error(exc))
+                continue
+            # Postgres can't update one row twice in a statement; last row wins.
+            if data["sku"] in entries:
+                reject(
+                    entries[data["sku"]][0],
+                    {"sku": [f"Superseded by row {number} with the same SKU."]},
+                )
+            entries[data["sku"]] = (number, data)
+
+        if not entries:
+            continue
+        try:
+            with transaction.atomic():
+                created, updated = _upsert_batch(organization, entries, reject)
+        except DatabaseError:
+            for number, _ in entries.values():
+                reject(number, {"non_field_errors": ["The batch could not be saved."]})
+        else:
+            report["created"] += created
+            report["updated"] += updated
+
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
+
+
+def _upsert_batch(organization, entries, reject):
+    categories = _upsert_categories(
+        {name for _, data in entries.values() for name in data.get("categories", ())}
+    )
+    for sku, (number, data) in list(entries.items()):
+        inactive = [
+            name
+            for name in data.get("categories", ())
+            if categories[name].status != StatusChoices.ACTIVE
+        ]
+        if inactive:
+            reject(
+                number,
+                {"categories": [f"Category {name} is not active." for name in inactive]},
+            )
+            del entries[sku]
+    if not entries:
+        return 0, 0
+
+    existing = Product.objects.filter(
+        organization=organization, sku__in=entries
+    ).in_bulk(field_name="sku")
+    products = []
+    for sku, (number, data) in entries.items():
+        fields = {key: value for key, value in data.items() if key != "categories"}
+        if "stock" in fields:
+            fields["availability"] = (
+                ProductStockChoices.IN_STOCK
+                if fields["stock"] > 0
+                else ProductStockChoices.OUT_OF_STOCK
+            )
+        current = existing.get(sku)
+        if current is None:
+            missing = [name for name in INSERT_REQUIRED if name not in fields]
+            if missing:
+                reject(
+                    number,
+                    {name: ["This field is required for a new product."] for name in missing},
+                )
+                continue
+            product = Product(organization=organization, **{**INSERT_DEFAULTS, **fields})
+        else:
+            # The insert half of the upsert is never written for an existing
+            # SKU; its current values only have to satisfy NOT NULL.
+            product = Product(
+                **{
+                    field.attname: getattr(current, field.attname)
+                    for field in Product._meta.concrete_fields
+                    if not field.primary_key
+                }
+            )
+            for key, value in fields.items():
+                setattr(product, key, value)
+            product._slug_reserved = True
+        products.append((product, fields, data))
+    if not products:
+        return 0, 0
+
+    new_products = [product for product, _, _ in products if product.sku not in existing]
+    reserve_slugs(new_products)
+
+    # One statement per set of supplied columns, each updating only those.
+    groups = defaultdict(list)
+    for product, fields, _ in products:
+        groups[frozenset(fields) - {"sku"}].append(product)
+    for columns, group in groups.items():
+        Product.objects.bulk_create(
+            group,
+            update_conflicts=True,
+            unique_fields=["organization", "sku"],
+            update_fields=[*sorted(columns), "updated_at"],
+        )
+
+    _sync_category_links(
+        {
+            product: [categories[name] for name in data["categories"]]
+            for product, _, data in products
+            if "categories" in data
+        }
+    )
+
+    product_ids = [product.pk for product, _, _ in products]
+    refresh_product_search_vectors(Product.objects.filter(pk__in=product_ids))
+    touch_products(product_ids)
+    return len(new_products), len(products) - len(new_products)
+
+
+def _upsert_categories(names):
+    """Map each category name to its Category, creating the missing ones."""
+    if not names:
+        return {}
+    slug_field = Category._meta.get_field("slug")
+    slugs = {
+        name: slug_field.slugify(slug_field.populate_from(Category(name=name)))[
+            : slug_field.max_length
+        ]
+        for name in names
+    }
+    by_slug = Category.objects.in_bulk(set(slugs.values()), field_name="slug")
+
+    missing = {}
+    for name, slug in slugs.items():
+        if slug not in by_slug and slug not in missing:
+            missing[slug] = Category(name=name)
+    if missing:
+        new_categories = list(missing.values())
+        reserve_slugs(new_categories)
+        Category.objects.bulk_create(new_categories)
+        by_slug.update(zip(missing, new_categories))
+
+    return {name: by_slug[slug] for name, slug in slugs.items()}
+
+
+def _sync_category_links(wanted):
+    """Make each product's category links exactly the given categories."""
+    if not wanted:
+        return
+    wanted_pairs = {
+        (product.pk, category.pk)
+        for product, categories in wanted.items()
+        for category in categories
+    }
+    current = ProductCategory.objects.filter(
+        product__in=[product.pk for product in wanted]
+    ).values_list("pk", "product_id", "category_id")
+
+    stale = []
+    present = set()
+    for pk, product_id, category_id in current:
+        if (product_id, category_id) in wanted_pairs:
+            present.add((product_id, category_id))
+        else:
+            stale.append(pk)
+
+    new_links = []
+    for product, categories in wanted.items():
+        for category in dict.fromkeys(categories):
+            if (product.pk, category.pk) not in present:
+                new_links.append(ProductCategory(product=product, category=category))
+                present.add((product.pk, category.pk))
+    reserve_slugs(new_links)
+    ProductCategory.objects.bulk_create(new_links)
+
+    if stale:
+        ProductCategory.objects.filter(pk__in=stale).delete()
+
+
+def apply_inventory_updates(organization, items):
+    """
+    Set stock and/or price for many of `organization`'s products in one
+    transaction, one `UPDATE ... FROM (VALUES ...)` per batch. Availability
+    follows the new stock in the same statement.
+
+    Returns the number of updated products and the uids that matched none.
+    """
+    product = Product._meta.db_table
+    updated = {}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Lock the rows in pk order, as checkout does, so a sync and a
+        # checkout touching the same products can't deadlock.
+        list(
+            Product.objects.select_for_update()
+            .filter(organization=organization, uid__in=[item["uid"] for item in items])
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        for start in range(0, len(items), INVENTORY_BATCH_SIZE):
+            batch = items[start : start + INVENTORY_BATCH_SIZE]
+            values, params = values_table(
+                "v",
+                [("uid", "uuid"), ("stock", "integer"), ("price", "double precision")],
+                [(str(item["uid"]), item.get("stock"), item.get("price")) for item in batch],
+            )
+            cursor.execute(
+                f"""
+                UPDATE {product} p SET
+                    stock = COALESCE(v.stock, p.stock),
+                    price = COALESCE(v.price, p.price),
+                    availability = CASE
+                        WHEN COALESCE(v.stock, p.stock) > 0 THEN %s ELSE %s
+                    END,
+                    updated_at = now()
+                FROM {values}
+                WHERE p.uid = v.uid
+                  AND p.organization_id = %s
+                  AND p.status <> %s
+                RETURNING p.id, p.uid
+                """,
+                [
+                    ProductStockChoices.IN_STOCK,
+                    ProductStockChoices.OUT_OF_STOCK,
+                    *params,
+                    organization.pk,
+                    ProductStatusChoices.REMOVED,
+                ],
+            )
+            updated.update(cursor.fetchall())
+
+        touch_products(updated.keys())
+
+    found = {str(uid) for uid in updated.values()}
+    not_found = [item["uid"] for item in items if str(item["uid"]) not in found]
+    return {"updated": len(updated), "not_found": not_found}
@@ -0,0 +1,150 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from core.cache import CATALOG_VERSION, get_versions
+from core.choices import StatusChoices
+from core.models import Category, Organization, Product, ProductCategory
+
+
+PRICE_BUCKETS = [0, 50, 100, 250, 500, 1000]
+FACET_LIMIT = 20
+
+# Query params that change the page or the presentation but not the result set.
+IGNORED_PARAMS = {"cursor", "page", "page_size", "ordering", "facets"}
+
+# GROUPING(availability, brand, organization, price_bucket, category) sets a
+# bit for every column that is *not* part of the row's grouping set.
+GROUPING_FACETS = {
+    0b01111: "availability",
+    0b10111: "brand",
+    0b11011: "organization",
+    0b11101: "price",
+    0b11110: "category",
+}
+
+
+def facets_cache_key(request):
+    params = sorted(
+        (key, sorted(request.query_params.getlist(key)))
+        for key in request.query_params
+        if key not in IGNORED_PARAMS
+    )
+    signature = hashlib.md5(repr((request.path, params)).encode()).hexdigest()
+    return f"product-facets:{signature}:{get_versions([CATALOG_VERSION])[0]}"
+
+
+def compute_product_facets(queryset):
+    """
+    Every facet for `queryset` in one GROUPING SETS query.
+
+    Products are joined to their categories, so counts use COUNT(DISTINCT)
+    to stay per product.
+    """
+    product_ids, params = queryset.order_by().values("pk").query.sql_with_params()
+    sql = f"""
+        WITH facts AS (
+            SELECT
+                p.id,
+                p.availability,
+                p.brand,
+                o.slug AS organization,
+                o.name AS organization_name,
+                width_bucket(p.price, %s::double precision[]) AS price_bucket,
+                c.slug AS category,
+                c.name AS category_name
+            FROM {Product._meta.db_table} p
+            JOIN {Organization._meta.db_table} o ON o.id = p.organization_id
+            LEFT JOIN {ProductCategory._meta.db_table} pc ON pc.product_id = p.id
+            LEFT JOIN {Category._meta.db_table} c
+                ON c.id = pc.category_id AND c.status = %s
+            WHERE p.id IN ({product_ids})
+        )
+        SELECT
+            GROUPING(availability, brand, organization, price_bucket, category),
+            availability,
+            brand,
+            organization,
+            MIN(organization_name),
+            price_bucket,
+            category,
+            MIN(category_name),
+            COUNT(DISTINCT id)
+        FROM facts
+        GROUP BY GROUPING SETS (
+            (availability), (brand), (organization), (price_bucket), (category)
+        )
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [PRICE_BUCKETS, StatusChoices.ACTIVE, *params])
+        rows = cursor.fetchall()
+
+    facets = {facet: [] for facet in GROUPING_FACETS.values()}
+    for (
+        grouping,
+        availability,
+        brand,
+        organization,
+        organization_name,
+        price_bucket,
+        category,
+        category_name,
+        count,
+    ) in rows:
+        facet = GROUPING_FACETS[grouping]
+        if facet == "availability":
+            facets[facet].append({"value": availability, "count": count})
+        elif facet == "brand":
+            facets[facet].append({"value": brand, "count": count})
+        elif facet == "organization":
+            facets[facet].append(
+                {"value": organization, "label": organization_name, "count": count}
+            )
+        elif facet == "category" and category is not None:
+            facets[facet].append(
+                {"value": category, "label": category_name, "count": count}
+            )
+        elif facet == "price":
+            facets[facet].append(price_bucket_range(price_bucket) | {"count": count})
+
+    for facet, values in facets.items():
+        if facet == "price":
+            values.sort(key=lambda value: value["min"] if value["min"] is not None else -1)
+        else:
+            values.sort(key=lambda value: (-value["count"], value["value"]))
+            del values[FACET_LIMIT:]
+    return facets
+
+
+def price_bucket_range(bucket):
+    """`width_bucket` index -> the [min, max) price range it stands for."""
+    return {
+        "min": PRICE_BUCKETS[bucket - 1] if bucket > 0 else None,
+        "max": PRICE_BUCKETS[bucket] if bucket < len(PRICE_BUCKETS) else None,
+    }
+
+
+def get_product_facets(request, queryset):
+    key = facets_cache_key(request)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_product_facets(queryset)
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+# Adds `facets` to a paginated product list when `?facets=true` is passed.
+class FacetsMixin:
+    facets_param = "facets"
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if isinstance(response.data, dict) and request.query_params.get(
+            self.facets_param, ""
+        ).lower() in ("1", "true"):
+            response.data["facets"] = get_product_facets(
+                request, self.filter_queryset(self.get_queryset())
+            )
+        return response
@@ -0,0 +1,123 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from rest_framework.filters import SearchFilter
+
+from core.search import SEARCH_CONFIG
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for `SearchFilter` on product views.
+
+    Matches `?search=` against the GIN indexed `Product.search_vector` and
+    orders results by relevance. With `?fuzzy=true` it matches name and brand
+    by trigram word similarity instead, so misspelled drug names still hit.
+    An explicit `?ordering=` still wins since `OrderingFilter` runs after
+    this backend.
+    """
+
+    search_description = "Full-text search over name, brand, category and description."
+    fuzzy_param = "fuzzy"
+    fuzzy_threshold = 0.5
+    suggestion_limit = 5
+
+    def is_fuzzy(self, request):
+        return request.query_params.get(self.fuzzy_param, "").lower() in ("1", "true")
+
+    def get_search_string(self, request):
+        return " ".join(self.get_search_terms(request))
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_string(request)
+        if not terms:
+            return queryset
+
+        if self.is_fuzzy(request):
+            return self.fuzzy_filter(queryset, terms).order_by("-similarity", "pk")
+
+        query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "pk")
+        )
+
+    def fuzzy_filter(self, queryset, terms):
+        # `%>` only uses the trigram GIN indexes against the configured
+        # threshold, so set it instead of filtering on the similarity value.
+        # The setting ends with the transaction (SearchSuggestionsMixin runs
+        # fuzzy searches in one) rather than staying on a pooled connection.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                [str(self.fuzzy_threshold)],
+            )
+        return queryset.filter(
+            Q(name__trigram_word_similar=terms) | Q(brand__trigram_word_similar=terms)
+        ).annotate(
+            similarity=Greatest(
+                TrigramWordSimilarity(terms, "name"),
+                TrigramWordSimilarity(terms, "brand"),
+            )
+        )
+
+    def get_suggestions(self, request, queryset):
+        """
+        "Did you mean" product names for the current search, best match first.
+        """
+        terms = self.get_search_string(request)
+        if not terms:
+            return []
+
+        names = self.fuzzy_filter(queryset, terms).order_by("-similarity", "pk")
+        suggestions = []
+        for name in names.values_list("name", flat=True)[: self.suggestion_limit * 2]:
+            if name not in suggestions:
+                suggestions.append(name)
+        return suggestions[: self.suggestion_limit]
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.fuzzy_param,
+                "required": False,
+                "in": "query",
+                "description": "Match misspelled names by trigram similarity.",
+                "schema": {"type": "boolean"},
+            },
+        ]
+
+
+# Adds `suggestions` to a paginated product list when the search ran in
+# fuzzy mode or found nothing. (A comment, not a docstring, so the OpenAPI
+# description of the views stays their own.)
+#
+# Searches run in a transaction, which covers everything the list does with
+# the filtered queryset (facets included), so the trigram threshold set by
+# `fuzzy_filter()` applies to all of it and is dropped afterwards.
+class SearchSuggestionsMixin:
+    def get(self, request, *args, **kwargs):
+        if not ProductSearchFilter().get_search_string(request):
+            return super().get(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().get(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        search = ProductSearchFilter()
+        if (
+            isinstance(response.data, dict)
+            and search.get_search_string(request)
+            and (search.is_fuzzy(request) or not response.data.get("results"))
+        ):
+            response.data["suggestions"] = search.get_suggestions(
+                request, self.get_queryset()
+            )
+        return response
@@ -1,3 +1,6 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from core.models import (
@@ -6,12 +9,36 @@ from core.models import (
     MediaRoomConnector,
     Organization,
     Product,
+    ProductCard,
     ProductCategory,
+    ProductReview,
+    ReorderSuggestion,
     Review,
-    UserOrganization,
 )
 
-from core.choices import ProductStockChoices, StatusChoices
+from core.choices import ProductStatusChoices, ProductStockChoices, StatusChoices
+from core.permissions import IsOrganizationManager
+from core.tenant import get_tenant
+
+
+REVIEW_PREVIEW_SIZE = 3
+
+
+def recent_reviews():
+    return (
+        ProductReview.objects.select_related("review")
+        .prefetch_related("review__image")
+        .order_by("-added_on", "-pk")
+    )
+
+
+def review_preview_prefetch(lookup="reviews"):
+    """Prefetch only the newest reviews of each product into `review_preview`."""
+    return Prefetch(
+        lookup,
+        queryset=recent_reviews()[:REVIEW_PREVIEW_SIZE],
+        to_attr="review_preview",
+    )
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -54,6 +81,7 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = (
             "id",
             "uid",
+            "sku",
             "name",
             "organization",
             "category",
@@ -69,23 +97,40 @@ class ProductSerializer(serializers.ModelSerializer):
             "status",
         )
         read_only_fields = ("avg_rating",)
+        extra_kwargs = {"sku": {"required": False}}
+        # Products without a SKU don't conflict with each other; see validate().
+        validators = []
 
     def validate_organization(self, data):
-        orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.context["request"].user
-        ).values_list("organization", flat=True)
-
-        curr_user_organizations = Organization.objects.filter(id__in=orgs)
+        orgs = get_tenant(self.context["request"]).organization_ids
 
         # org = Organization.objects.get(slug = data)
 
-        if data not in curr_user_organizations:
+        if data.pk not in orgs:
             raise serializers.ValidationError(
                 "You must have to be internal member of the organization to add product."
             )
 
         return data
 
+    def validate_sku(self, value):
+        return value or None
+
+    def validate(self, attrs):
+        sku = attrs.get("sku", getattr(self.instance, "sku", None))
+        organization = attrs.get(
+            "organization", getattr(self.instance, "organization", None)
+        )
+        if sku:
+            rivals = Product.objects.filter(organization=organization, sku=sku)
+            if self.instance is not None:
+                rivals = rivals.exclude(pk=self.instance.pk)
+            if rivals.exists():
+                raise serializers.ValidationError(
+                    {"sku": "This organization already has a product with this SKU."}
+                )
+        return attrs
+
     def create(self, validated_data):
         categories = validated_data.pop("category", [])
         product = Product.objects.create(**validated_data)
@@ -108,6 +153,139 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
 
 
+def validate_managed_organization(self, organization):
+    # Bulk writes can rewrite a whole catalog, so membership isn't enough:
+    # the user has to manage this organization, whatever they do elsewhere.
+    role = get_tenant(self.context["request"]).role_in(organization.pk)
+    if role not in IsOrganizationManager.roles:
+        raise serializers.ValidationError(
+            "You must be a manager of the organization to change its products in bulk."
+        )
+    return organization
+
+
+class BulkProductUploadSerializer(serializers.Serializer):
+    organization = serializers.SlugRelatedField(
+        queryset=Organization.objects.IS_ACTIVE(), slug_field="slug"
+    )
+    file = serializers.FileField(
+        help_text=(
+            "CSV with a header row, or JSON Lines. Categories are separated by `|` "
+            "in CSV. Rows for existing SKUs only update the columns they supply."
+        )
+    )
+    format = serializers.ChoiceField(
+        choices=["csv", "jsonl"],
+        required=False,
+        help_text="Defaults to the file extension.",
+    )
+
+    validate_organization = validate_managed_organization
+
+    def validate(self, attrs):
+        if "format" not in attrs:
+            extension = attrs["file"].name.rpartition(".")[2].lower()
+            if extension == "csv":
+                attrs["format"] = "csv"
+            elif extension in ("jsonl", "ndjson"):
+                attrs["format"] = "jsonl"
+            else:
+                raise serializers.ValidationError(
+                    {"format": "Could not tell the format from the file name."}
+                )
+        return attrs
+
+
+# Only `sku` is always required: a row for an existing SKU updates just the
+# columns it supplies, and product/bulk.py checks what a new SKU needs.
+class BulkProductRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=255, required=False)
+    brand = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    price = serializers.FloatField(min_value=0, required=False)
+    manufacturing_date = serializers.DateField(required=False)
+    expiry_date = serializers.DateField(required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    status = serializers.ChoiceField(choices=ProductStatusChoices, required=False)
+    # Rows without categories keep the product's current ones.
+    categories = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False
+    )
+
+
+class BulkProductRowErrorSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    errors = serializers.DictField()
+
+
+class BulkProductReportSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    updated = serializers.IntegerField()
+    error_count = serializers.IntegerField()
+    errors = BulkProductRowErrorSerializer(many=True)
+
+
+class ProductAvailabilitySerializer(serializers.ModelSerializer):
+    reserved = serializers.IntegerField()
+    available = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ("uid", "slug", "stock", "reserved", "available")
+
+    def get_available(self, product) -> int:
+        return max(product.stock - product.reserved, 0)
+
+
+class LowStockProductSerializer(serializers.ModelSerializer):
+    uid = serializers.UUIDField(source="product.uid", read_only=True)
+    slug = serializers.CharField(source="product.slug", read_only=True)
+    name = serializers.CharField(source="product.name", read_only=True)
+    organization = serializers.CharField(source="organization.slug", read_only=True)
+
+    class Meta:
+        model = ReorderSuggestion
+        fields = (
+            "uid",
+            "slug",
+            "name",
+            "organization",
+            "available_stock",
+            "average_daily_demand",
+            "days_of_cover",
+            "reorder_point",
+            "suggested_quantity",
+            "computed_at",
+        )
+
+
+class InventoryItemSerializer(serializers.Serializer):
+    uid = serializers.UUIDField()
+    stock = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    price = serializers.FloatField(min_value=0, required=False, allow_null=True)
+
+
+class BulkInventoryUpdateSerializer(serializers.Serializer):
+    organization = serializers.SlugRelatedField(
+        queryset=Organization.objects.IS_ACTIVE(), slug_field="slug"
+    )
+    items = InventoryItemSerializer(many=True, allow_empty=False, max_length=10000)
+
+    validate_organization = validate_managed_organization
+
+    def validate_items(self, items):
+        uids = [item["uid"] for item in items]
+        if len(set(uids)) != len(uids):
+            raise serializers.ValidationError("Each product may appear only once.")
+        return items
+
+
+class InventoryUpdateReportSerializer(serializers.Serializer):
+    updated = serializers.IntegerField()
+    not_found = serializers.ListField(child=serializers.UUIDField())
+
+
 # class ProductOrganizationSerializer(serializers.ModelSerializer):
 #     category = serializers.SlugRelatedField(
 #         queryset = Category.objects.filter(),
@@ -148,19 +326,21 @@ class ProductSerializer(serializers.ModelSerializer):
 class ProductReviewSerializer(serializers.ModelSerializer):
     rating = serializers.IntegerField(source="review.rating")
     comment = serializers.CharField(source="review.comment")
-    image = serializers.ImageField(source="review.image")
+    image = MediaRoomSerializer(source="review.image", many=True)
 
     class Meta:
         model = Review
         fields = ("uid", "rating", "comment", "image", "added_on")
 
 
-class PublicProductSerializer(serializers.ModelSerializer):
+# The full public representation of a product, stored as its card.
+class ProductCardSerializer(serializers.ModelSerializer):
+
     organization = serializers.CharField(source="organization.name")
     category = serializers.SlugRelatedField(
         queryset=Category.objects.IS_ACTIVE(), slug_field="slug", many=True
     )
-    reviews = ProductReviewSerializer(many=True)
+    reviews = serializers.SerializerMethodField()
     image = MediaRoomSerializer(many=True)
 
     class Meta:
@@ -178,6 +358,69 @@ class PublicProductSerializer(serializers.ModelSerializer):
             "stock",
             "availability",
             "avg_rating",
+            "review_count",
             "brand",
             "reviews",
         )
+
+    @extend_schema_field(ProductReviewSerializer(many=True))
+    def get_reviews(self, product):
+        reviews = getattr(product, "review_preview", None)
+        if reviews is None:
+            reviews = recent_reviews().filter(product=product)[:REVIEW_PREVIEW_SIZE]
+        return ProductReviewSerializer(reviews, many=True, context=self.context).data
+
+
+def absolute_media_urls(document, request):
+    """Copy of a card document with its stored media paths made absolute."""
+
+    def absolute(media):
+        if request is None or not media["file"]:
+            return media
+        return {**media, "file": request.build_absolute_uri(media["file"])}
+
+    return {
+        **document,
+        "image": [absolute(media) for media in document["image"]],
+        "reviews": [
+            {**review, "image": [absolute(media) for media in review["image"]]}
+            for review in document["reviews"]
+        ],
+    }
+
+
+def card_prefetches():
+    """What `ProductCardSerializer` reads beyond the product row."""
+    return ["organization", "category", "image", review_preview_prefetch()]
+
+
+# Products whose card isn't built yet (new, or their build job died) are
+# serialized in full; load what that needs for all of them in one go
+# instead of per row.
+class PublicProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, "all") else data)
+        missing = [product for product in products if not hasattr(product, "card")]
+        if missing:
+            prefetch_related_objects(missing, *card_prefetches())
+        return super().to_representation(products)
+
+
+class PublicProductSerializer(ProductCardSerializer):
+    # Read from the product row rather than the card: they change on every
+    # checkout and review, and the card is only rebuilt after the fact.
+    live_fields = ("price", "stock", "availability", "avg_rating", "review_count")
+
+    class Meta(ProductCardSerializer.Meta):
+        list_serializer_class = PublicProductListSerializer
+
+    def to_representation(self, product):
+        try:
+            card = product.card
+        except ProductCard.DoesNotExist:
+            return super().to_representation(product)
+
+        data = absolute_media_urls(card.document, self.context.get("request"))
+        for name in self.live_fields:
+            data[name] = self.fields[name].to_representation(getattr(product, name))
+        return data
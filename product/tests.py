@@ -1,3 +1,527 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from .serializers import REVIEW_PREVIEW_SIZE
+
+from cart.checkout import place_order
+from core.cache import CATALOG_VERSION, get_versions, product_version
+from core.choices import ProductStatusChoices, ProductStockChoices, RoleChoices
+from core.models import (
+    CartItem,
+    Category,
+    IdempotencyKey,
+    Job,
+    MediaRoom,
+    MediaRoomConnector,
+    Order,
+    Organization,
+    Product,
+    ProductCategory,
+    ProductReview,
+    Review,
+    User,
+    UserOrganization,
+)
+
+
+PRODUCT_ROW = {
+    "sku": "PCM-500",
+    "name": "Paracetamol 500mg",
+    "brand": "Acme",
+    "description": "Pain and fever relief.",
+    "price": 2.5,
+    "manufacturing_date": "2026-01-01",
+    "expiry_date": "2028-01-01",
+    "stock": 40,
+    "status": ProductStatusChoices.DRAFT,
+    "categories": ["Pain Relief"],
+}
+
+
+class BulkUpsertProductTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        manager = User.objects.create_user(
+            email="manager@example.com", password="password", username="manager"
+        )
+        UserOrganization.objects.create(
+            user=manager, organization=self.organization, role=RoleChoices.MANAGER, salary=0
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+
+    def upload(self, name, content):
+        response = self.client.post(
+            reverse("bulk_upsert_product"),
+            {
+                "organization": self.organization.slug,
+                "file": SimpleUploadedFile(name, content.encode()),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def upload_rows(self, *rows):
+        return self.upload("products.jsonl", "".join(json.dumps(row) + "\n" for row in rows))
+
+    def test_new_product_is_created(self):
+        report = self.upload_rows(PRODUCT_ROW)
+
+        self.assertEqual((report["created"], report["updated"]), (1, 0))
+        product = Product.objects.get(organization=self.organization, sku="PCM-500")
+        self.assertEqual(product.stock, 40)
+        self.assertEqual(product.status, ProductStatusChoices.DRAFT)
+        self.assertEqual(list(product.category.values_list("name", flat=True)), ["Pain Relief"])
+
+    def test_reupload_keeps_omitted_columns(self):
+        self.upload_rows(PRODUCT_ROW)
+        report = self.upload_rows({"sku": "PCM-500", "price": 3.0})
+
+        self.assertEqual((report["created"], report["updated"]), (0, 1))
+        product = Product.objects.get(organization=self.organization, sku="PCM-500")
+        self.assertEqual(product.price, 3.0)
+        self.assertEqual(product.name, "Paracetamol 500mg")
+        self.assertEqual(product.description, "Pain and fever relief.")
+        self.assertEqual(product.status, ProductStatusChoices.DRAFT)
+        self.assertEqual(product.stock, 40)
+        self.assertEqual(list(product.category.values_list("name", flat=True)), ["Pain Relief"])
+
+    def test_csv_blank_cells_keep_columns(self):
+        self.upload_rows(PRODUCT_ROW)
+        report = self.upload(
+            "products.csv",
+            "sku,name,description,stock,status\nPCM-500,,,0,\n",
+        )
+
+        self.assertEqual(report["updated"], 1)
+        product = Product.objects.get(organization=self.organization, sku="PCM-500")
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.availability, ProductStockChoices.OUT_OF_STOCK)
+        self.assertEqual(product.description, "Pain and fever relief.")
+        self.assertEqual(product.status, ProductStatusChoices.DRAFT)
+
+    def test_new_product_without_required_columns_is_rejected(self):
+        report = self.upload_rows({"sku": "NEW-1", "price": 3.0})
+
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(report["error_count"], 1)
+        self.assertIn("name", report["errors"][0]["errors"])
+        self.assertFalse(Product.objects.filter(sku="NEW-1").exists())
+
+    def test_staff_cannot_upload(self):
+        # Managing another organization doesn't open this one's catalog.
+        staff = User.objects.create_user(
+            email="staff@example.com", password="password", username="staff"
+        )
+        other = Organization.objects.create(name="Clinic", email="clinic@example.com")
+        UserOrganization.objects.create(
+            user=staff, organization=self.organization, role=RoleChoices.STAFF, salary=0
+        )
+        UserOrganization.objects.create(
+            user=staff, organization=other, role=RoleChoices.MANAGER, salary=0
+        )
+        self.client.force_authenticate(staff)
+
+        response = self.client.post(
+            reverse("bulk_upsert_product"),
+            {
+                "organization": self.organization.slug,
+                "file": SimpleUploadedFile("products.jsonl", json.dumps(PRODUCT_ROW).encode()),
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("organization", response.json())
+        self.assertFalse(Product.objects.filter(sku="PCM-500").exists())
+
+
+class BulkUpdateProductInventoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name="Pharmacy", email="shop@example.com"
+        )
+        self.products = [
+            Product.objects.create(
+                organization=self.organization,
+                sku=f"SKU-{index}",
+                name=f"Product {index}",
+                brand="Acme",
+                manufacturing_date="2026-01-01",
+                expiry_date="2028-01-01",
+                price=5.0,
+                stock=10,
+            )
+            for index in range(3)
+        ]
+        self.client = APIClient()
+
+    def sign_in(self, role):
+        user = User.objects.create_user(
+            email=f"{role.lower()}@example.com", password="password", username=role.lower()
+        )
+        UserOrganization.objects.create(
+            user=user, organization=self.organization, role=role, salary=0
+        )
+        self.client.force_authenticate(user)
+
+    def update(self, items, **extra):
+        return self.client.post(
+            reverse("bulk_update_product_inventory"),
+            {"organization": self.organization.slug, "items": items},
+            format="json",
+            **extra,
+        )
+
+    def test_stock_and_price_are_set_per_product(self):
+        self.sign_in(RoleChoices.MANAGER)
+        first, second, third = self.products
+        missing = "00000000-0000-0000-0000-000000000000"
+        response = self.update(
+            [
+                {"uid": str(first.uid), "stock": 0},
+                {"uid": str(second.uid), "price": 7.5},
+                {"uid": missing, "stock": 1},
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"updated": 2, "not_found": [missing]})
+        for product in self.products:
+            product.refresh_from_db()
+        self.assertEqual((first.stock, first.price), (0, 5.0))
+        self.assertEqual(first.availability, ProductStockChoices.OUT_OF_STOCK)
+        self.assertEqual((second.stock, second.price), (10, 7.5))
+        self.assertEqual((third.stock, third.price), (10, 5.0))
+
+    def test_removed_products_are_not_updated(self):
+        self.sign_in(RoleChoices.MANAGER)
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(status=ProductStatusChoices.REMOVED)
+
+        response = self.update([{"uid": str(product.uid), "stock": 3}])
+        self.assertEqual(response.json()["not_found"], [str(product.uid)])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 10)
+
+    def test_staff_cannot_update(self):
+        self.sign_in(RoleChoices.STAFF)
+        response = self.update([{"uid": str(self.products[0].uid), "stock": 0}])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retried_update_is_replayed(self):
+        self.sign_in(RoleChoices.MANAGER)
+        product = self.products[0]
+        items = [{"uid": str(product.uid), "stock": 4}]
+        first = self.update(items, HTTP_IDEMPOTENCY_KEY="inventory-1")
+        Product.objects.filter(pk=product.pk).update(stock=9)
+        second = self.update(items, HTTP_IDEMPOTENCY_KEY="inventory-1")
+
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 9)
+
+    def test_retry_of_a_running_update_conflicts(self):
+        self.sign_in(RoleChoices.MANAGER)
+        product = self.products[0]
+        items = [{"uid": str(product.uid), "stock": 4}]
+        self.update(items, HTTP_IDEMPOTENCY_KEY="inventory-1")
+        # The first request is still running: its claim has no response yet.
+        IdempotencyKey.objects.update(status_code=None, response=None)
+
+        response = self.update(items, HTTP_IDEMPOTENCY_KEY="inventory-1")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class PublicProductCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = Product.objects.create(
+            organization=organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date="2026-01-01",
+            expiry_date="2028-01-01",
+            price=2.5,
+            stock=10,
+            status=ProductStatusChoices.PUBLISHED,
+        )
+        self.client = APIClient()
+
+    def names(self):
+        response = self.client.get(reverse("list_product_public"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product["name"] for product in response.json()["results"]]
+
+    def test_listing_is_served_from_cache(self):
+        self.assertEqual(self.names(), ["Paracetamol"])
+        # A write that skips the signals leaves the cached page in place.
+        Product.objects.filter(pk=self.product.pk).update(name="Ibuprofen")
+        self.assertEqual(self.names(), ["Paracetamol"])
+
+    def test_saving_a_product_refreshes_the_listing(self):
+        self.names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Ibuprofen"
+            self.product.save()
+        self.assertEqual(self.names(), ["Ibuprofen"])
+
+    def test_checkout_keeps_the_catalog_listings(self):
+        buyer = User.objects.create_user(
+            email="buyer@example.com", password="password", username="buyer"
+        )
+        CartItem.objects.create(cart=buyer.cart, product=self.product, quantity=2)
+        keys = [CATALOG_VERSION, product_version(self.product.slug)]
+        catalog, page = get_versions(keys)
+        # Drop the card rebuild queued when the product was created.
+        Job.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(buyer)
+
+        self.assertEqual(get_versions(keys), [catalog, page + 1])
+        self.assertFalse(Job.objects.exists())
+
+
+class ConditionalProductTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = Product.objects.create(
+            organization=organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date="2026-01-01",
+            expiry_date="2028-01-01",
+            price=2.5,
+        )
+        manager = User.objects.create_user(
+            email="manager@example.com", password="password", username="manager"
+        )
+        UserOrganization.objects.create(
+            user=manager, organization=organization, role=RoleChoices.MANAGER, salary=0
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(manager)
+        self.url = reverse("retrieve_update_delete_product", args=[self.product.uid])
+
+    def test_unchanged_product_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_new_image_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        MediaRoomConnector.objects.create(
+            mediaroom=MediaRoom.objects.create(), product=self.product
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["image"]), 1)
+
+
+class FuzzyProductSearchTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        for sku, name in (("PCM-500", "Paracetamol"), ("IBU-200", "Ibuprofen")):
+            Product.objects.create(
+                organization=organization,
+                sku=sku,
+                name=name,
+                brand="Acme",
+                manufacturing_date="2026-01-01",
+                expiry_date="2028-01-01",
+                price=2.5,
+                status=ProductStatusChoices.PUBLISHED,
+            )
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get(reverse("list_product_public"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_misspelled_name_matches(self):
+        data = self.search(search="Paracetmol", fuzzy="true")
+
+        self.assertEqual([product["name"] for product in data["results"]], ["Paracetamol"])
+        self.assertEqual(data["suggestions"], ["Paracetamol"])
+
+    def test_threshold_does_not_outlive_the_request(self):
+        with connection.cursor() as cursor:
+            # The setting only exists once pg_trgm is loaded into the session.
+            cursor.execute("SELECT word_similarity('a', 'a')")
+            cursor.execute("SHOW pg_trgm.word_similarity_threshold")
+            [default] = cursor.fetchone()
+
+        self.search(search="Paracetmol", fuzzy="true")
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW pg_trgm.word_similarity_threshold")
+            self.assertEqual(cursor.fetchone(), (default,))
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        rows = (
+            ("PCM-500", "Paracetamol", "Acme", "Pain and fever relief.", 2.5),
+            ("COL-100", "Cold Relief", "Acme", "Contains paracetamol and caffeine.", 1.0),
+            ("IBU-200", "Ibuprofen", "Medico", "Anti-inflammatory.", 3.0),
+        )
+        for sku, name, brand, description, price in rows:
+            Product.objects.create(
+                organization=organization,
+                sku=sku,
+                name=name,
+                brand=brand,
+                description=description,
+                manufacturing_date="2026-01-01",
+                expiry_date="2028-01-01",
+                price=price,
+                status=ProductStatusChoices.PUBLISHED,
+            )
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get(reverse("list_product_public"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_name_matches_rank_first(self):
+        data = self.search(search="paracetamol")
+        self.assertEqual(
+            [product["name"] for product in data["results"]], ["Paracetamol", "Cold Relief"]
+        )
+        self.assertNotIn("suggestions", data)
+
+    def test_brand_is_searched(self):
+        data = self.search(search="medico")
+        self.assertEqual([product["name"] for product in data["results"]], ["Ibuprofen"])
+
+    def test_explicit_ordering_wins(self):
+        data = self.search(search="paracetamol", ordering="price")
+        self.assertEqual(
+            [product["name"] for product in data["results"]], ["Cold Relief", "Paracetamol"]
+        )
+
+
+class ProductReviewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        self.product = Product.objects.create(
+            organization=organization,
+            sku="PCM-500",
+            name="Paracetamol",
+            brand="Acme",
+            manufacturing_date="2026-01-01",
+            expiry_date="2028-01-01",
+            price=2.5,
+            status=ProductStatusChoices.PUBLISHED,
+        )
+        buyer = User.objects.create_user(
+            email="buyer@example.com", password="password", username="buyer"
+        )
+        order = Order.objects.create(user=buyer)
+        for rating in range(1, REVIEW_PREVIEW_SIZE + 2):
+            review = Review.objects.create(order=order, user=buyer, rating=rating)
+            ProductReview.objects.create(product=self.product, review=review)
+        self.client = APIClient()
+
+    def test_listing_shows_the_newest_reviews_only(self):
+        response = self.client.get(reverse("list_product_public"))
+
+        [product] = response.json()["results"]
+        self.assertEqual(
+            [review["rating"] for review in product["reviews"]],
+            list(range(REVIEW_PREVIEW_SIZE + 1, 1, -1)),
+        )
+
+    def test_reviews_endpoint_lists_every_review(self):
+        response = self.client.get(reverse("list_product_reviews", args=[self.product.slug]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(
+            [review["rating"] for review in data["results"]],
+            list(range(REVIEW_PREVIEW_SIZE + 1, 0, -1)),
+        )
+        self.assertEqual(data["summary"]["review_count"], REVIEW_PREVIEW_SIZE + 1)
+        self.assertEqual(data["summary"]["histogram"]["1"], 1)
+
+
+class ProductFacetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name="Pharmacy", email="shop@example.com")
+        pain = Category.objects.create(name="Pain Relief")
+        for sku, brand, price, availability in (
+            ("PCM-500", "Acme", 20.0, ProductStockChoices.IN_STOCK),
+            ("IBU-200", "Acme", 60.0, ProductStockChoices.OUT_OF_STOCK),
+            ("ASP-100", "Medico", 600.0, ProductStockChoices.IN_STOCK),
+        ):
+            product = Product.objects.create(
+                organization=organization,
+                sku=sku,
+                name=sku,
+                brand=brand,
+                manufacturing_date="2026-01-01",
+                expiry_date="2028-01-01",
+                price=price,
+                availability=availability,
+                status=ProductStatusChoices.PUBLISHED,
+            )
+            if brand == "Acme":
+                ProductCategory.objects.create(product=product, category=pain)
+        self.client = APIClient()
+
+    def facets(self, **params):
+        response = self.client.get(reverse("list_product_public"), {"facets": "true", **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()["facets"]
+
+    def test_every_facet_is_counted(self):
+        facets = self.facets()
+
+        self.assertEqual(
+            facets["brand"], [{"value": "Acme", "count": 2}, {"value": "Medico", "count": 1}]
+        )
+        self.assertEqual(
+            [(bucket["min"], bucket["max"], bucket["count"]) for bucket in facets["price"]],
+            [(0, 50, 1), (50, 100, 1), (500, 1000, 1)],
+        )
+        self.assertEqual(
+            [(category["label"], category["count"]) for category in facets["category"]],
+            [("Pain Relief", 2)],
+        )
+        self.assertEqual(facets["organization"][0]["count"], 3)
+
+    def test_facets_follow_the_filters(self):
+        facets = self.facets(brand="Acme")
+
+        self.assertEqual(facets["brand"], [{"value": "Acme", "count": 2}])
+        self.assertEqual(
+            sorted((value["value"], value["count"]) for value in facets["availability"]),
+            [(ProductStockChoices.IN_STOCK, 1), (ProductStockChoices.OUT_OF_STOCK, 1)],
+        )
@@ -4,9 +4,14 @@ from . import views
 
 urlpatterns = [
     # path('we/product/add', views.CreateProductView.as_view(), name='create_product'),
+    path('we/products/bulk', views.BulkUpsertProductView.as_view(), name='bulk_upsert_product'),
+    path('we/products/inventory', views.BulkUpdateProductInventoryView.as_view(), name='bulk_update_product_inventory'),
+    path('we/products/low-stock', views.ListLowStockProductView.as_view(), name='list_low_stock_products'),
     path('we/products/<uuid:uid>/images', views.ListCreateProductImageView.as_view(), name='list_create_product_image'),
     path('we/products/<uuid:uid>', views.RetrieveUpdateDeleteProductView.as_view(), name='retrieve_update_delete_product'),
     path('we/products', views.ListCreateProductOrganizationInternalView.as_view(), name='list_create_product_organization_internal'),
+    path('products/<slug:slug>/availability', views.RetrieveProductAvailabilityView.as_view(), name='retrieve_product_availability'),
+    path('products/<slug:slug>/reviews', views.ListProductReviewView.as_view(), name='list_product_reviews'),
     path('products', views.ListProductPublicView.as_view(), name='list_product_public'),
     # path('products/<slug:slug>', views.ListSpecificOrganizationProductPublicView.as_view(), name='list_organization_product_public'),
     # path('product/<slug:org_slug>/<slug:prod_slug>', views.RetrieveProductPublicView.as_view(), name='retrieve_product_public'),
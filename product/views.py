@@ -1,14 +1,44 @@
 from django.http import Http404
+from django.shortcuts import get_object_or_404
+from drf_spectacular.utils import extend_schema
 from rest_framework import generics
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 
 from rest_framework.filters import OrderingFilter, SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
 from core.choices import ProductStatusChoices, StatusChoices
-from core.models import MediaRoom, MediaRoomConnector, Product, UserOrganization 
+from core.models import (
+    MediaRoom,
+    MediaRoomConnector,
+    Product,
+    ReorderSuggestion,
+)
 from core import permissions as custom_permissions
-
-from .serializers import MediaRoomSerializer, ProductSerializer, PublicProductSerializer 
+from core.cache import CachedResponseMixin, organization_version, product_version
+from core.conditional import ConditionalGetMixin
+from core.idempotency import IdempotentMixin
+from core.pagination import KeysetPagination
+from core.reservations import reserved_stock
+from core.tenant import get_tenant
+
+from .bulk import apply_inventory_updates, read_rows, upsert_products
+from .facets import FacetsMixin
+from .filters import ProductSearchFilter, SearchSuggestionsMixin
+from .serializers import (
+    BulkInventoryUpdateSerializer,
+    BulkProductReportSerializer,
+    BulkProductUploadSerializer,
+    InventoryUpdateReportSerializer,
+    LowStockProductSerializer,
+    MediaRoomSerializer,
+    ProductAvailabilitySerializer,
+    ProductReviewSerializer,
+    ProductSerializer,
+    PublicProductSerializer,
+    recent_reviews,
+)
 
 # class CreateProductView(generics.CreateAPIView):
 #     # queryset = Product.objects.all()
@@ -16,16 +46,15 @@ from .serializers import MediaRoomSerializer, ProductSerializer, PublicProductSe
 #     permission_classes = [custom_permissions.IsOrganizationInternal]
 
 
-class ListProductPublicView(generics.ListAPIView):
+class ListProductPublicView(
+    CachedResponseMixin, FacetsMixin, SearchSuggestionsMixin, generics.ListAPIView
+):
     queryset = (
-        Product.objects.IS_PUBLISHED()
-        .prefetch_related("category", "reviews")
-        .select_related("organization")
-        .order_by("pk")
+        Product.objects.IS_PUBLISHED().select_related("card").order_by("pk")
     )
     serializer_class = PublicProductSerializer
-    filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
-    search_fields = ["name", "category__name", "description"]
+    pagination_class = KeysetPagination
+    filter_backends = [ProductSearchFilter, DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["availability", "brand"]
     ordering_fields = ["price", "avg_rating"]
 
@@ -43,7 +72,45 @@ class ListProductPublicView(generics.ListAPIView):
 #         return Product.objects.filter(organization__slug=self.kwargs['slug'], status = ProductStatusChoices.PUBLISHED).prefetch_related('category', 'reviews').order_by('pk')
 
 
-class ListCreateProductOrganizationInternalView(generics.ListCreateAPIView):
+class ListProductReviewView(CachedResponseMixin, generics.ListAPIView):
+    serializer_class = ProductReviewSerializer
+    pagination_class = KeysetPagination
+
+    def get_cache_versions(self):
+        return [product_version(self.kwargs["slug"])]
+
+    def get_queryset(self):
+        self.product = get_object_or_404(
+            Product.objects.IS_PUBLISHED(), slug=self.kwargs["slug"]
+        )
+        return recent_reviews().filter(product=self.product)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data["summary"] = {
+            "review_count": self.product.review_count,
+            "avg_rating": self.product.avg_rating,
+            "histogram": self.product.rating_histogram(),
+        }
+        return response
+
+
+class RetrieveProductAvailabilityView(generics.RetrieveAPIView):
+    # Not cached: reservations come and go far faster than catalog edits.
+    serializer_class = ProductAvailabilitySerializer
+    lookup_field = "slug"
+
+    def get_queryset(self):
+        return (
+            Product.objects.IS_PUBLISHED()
+            .annotate(reserved=reserved_stock())
+            .only("uid", "slug", "stock")
+        )
+
+
+class ListCreateProductOrganizationInternalView(
+    IdempotentMixin, ConditionalGetMixin, generics.ListCreateAPIView
+):
     # queryset = Product.objects.filter().order_by('pk').prefetch_related('category')
     # permission_classes = [custom_permissions.IsOrganizationInternal]
     serializer_class = ProductSerializer
@@ -62,9 +129,7 @@ class ListCreateProductOrganizationInternalView(generics.ListCreateAPIView):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        user_orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.request.user
-        ).values_list("organization", flat=True)
+        user_orgs = get_tenant(self.request).organization_ids
         return (
             Product.objects.filter(organization__in=user_orgs)
             .prefetch_related("category")
@@ -72,23 +137,84 @@ class ListCreateProductOrganizationInternalView(generics.ListCreateAPIView):
         )
 
 
-class RetrieveProductPublicView(generics.RetrieveAPIView):
+class ListLowStockProductView(ConditionalGetMixin, generics.ListAPIView):
+    # Filled by the forecast_demand job; see core/forecast.py.
+    serializer_class = LowStockProductSerializer
+    permission_classes = [custom_permissions.IsOrganizationStaff]
+    pagination_class = KeysetPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["days_of_cover", "suggested_quantity"]
+    conditional_fields = ("computed_at",)
+
+    def get_queryset(self):
+        user_orgs = get_tenant(self.request).organization_ids
+        return (
+            ReorderSuggestion.objects.filter(organization__in=user_orgs)
+            .select_related("product", "organization")
+            .order_by("days_of_cover")
+        )
+
+
+class BulkUpsertProductView(IdempotentMixin, generics.GenericAPIView):
+    serializer_class = BulkProductUploadSerializer
+    permission_classes = [custom_permissions.IsOrganizationManager]
+    parser_classes = [MultiPartParser]
+    # Batches commit as they go; holding them open for the whole file
+    # would keep every row and slug it touched locked until the end.
+    idempotent_atomic = False
+
+    @extend_schema(responses=BulkProductReportSerializer)
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = upsert_products(
+            serializer.validated_data["organization"],
+            read_rows(serializer.validated_data["file"], serializer.validated_data["format"]),
+        )
+        return Response(report)
+
+
+class BulkUpdateProductInventoryView(IdempotentMixin, generics.GenericAPIView):
+    serializer_class = BulkInventoryUpdateSerializer
+    permission_classes = [custom_permissions.IsOrganizationManager]
+    idempotent_atomic = False
+
+    @extend_schema(responses=InventoryUpdateReportSerializer)
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = apply_inventory_updates(
+            serializer.validated_data["organization"],
+            serializer.validated_data["items"],
+        )
+        return Response(InventoryUpdateReportSerializer(report).data)
+
+
+class RetrieveProductPublicView(CachedResponseMixin, generics.RetrieveAPIView):
     serializer_class = PublicProductSerializer
     # lookup_field = 'slug'
     # filter_backends = [SearchFilter]
     # search_fields = ['name', 'category__name', 'description', 'price','availability', 'avg_rating', 'brand']
 
+    def get_cache_versions(self):
+        return [
+            organization_version(self.kwargs["org_slug"]),
+            product_version(self.kwargs["prod_slug"]),
+        ]
+
     def get_object(self):
         # slug = self.kwargs.get(self.lookup_field)
         org_slug = self.kwargs["org_slug"]
         prod_slug = self.kwargs["prod_slug"]
-        return Product.objects.IS_PUBLISHED().get(
+        return Product.objects.IS_PUBLISHED().select_related("card").get(
             slug=prod_slug,
             organization__slug=org_slug,
         )
 
 
-class RetrieveUpdateDeleteProductView(generics.RetrieveUpdateDestroyAPIView):
+class RetrieveUpdateDeleteProductView(
+    IdempotentMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = ProductSerializer
     permission_classes = [custom_permissions.IsOrganizationManager]
     lookup_field = "uid"
@@ -98,9 +224,7 @@ class RetrieveUpdateDeleteProductView(generics.RetrieveUpdateDestroyAPIView):
     def get_object(self):
         # slug = self.kwargs.get(self.lookup_field)
         uid = self.kwargs["uid"]
-        user_orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.request.user
-        ).values_list("organization", flat=True)
+        user_orgs = get_tenant(self.request).organization_ids
 
         try:
             product = Product.objects.get(
@@ -118,7 +242,7 @@ class RetrieveUpdateDeleteProductView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
-class ListCreateProductImageView(generics.ListCreateAPIView):
+class ListCreateProductImageView(IdempotentMixin, generics.ListCreateAPIView):
     serializer_class = MediaRoomSerializer
     permission_classes = [custom_permissions.IsOrganizationManager]
     lookup_field = "uid"
@@ -126,9 +250,7 @@ class ListCreateProductImageView(generics.ListCreateAPIView):
     def get_queryset(self):
         # slug = self.kwargs.get(self.lookup_field)
         uid = self.kwargs["uid"]
-        user_orgs = UserOrganization.objects.IS_ACTIVE().filter(
-            user=self.request.user
-        ).values_list("organization", flat=True)
+        user_orgs = get_tenant(self.request).organization_ids
 
         try:
             product = Product.objects.get(
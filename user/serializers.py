@@ -1,5 +1,16 @@
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
+from core.claims import stamp_claims
+from core.revocation import is_revoked, start_session
 from core.models import User, UserOrganization
 from core.choices import RoleChoices
 
@@ -53,3 +64,41 @@ class UserOrganizationSerializer(serializers.ModelSerializer):
         model = UserOrganization
         fields = ["user", "role", "status", "salary", "date_joined"]
         read_only_fields = ["date_joined"]
+
+
+# Every sign-in starts a recorded session, so its tokens can be revoked.
+class SessionTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return start_session(super().get_token(user), user)
+
+
+class SessionTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs["refresh"])):
+            raise InvalidToken(_("Token has been revoked"))
+        return super().validate(attrs)
+
+
+# Issues the usual token pair, with the user's status, staff flags and
+# memberships signed into the access token so safe requests can be
+# authenticated without loading the user. The refresh token stays plain:
+# claims are re-read whenever it is exchanged.
+class ClaimsTokenObtainPairSerializer(SessionTokenObtainPairSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data["access"] = str(stamp_claims(AccessToken(data["access"]), self.user))
+        return data
+
+
+class ClaimsTokenRefreshSerializer(SessionTokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        data["access"] = str(stamp_claims(access, user))
+        return data
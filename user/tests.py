@@ -1,3 +1,111 @@
+from datetime import datetime, timezone
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User
+from core.revocation import revoke_sessions
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f"{name}@example.com", password="password", username=name
+    )
+
+
+class UserListPaginationTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser(
+            email="admin@example.com", password="password", username="admin"
+        )
+        for index in range(24):
+            create_user(f"user{index:02}")
+        # Sub-millisecond precision must survive the round trip through the cursor.
+        User.objects.update(
+            date_joined=datetime(2026, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def walk(self, ordering):
+        slugs = []
+        url = f"{reverse('all_user')}?ordering={ordering}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            slugs.extend(user["slug"] for user in response.json()["results"])
+            url = response.json()["next"]
+        return slugs
+
+    def test_pages_over_equal_timestamps_cover_every_user_once(self):
+        expected = sorted(User.objects.values_list("slug", flat=True))
+        for ordering in ("date_joined", "-date_joined"):
+            slugs = self.walk(ordering)
+            self.assertEqual(len(slugs), len(expected))
+            self.assertEqual(sorted(slugs), expected)
+
+    def test_previous_page_returns_the_same_rows(self):
+        first = self.client.get(f"{reverse('all_user')}?ordering=date_joined").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+
+        self.assertEqual(
+            [user["slug"] for user in back["results"]],
+            [user["slug"] for user in first["results"]],
+        )
+
+
+class SessionRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+        self.client = APIClient()
+
+    def sign_in(self):
+        response = self.client.post(
+            reverse("claims_token"), {"email": "user@example.com", "password": "password"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def get_me(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        response = self.client.get(reverse("me_user"))
+        self.client.credentials()
+        return response
+
+    def refresh(self, refresh):
+        return self.client.post(reverse("claims_token_refresh"), {"refresh": str(refresh)})
+
+    def test_revoked_session_is_rejected(self):
+        tokens = self.sign_in()
+        self.assertEqual(self.get_me(tokens["access"]).status_code, status.HTTP_200_OK)
+
+        revoke_sessions(self.user.pk)
+
+        self.assertEqual(self.get_me(tokens["access"]).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.refresh(tokens["refresh"]).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_later_session_is_accepted(self):
+        self.sign_in()
+        revoke_sessions(self.user.pk)
+
+        tokens = self.sign_in()
+        self.assertEqual(self.get_me(tokens["access"]).status_code, status.HTTP_200_OK)
+
+    def test_token_without_a_session_is_rejected(self):
+        legacy = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(legacy).status_code, status.HTTP_200_OK)
+
+        revoke_sessions(self.user.pk)
 
-# Create your tests here.
+        self.assertEqual(self.refresh(legacy).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.get_me(legacy.access_token).status_code, status.HTTP_401_UNAUTHORIZED
+        )
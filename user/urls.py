@@ -7,6 +7,8 @@ from . import views
 urlpatterns = [
     path('user/token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
     path('user/token', TokenObtainPairView.as_view(), name='token'),
+    path('user/token/claims/refresh', views.ClaimsTokenRefreshView.as_view(), name='claims_token_refresh'),
+    path('user/token/claims', views.ClaimsTokenObtainPairView.as_view(), name='claims_token'),
     path('user/register', views.CreateUserView.as_view(), name='register'),
     path('user/me', views.GetAndUpdateMeUserView.as_view(), name='me_user'),
     path('users', views.GetAllUserView.as_view(), name='all_user'),
@@ -2,39 +2,63 @@ from rest_framework import generics
 from rest_framework import permissions as drf_permissions
 
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from django_filters.rest_framework import DjangoFilterBackend
 
 from core.models import User
 from core.choices import StatusChoices
 from core import permissions as custom_permissions
+from core.conditional import ConditionalGetMixin
+from core.idempotency import IdempotentMixin
+from core.pagination import KeysetPagination
 
-from .serializers import UserSerializer, UserOrganizationSerializer
+from .serializers import (
+    ClaimsTokenObtainPairSerializer,
+    ClaimsTokenRefreshSerializer,
+    UserSerializer,
+    UserOrganizationSerializer,
+)
+
+
+class ClaimsTokenObtainPairView(TokenObtainPairView):
+    serializer_class = ClaimsTokenObtainPairSerializer
+
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    serializer_class = ClaimsTokenRefreshSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class GetAllUserView(generics.ListAPIView):
+class GetAllUserView(ConditionalGetMixin, generics.ListAPIView):
     queryset = User.objects.filter(status=StatusChoices.ACTIVE).order_by("pk")
     serializer_class = UserSerializer
     permission_classes = [custom_permissions.IsSuperuser]
+    pagination_class = KeysetPagination
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ["username", "first_name", "last_name"]
     filterset_fields = ["thana", "city", "country", "status"]
     ordering_fields = ["date_joined", "updated_at"]
 
 
-class GetAndUpdateMeUserView(generics.RetrieveUpdateAPIView):
+class GetAndUpdateMeUserView(
+    IdempotentMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView
+):
     serializer_class = UserSerializer
     permission_classes = [drf_permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return authenticated user"""
-        return self.request.user
+        user = self.request.user
+        # A user authenticated from token claims only has those fields set.
+        if user.get_deferred_fields():
+            user.refresh_from_db(fields=user.get_deferred_fields())
+        return user
 
 
-class CreateOrganizationUserView(generics.CreateAPIView):
+class CreateOrganizationUserView(IdempotentMixin, generics.CreateAPIView):
     serializer_class = UserOrganizationSerializer
     permission_classes = [custom_permissions.IsSuperuser]